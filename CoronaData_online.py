@@ -2,400 +2,646 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta, date
 from scipy.interpolate import UnivariateSpline
-from os import path, mkdir
+from os import path, mkdir, remove, replace
+from glob import glob
+import json
 import sys
+import warnings
+import base64
+import re
 import csv
+from io import BytesIO
+from functools import lru_cache
 import pickle
 from bs4 import BeautifulSoup
-from requests import get as req_get
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+from time import monotonic
+from Corona_Cache import LRUCache
+from Corona_Store import SourceStore, CoronaStore, index_file, store_exists, store_file_lock, write_source_store, to_int32
+
+class CoronaDataState():
+    ''' CoronaDataState holds the mapped stores (corona_dict) and the indexes built from their keys.
+    It is not changed after construction, CoronaData.populate_dict replaces it as a whole.
+    '''
+    def __init__(self, corona_dict, loaded_stores):
+        self.corona_dict = corona_dict          # This is the central data storage
+        self.loaded_stores = loaded_stores      # Names of the stores mapped by populate_dict
+        keys = list(corona_dict.keys())
+        self.sources = np.array([key[0] for key in keys])           # List of data sources
+        self.countries_level1 = np.array([key[1] for key in keys])  # List of countries
+        self.countries_level2 = np.array([key[2] for key in keys])  # List of country parts
+        # hierarchical index of corona_dict keys: key_index[source][level1] is the sorted
+        # list of level2 entries, level1_lists[source] the sorted list of level1 entries
+        self.key_index = {}
+        for source, country_level1, country_level2 in keys:
+            self.key_index.setdefault(source, {}).setdefault(country_level1, []).append(country_level2)
+        self.level1_lists = {}
+        for source, level1_dict in self.key_index.items():
+            for level2_list in level1_dict.values():
+                level2_list.sort()
+            self.level1_lists[source] = sorted(level1_dict.keys())
+        self.source_list = sorted(self.key_index.keys())
+
 
 class CoronaData():
     ''' CoronaData class handles data import, data formatting and the relevant calculations
     '''
-    def __init__(self):
+    def __init__(self, load = True):
         self.start_date = datetime(2020, 1, 22)
         self.files = {'JHUGL': 'JHU.dict', 'JHU_US': 'JHU_US.dict', 'RKI': 'RKI.dict',
         'Worldometers': 'Worldometers.dict', 'RKI_Alter_corr': 'RKI_corr.dict',
         'DIVI': 'DIVI.dict'}
+        # data sources, may be replaced by local files (e.g. fixtures) or a local web server
+        jhu_url = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/'
+        self.urls = {'JHU_GL_inf': jhu_url + 'time_series_covid19_confirmed_global.csv',
+                     'JHU_GL_deaths': jhu_url + 'time_series_covid19_deaths_global.csv',
+                     'JHU_US_inf': jhu_url + 'time_series_covid19_confirmed_US.csv',
+                     'JHU_US_deaths': jhu_url + 'time_series_covid19_deaths_US.csv',
+                     'RKI': 'https://opendata.arcgis.com/datasets/dd4580c810204019a7b8eb3e0b329dd6_0.csv',
+                     'Worldometers_index': 'https://www.worldometers.info/coronavirus/#countries',
+                     'Worldometers': 'https://www.worldometers.info/coronavirus/',
+                     'DIVI': 'https://diviexchange.blob.core.windows.net/%24web/bundesland-zeitreihe.csv'}
+        self.wdm_countries = ['Germany', 'France', 'Spain', 'USA', 'Sweden', 'Switzerland', 'Netherlands', 'Italy',
+        'Belgium', 'Austria', 'UK', 'China', 'Japan', 'Poland', 'Czechia', 'Ireland', 'Portugal', 'Denmark',
+        'South Africa']
+        self.http_workers = 8           # Max. number of concurrent downloads of one source
+        self.http_retries = 3           # Retries of failed downloads
+        self.http_backoff = 0.5         # Backoff factor in seconds between retries
+        self.http_timeout = 30          # Timeout of a single request in seconds
+        self.rki_chunksize = 500000     # Rows of the RKI csv file read at once
+        self.rki_incremental = True     # Recompute only changed days and series of the RKI data
+        self.rki_recomputed = 0         # Series analysed by the last RKI build
         self.local_files_dir = path.join('.', 'local_files')
-        self.corona_dict = {}           # This is the central data storage
-        self.sources = []               # List of data sources
-        self.countries_level1 = []      # List of countries
-        self.countries_level2 = []      # List of country parts
+        self.state = CoronaDataState({}, [])    # Mapped stores and their indexes, see CoronaDataState
         self.limit = 1
         self.time_shift = 10            # Assumed time difference from infection to report
         self.limit_len = 10 #15
         self.show_counties = False
+        self.data_version = 0           # Incremented whenever new data has been written or loaded
+        self.weekly_cache = LRUCache(maxsize = 256)     # Cache for remove_weekly_cached results
+        self.precompute_weeks = [7]     # correct_weeks of the weekly corrected series precomputed at refresh time
+        self.reattach_interval = 10     # Min. seconds between two checks for new store generations
+        self.last_store_check = monotonic()
+        self.store_lock = Lock()
         # self.update_jhu_global_to_file(forced_update = False)
         # self.update_jhu_US_to_file(forced_update = False , show_counties = self.show_counties)
         # self.update_RKI_to_file(forced_update = False)
         # self.update_Worldometer_to_file(forced_update = False)
         # self.update_DIVI_to_file(forced_update = False)
-        self.populate_dict()
+        # (Corona_Refresh.CoronaRefresh runs all updates concurrently)
+        if load:
+            self.populate_dict()
         
     def populate_dict(self):
-        input_dicts = []
-        for _, file in self.files.items():
-            dict_file = path.join(self.local_files_dir, file)
-            try:
-                with open(dict_file, 'rb') as f:
-                    input_dicts.append(pickle.load(f))
-            except:
-                continue
-
-        for i in range(len(input_dicts)):
-            self.corona_dict = {**self.corona_dict, **input_dicts[i]}
-
-        print(' read total: ',len(self.corona_dict.keys()))
-        self.sources = []
-        self.countries_level1 = []
-        self.countries_level2 = []
-        for c in self.corona_dict.keys():
-            source, country_level1, country_level2 = c
-            self.sources.append(source)
-            self.countries_level1.append(country_level1)
-            self.countries_level2.append(country_level2)
-        self.sources = np.array(self.sources)
-        self.countries_level1 = np.array(self.countries_level1)
-        self.countries_level2 = np.array(self.countries_level2)
- 
+        # every source is memory-mapped from its columnar store (see Corona_Store). Pickled dicts
+        # without a store (e.g. of a fresh checkout) are converted on first load, by one process only
+        # (convert_dict_files), newer dicts of existing stores by the refresh
+        if any(self.dict_file_newer(source) and not store_exists(self.local_files_dir, self.store_name(source))
+               for source in self.files.keys()):
+            self.convert_dict_files(missing_only = True)
+        source_stores = []
+        for source in self.files.keys():
+            if self.dict_file_newer(source):
+                print(f'{source}: {self.files[source]} is newer than its store, it is converted by the next refresh')
+            if store_exists(self.local_files_dir, self.store_name(source)):
+                source_stores.append(SourceStore(self.local_files_dir, self.store_name(source)))
+        # the new state is complete before it replaces the former one (a single assignment),
+        # requests running concurrently see either of them
+        state = CoronaDataState(CoronaStore(source_stores), [source_store.name for source_store in source_stores])
+        print(' read total: ',len(state.corona_dict.keys()))
+        self.state = state
+        self.invalidate_weekly_cache()
+
+    # the data of the current state, see CoronaDataState
+    corona_dict = property(lambda self: self.state.corona_dict)
+    loaded_stores = property(lambda self: self.state.loaded_stores)
+    sources = property(lambda self: self.state.sources)
+    countries_level1 = property(lambda self: self.state.countries_level1)
+    countries_level2 = property(lambda self: self.state.countries_level2)
+    key_index = property(lambda self: self.state.key_index)
+    level1_lists = property(lambda self: self.state.level1_lists)
+    source_list = property(lambda self: self.state.source_list)
+
+    def reattach_if_stale(self, forced_check = False):
+        '''reattach_if_stale maps the stores again (populate_dict) if a refresh has published a new
+        generation of a store, or a new store, since they were mapped. Processes sharing the data
+        (see get_shared_data) call it before reading, the check runs at most every reattach_interval
+        seconds. Returns True if the stores have been reattached.'''
+        if not forced_check and monotonic() - self.last_store_check < self.reattach_interval:
+            return False
+        with self.store_lock:
+            self.last_store_check = monotonic()
+            new_stores = [self.store_name(source) for source in self.files.keys()
+                          if self.store_name(source) not in self.loaded_stores and
+                          store_exists(self.local_files_dir, self.store_name(source))]
+            if not (new_stores or self.state.corona_dict.is_stale()):
+                return False
+            self.populate_dict()
+        return True
+
+    def data_generation(self):
+        # generations of the mapped stores, the same in all processes which map the same data
+        return tuple((source_store.name, source_store.generation) for source_store in self.corona_dict.source_stores)
+
+    def get_level1_list(self, source):
+        # sorted list of level1 entries (countries) of source
+        return self.level1_lists.get(source, [])
+
+    def get_level2_list(self, source, country_level1):
+        # sorted list of level2 entries (country parts) of source and country_level1
+        return self.state.key_index.get(source, {}).get(country_level1, [])
+
+    def store_name(self, source):
+        # name of the columnar store of source, derived from the former dict file name
+        return path.splitext(self.files[source])[0]
+
+    def dict_file_newer(self, source):
+        # True if the pickled dict file of source has been written after its store (or there is no store)
+        dict_file = path.join(self.local_files_dir, self.files[source])
+        if not path.isfile(dict_file):
+            return False
+        store_file = index_file(self.local_files_dir, self.store_name(source))
+        return not path.isfile(store_file) or path.getmtime(dict_file) > path.getmtime(store_file)
+
+    def convert_dict_files(self, missing_only = False):
+        '''convert_dict_files publishes the pickled dict files (format of the former update_*_to_file methods)
+        which are newer than the stores of their sources (missing_only: only those without a store),
+        see publish_source. The conversion runs under a file lock on local_files_dir, processes which
+        wait for it find the stores written and skip them. Returns the converted sources.'''
+        converted = []
+        with store_file_lock(self.local_files_dir):
+            for source, file in self.files.items():
+                if not self.dict_file_newer(source):
+                    continue
+                if missing_only and store_exists(self.local_files_dir, self.store_name(source)):
+                    continue
+                c_dict = self.read_dict_file(source)
+                if c_dict is not None:
+                    self.publish_source(source, c_dict)
+                    print(f'{source}: {file} converted, {len(c_dict)} series')
+                    converted.append(source)
+        return converted
+
+    def read_dict_file(self, source):
+        # c_dict of the pickled dict file of source, None if it cannot be read
+        file = self.files[source]
+        try:
+            with open(path.join(self.local_files_dir, file), 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f'{source}: {file} could not be read: {e!r}')
+            return None
+
+    def store_up_to_date(self, source):
+        # True if the store of source has been written today
+        store_file = index_file(self.local_files_dir, self.store_name(source))
+        return path.isfile(store_file) and datetime.fromtimestamp(path.getmtime(store_file)).date() == date.today()
+
+    def publish_source(self, source, c_dict, weekly = None):
+        # write c_dict of source and its weekly corrected series (computed here if not given,
+        # see precompute_weekly) to its columnar store
+        if weekly is None:
+            weekly = self.precompute_weekly(c_dict)
+        generation = write_source_store(self.local_files_dir, self.store_name(source), c_dict, weekly)
+        if source == 'RKI':
+            self.publish_RKI_snapshot(generation)
+        self.invalidate_weekly_cache()
+
+    def fetch_url(self, url, session = None):
+        # returns the content of url as bytes, through session (a session of http_session, a new one
+        # if not given), so every download has the timeout and the retries of http_session.
+        # Local paths are read directly, for a directory its index.html is read (like a static web server)
+        if is_local(url):
+            url = url.split('#')[0]
+            if path.isdir(url):
+                url = path.join(url, 'index.html')
+            with open(url, 'rb') as f:
+                return f.read()
+        if session is None:
+            with self.http_session() as session:
+                return self.fetch_url(url, session)
+        r = session.get(url, timeout = self.http_timeout)
+        r.raise_for_status()
+        return r.content
+
+    def http_session(self):
+        # session with a pool of keep-alive connections for http_workers concurrent requests,
+        # failed requests are retried with exponential backoff
+        session = Session()
+        retry = Retry(total = self.http_retries, backoff_factor = self.http_backoff,
+                      status_forcelist = (429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = self.http_workers, max_retries = retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
     def update_jhu_global_to_file(self, forced_update = False):
         if not path.exists(self.local_files_dir):
                 mkdir(self.local_files_dir)
-        dict_file = path.join(self.local_files_dir, self.files['JHUGL'])
-        if path.isfile(dict_file) and datetime.fromtimestamp(path.getmtime(dict_file)).date() == date.today() and not forced_update:
+        if self.store_up_to_date('JHUGL') and not forced_update:
             return
-        url = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv'
-        import_df = pd.read_csv(url, error_bad_lines=False).transpose()
-        import_df.reset_index(inplace = True)
-        import_df.drop([2,3], inplace = True)
-        import_df, timescale = self.clean_import_array(import_df, '%m/%d/%y')
-
-        # import data on deaths:
-        url = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_global.csv'
-        import_df_deaths = pd.read_csv(url, error_bad_lines=False).transpose()
-        import_df_deaths.reset_index(inplace = True)
-        import_df_deaths.drop([2,3], inplace = True)
-        import_df_deaths, timescale_deaths = self.clean_import_array(import_df_deaths, '%m/%d/%y')
-
-        if len(timescale) != len(timescale_deaths):
-            print('Numbers of entries (infections / deaths) don´t match. Dumping timescales: \n')
-            for i in range(max(len(timescale_deaths), len(timescale))):
-                print(i, timescale[i], timescale_deaths[i])
-        time_minmax = (min(timescale), max(timescale))
-        # origin = ['jhu']*(import_df.shape[1]-1)
-        countries = import_df.iloc[1,1:]
-        regions = import_df.iloc[0,1:]
-        countries_with_regions = np.unique(countries[np.where(pd.notnull(regions))[0]])
-        for i, region in enumerate(regions):
-            if pd.isnull(region):
-                regions[i] = countries[i]
+        c_dict = self.build_jhu_global(self.fetch_jhu_global())
+        self.publish_source('JHUGL', c_dict)
+        print('JHU global: ', len(c_dict.keys()))
+
+    def fetch_jhu_global(self):
+        # download stage: raw csv data of infections and deaths
+        with self.http_session() as session:
+            return {'inf': self.fetch_url(self.urls['JHU_GL_inf'], session),
+                    'deaths': self.fetch_url(self.urls['JHU_GL_deaths'], session)}
+
+    def build_jhu_global(self, raw):
+        # parse stage: create c_dict from the raw data of fetch_jhu_global
+        countries, regions, has_region, infs = self.jhu_matrix(raw['inf'], 'Country/Region', 'Province/State')
+        _, _, _, deaths = self.jhu_matrix(raw['deaths'], 'Country/Region', 'Province/State')
+        infs, deaths = self.match_jhu_days(infs, deaths)
+        time_minmax = (0, infs.shape[1] - 1)
+        # totals of countries with several regions, then all regions, analysed in one batch
+        total_countries, total_infs, total_deaths = self.jhu_country_totals(countries, has_region, infs, deaths)
+        entries = self.series_entries(np.concatenate([total_infs, infs]), np.concatenate([total_deaths, deaths]), time_minmax)
         c_dict = {}
-        # first for countries with several regions:
-        for country in countries_with_regions:
-            region = '!_' + country + '_total'
-            infs = np.array(import_df.iloc[2:,(np.where(countries == country)[0] + 1)].sum(axis = 1).astype('int32'))
-            deaths = np.array(import_df_deaths.iloc[2:,(np.where(countries == country)[0] + 1)].sum(axis = 1).astype('int32'))
-            deaths_copy = np.copy(deaths)
-            death_rate_stats = self.analyse_correlation(infs, deaths_copy)
-            death_rate = death_rate_stats[:,0]
-            death_rate_std = death_rate_stats[:,1]
-            if np.where(death_rate > 0)[0].shape[0] > 0:
-                death_rate_len = np.max(np.where(death_rate > 0))
-            else:
-                death_rate_len = 0
-            c_dict[('JHU_GL', country, region)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-
-        # Now for all regions:
-        for i, region in enumerate(regions):
-            country = countries[i]
-            # print(country, region)
-            infs = np.array(import_df.iloc[2:,i + 1])
-            deaths = np.array(import_df_deaths.iloc[2:,i + 1])
-            deaths_copy = np.copy(deaths)
-            death_rate_stats = self.analyse_correlation(infs, deaths_copy)
-            death_rate = death_rate_stats[:,0]
-            death_rate_std = death_rate_stats[:,1]
-            if np.where(death_rate > 0)[0].shape[0] > 0:
-                death_rate_len = np.max(np.where(death_rate > 0))
-            else:
-                death_rate_len = 0
-            c_dict[('JHU_GL', country, region)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-        
-        with open(dict_file, 'wb') as handle:
-            pickle.dump(c_dict, handle)
+        for country, entry in zip(total_countries, entries):
+            c_dict[('JHU_GL', country, '!_' + country + '_total')] = entry
+        for country, region, entry in zip(countries, regions, entries[len(total_countries):]):
+            c_dict[('JHU_GL', country, region)] = entry
+        return c_dict
 
-        print('JHU global: ', len(c_dict.keys()))
-        return 
+    def jhu_matrix(self, csv_data, country_column, region_column):
+        '''jhu_matrix reads a JHU time series csv file (bytes) and returns (countries, regions, has_region, daily):
+        country and region of every row (rows without region get the country name, has_region is False for them)
+        and an int32 matrix (rows x days since start_date) of the daily numbers. Date columns are found by
+        RE_JHU_DATE, days without column are zero.'''
+        import_df = pd.read_csv(BytesIO(csv_data), error_bad_lines=False)
+        date_columns = [column for column in import_df.columns if RE_JHU_DATE.match(column)]
+        cumulated = import_df[date_columns].fillna(0).to_numpy(dtype = 'int32')
+        daily = np.zeros_like(cumulated)
+        daily[:, 1:] = np.diff(cumulated, axis = 1)
+        cor_days = self.day_numbers(date_columns, '%m/%d/%y')
+        daily = np.ascontiguousarray(self.densify_days(pd.DataFrame(daily.T), cor_days).to_numpy(dtype = 'int32').T)
+        countries = import_df[country_column].to_numpy(dtype = object)
+        regions = import_df[region_column].to_numpy(dtype = object)
+        has_region = pd.notnull(regions)
+        regions = np.where(has_region, regions, countries)
+        return countries, regions, has_region, daily
+
+    def match_jhu_days(self, infs, deaths):
+        # infections and deaths are published in separate files, use the days both contain
+        if infs.shape[1] != deaths.shape[1]:
+            print('Numbers of entries (infections / deaths) don´t match: ', infs.shape[1], deaths.shape[1])
+            n_days = min(infs.shape[1], deaths.shape[1])
+            infs, deaths = infs[:, :n_days], deaths[:, :n_days]
+        return infs, deaths
+
+    def jhu_country_totals(self, countries, has_region, infs, deaths):
+        # sums of infections and deaths of all rows of every country which has regions,
+        # returns (sorted countries, infs, deaths), one group sum over the factorized countries
+        codes, total_countries = pd.factorize(countries, sort = True)
+        total_infs = np.zeros((len(total_countries), infs.shape[1]), dtype = 'int64')
+        total_deaths = np.zeros((len(total_countries), deaths.shape[1]), dtype = 'int64')
+        np.add.at(total_infs, codes, infs)
+        np.add.at(total_deaths, codes, deaths)
+        with_regions = np.isin(total_countries, countries[has_region])
+        return (total_countries[with_regions], total_infs[with_regions].astype('int32'),
+                total_deaths[with_regions].astype('int32'))
 
     def update_jhu_US_to_file(self, forced_update = False, show_counties = False):
         if not path.exists(self.local_files_dir):
                 mkdir(self.local_files_dir)
-        dict_file = path.join(self.local_files_dir, self.files['JHU_US'])
-        if path.isfile(dict_file) and datetime.fromtimestamp(path.getmtime(dict_file)).date() == date.today() and not forced_update:
+        if self.store_up_to_date('JHU_US') and not forced_update:
             return
-        url = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_US.csv'
-        import_df = pd.read_csv(url, error_bad_lines=False).transpose()
-        import_df.reset_index(inplace = True)
-        import_df.drop([0, 1, 2, 3, 4, 7, 8, 9, 10], inplace = True)
-        import_df, timescale = self.clean_import_array(import_df, '%m/%d/%y')
-
-        # import data on deaths:
-        url = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_US.csv'
-        import_df_deaths = pd.read_csv(url, error_bad_lines=False).transpose()
-        import_df_deaths.reset_index(inplace = True)
-        import_df_deaths.drop([0, 1, 2, 3, 4, 7, 8, 9, 10, 11], inplace = True)
-        import_df_deaths, timescale_deaths = self.clean_import_array(import_df_deaths, '%m/%d/%y')
-
-        if len(timescale) != len(timescale_deaths):
-            print('Numbers of entries (infections / deaths) don´t match. Dumping timescales: \n')
-            for i in range(max(len(timescale_deaths), len(timescale))):
-                print(i, timescale[i], timescale_deaths[i])
-        time_minmax = (min(timescale), max(timescale))
-        # origin = ['jhu']*(import_df.shape[1]-1)
-        countries = import_df.iloc[1,1:]
-        regions = import_df.iloc[0,1:]
-        countries_with_regions = np.unique(countries[np.where(pd.notnull(regions))[0]])
-        for i, region in enumerate(regions):
-            if pd.isnull(region):
-                regions[i] = countries[i]
+        c_dict = self.build_jhu_US(self.fetch_jhu_US(), show_counties = show_counties)
+        self.publish_source('JHU_US', c_dict)
+        print('JHU US: ', len(c_dict.keys()))
+
+    def fetch_jhu_US(self):
+        # download stage: raw csv data of infections and deaths
+        with self.http_session() as session:
+            return {'inf': self.fetch_url(self.urls['JHU_US_inf'], session),
+                    'deaths': self.fetch_url(self.urls['JHU_US_deaths'], session)}
+
+    def build_jhu_US(self, raw, show_counties = False):
+        # parse stage: create c_dict from the raw data of fetch_jhu_US
+        states, counties, has_county, infs = self.jhu_matrix(raw['inf'], 'Province_State', 'Admin2')
+        _, _, _, deaths = self.jhu_matrix(raw['deaths'], 'Province_State', 'Admin2')
+        infs, deaths = self.match_jhu_days(infs, deaths)
+        time_minmax = (0, infs.shape[1] - 1)
+        # totals of states with counties, all counties only if show_counties, analysed in one batch
+        total_states, total_infs, total_deaths = self.jhu_country_totals(states, has_county, infs, deaths)
+        if show_counties:
+            total_infs = np.concatenate([total_infs, infs])
+            total_deaths = np.concatenate([total_deaths, deaths])
+        entries = self.series_entries(total_infs, total_deaths, time_minmax)
         c_dict = {}
-        # first for countries with several regions:
-        for country in countries_with_regions:
-            region = '!_' + country + '_total'
-            infs = np.array(import_df.iloc[2:,(np.where(countries == country)[0] + 1)].sum(axis = 1).astype('int32'))
-            deaths = np.array(import_df_deaths.iloc[2:,(np.where(countries == country)[0] + 1)].sum(axis = 1).astype('int32'))
-            deaths_copy = np.copy(deaths)
-            death_rate_stats = self.analyse_correlation(infs, deaths_copy)
-            death_rate = death_rate_stats[:,0]
-            death_rate_std = death_rate_stats[:,1]
-            if np.where(death_rate > 0)[0].shape[0] > 0:
-                death_rate_len = np.max(np.where(death_rate > 0))
-            else:
-                death_rate_len = 0
+        for state, entry in zip(total_states, entries):
             if show_counties:
-                c_dict[('JHU_US', country, region)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-            c_dict[('JHU_GL', 'US', country)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-
-        # Now for all regions if show_counties = True:
+                c_dict[('JHU_US', state, '!_' + state + '_total')] = entry
+            c_dict[('JHU_GL', 'US', state)] = entry
         if show_counties:
-            for i, region in enumerate(regions):
-                country = countries[i]
-                # print(country, region)
-                infs = np.array(import_df.iloc[2:,i + 1])
-                deaths = np.array(import_df_deaths.iloc[2:,i + 1])
-                deaths_copy = np.copy(deaths)
-                death_rate_stats = self.analyse_correlation(infs, deaths_copy)
-                death_rate = death_rate_stats[:,0]
-                death_rate_std = death_rate_stats[:,1]
-                if np.where(death_rate > 0)[0].shape[0] > 0:
-                    death_rate_len = np.max(np.where(death_rate > 0))
-                else:
-                    death_rate_len = 0
-                c_dict[('JHU_US', country, region)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-
-        with open(dict_file, 'wb') as handle:
-            pickle.dump(c_dict, handle)
-        print('JHU US: ', len(c_dict.keys()))
-        return 
+            for state, county, entry in zip(states, counties, entries[len(total_states):]):
+                c_dict[('JHU_US', state, county)] = entry
+        return c_dict
 
     def update_RKI_to_file(self, forced_update = False):
         if not path.exists(self.local_files_dir):
             mkdir(self.local_files_dir)
-        dict_file = path.join(self.local_files_dir, self.files['RKI'])
-        if path.isfile(dict_file) and datetime.fromtimestamp(path.getmtime(dict_file)).date() == date.today() and not forced_update:
+        if self.store_up_to_date('RKI') and not forced_update:
             return
-        c_dict = {}
+        c_dict = self.build_RKI(self.fetch_RKI())
+        self.publish_source('RKI', c_dict)
+        print('RKI: ', len(c_dict.keys()))
+
+    def fetch_RKI(self):
+        # download stage: the RKI csv file is stored in local_files, returns its path. Once per day a
+        # conditional request with ETag / Last-Modified of the last download checks for a new file
+        if is_local(self.urls['RKI']):
+            return self.urls['RKI']
         rki_csv_file = path.join(self.local_files_dir, 'RKI_Daten.csv')
-        if not path.isfile(rki_csv_file) or datetime.fromtimestamp(path.getmtime(rki_csv_file)).date() != date.today():
-            print('loading RKI data...')
-            r = req_get('https://opendata.arcgis.com/datasets/dd4580c810204019a7b8eb3e0b329dd6_0.csv')
-            with open(rki_csv_file, 'wb') as f:
-                f.write(r.content)
-            print('RKI data loaded.')
-
-        RKI_df = pd.read_csv(rki_csv_file)
-        RKI_df['days_Meldedat']= (((pd.to_datetime(RKI_df['Meldedatum']).dt.tz_localize(None))-np.datetime64(self.start_date))/ np.timedelta64(1, 'D')).astype(int)
-        RKI_df['days_Refdat']= (((pd.to_datetime(RKI_df['Refdatum']).dt.tz_localize(None))-np.datetime64(self.start_date))/ np.timedelta64(1, 'D')).astype(int)
-        RKI_df['Leerzeile'] = '!_Alle'
-        # Altersgruppen in Bundesland
-        RKI_df_cases = RKI_df[RKI_df.NeuerFall.isin([0,1])]
-        RKI_df_cases_pivot = pd.pivot_table(RKI_df_cases, values='AnzahlFall', index=['days_Meldedat'], columns=['Bundesland', 'Leerzeile'], 
-                aggfunc=np.sum).fillna(0)
-        RKI_df_deaths = RKI_df[RKI_df.NeuerTodesfall.isin([0,1])]
-        RKI_df_deaths_pivot = pd.pivot_table(RKI_df_deaths, values='AnzahlTodesfall', index=['days_Meldedat'], columns=['Bundesland', 'Leerzeile'], 
-                aggfunc=np.sum).fillna(0)
-        RKI_infs, timescale_infs = self.clean_RKI_array(RKI_df_cases_pivot)
-        RKI_deaths, timescale_deaths = self.clean_RKI_array(RKI_df_deaths_pivot, refscale = timescale_infs)
-        time_minmax = (min(timescale_infs), max(timescale_infs))
-
-        RKI_index = RKI_infs.columns
-        for land_level1, land_level2 in RKI_index[1:]:
-            infs = np.array(RKI_infs[land_level1][land_level2]).astype(int)
-            deaths = np.array(RKI_deaths[land_level1][land_level2].astype(int))
-            deaths_copy = np.copy(deaths)
-            death_rate_stats = self.analyse_correlation(infs, deaths_copy)
-            death_rate = death_rate_stats[:,0]
-            death_rate_std = death_rate_stats[:,1]
-            if np.where(death_rate > 0)[0].shape[0] > 0:
-                death_rate_len = np.max(np.where(death_rate > 0))
+        meta_file = path.join(self.local_files_dir, 'RKI_Daten.meta.json')
+        meta = {}
+        if path.isfile(rki_csv_file) and path.isfile(meta_file):
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+        if meta.get('checked') == date.today().isoformat():
+            return rki_csv_file
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        print('loading RKI data...')
+        with self.http_session() as session, \
+                session.get(self.urls['RKI'], headers = headers, timeout = self.http_timeout, stream = True) as r:
+            if r.status_code == 304:
+                print('RKI data not modified.')
             else:
-                death_rate_len = 0
-            if land_level2 == '!_Alle':
-                land_level_alter = '!_Alle_age'
-                land_level_region = '!_Alle_reg'
+                r.raise_for_status()
+                with open(rki_csv_file + '.tmp', 'wb') as f:
+                    for block in r.iter_content(chunk_size = 1 << 20):
+                        f.write(block)
+                replace(rki_csv_file + '.tmp', rki_csv_file)
+                meta = {'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified')}
+                print('RKI data loaded.')
+        meta['checked'] = date.today().isoformat()
+        with open(meta_file, 'w') as f:
+            json.dump(meta, f)
+        return rki_csv_file
+
+    def build_RKI(self, rki_csv_file):
+        '''build_RKI is the parse stage: creates c_dict from the csv file of fetch_RKI.
+        With rki_incremental the cube is compared with the snapshot of the published store: only
+        the changed days are summed up again and only series with changed data are analysed
+        (analyse_correlation), all other entries are taken from the store. The cube is kept as
+        pending snapshot, publish_source makes it the snapshot of the new store generation.'''
+        previous_dict, snapshot_file = self.RKI_snapshot()
+        pending_file = path.join(self.local_files_dir, 'RKI_cube.pending.pickle')
+        if snapshot_file is not None and path.getmtime(rki_csv_file) < path.getmtime(snapshot_file):
+            # csv file not changed since the last build (e.g. 304 Not Modified)
+            print('RKI: csv file unchanged, 0 series recomputed')
+            self.rki_recomputed = 0
+            RKI_cube = pd.read_pickle(snapshot_file)
+            c_dict = {key: [np.array(a) for a in entry[:4]] + list(entry[4:])
+                      for key, entry in previous_dict.items()}
+        else:
+            RKI_cube = self.read_RKI_cube(rki_csv_file)
+            previous = None
+            if snapshot_file is not None:
+                previous = (previous_dict, self.RKI_changed_days(RKI_cube, pd.read_pickle(snapshot_file)))
+            self.rki_recomputed = 0
+            c_dict = self.build_RKI_series(RKI_cube, previous)
+            if previous is not None:
+                print(f'RKI: {len(previous[1])} changed days, {self.rki_recomputed} series recomputed')
+        if self.rki_incremental:
+            RKI_cube.to_pickle(pending_file)
+        return c_dict
+
+    def RKI_snapshot(self):
+        # returns (store, snapshot file) of the published RKI data for an incremental build,
+        # (None, None) if there is no store or no cube snapshot of its generation
+        store_name = self.store_name('RKI')
+        if not (self.rki_incremental and store_exists(self.local_files_dir, store_name)):
+            return None, None
+        source_store = SourceStore(self.local_files_dir, store_name)
+        snapshot_file = path.join(self.local_files_dir, f'RKI_cube.{source_store.generation}.pickle')
+        if not path.isfile(snapshot_file):
+            return None, None
+        return CoronaStore([source_store]), snapshot_file
+
+    def publish_RKI_snapshot(self, generation):
+        # the pending cube of build_RKI becomes the snapshot of store generation, older snapshots are removed
+        pending_file = path.join(self.local_files_dir, 'RKI_cube.pending.pickle')
+        for snapshot_file in glob(path.join(self.local_files_dir, 'RKI_cube.*.pickle')):
+            if snapshot_file != pending_file:
+                remove(snapshot_file)
+        if path.isfile(pending_file):
+            replace(pending_file, path.join(self.local_files_dir, f'RKI_cube.{generation}.pickle'))
+
+    def RKI_changed_days(self, RKI_cube, previous_cube):
+        # sorted array of the days with any difference in cases or deaths between the two cubes
+        joined = RKI_cube.join(previous_cube, how = 'outer', rsuffix = '_previous').fillna(0)
+        changed = ((joined['AnzahlFall'] != joined['AnzahlFall_previous']) |
+                   (joined['AnzahlTodesfall'] != joined['AnzahlTodesfall_previous']))
+        return np.unique(joined.index.get_level_values('days_Meldedat')[changed.to_numpy()]).astype('int64')
+
+    def read_RKI_cube(self, rki_csv_file):
+        '''read_RKI_cube reads the RKI csv file in chunks of rki_chunksize rows, only the needed
+        columns and with explicit dtypes (RKI_DTYPES). Every chunk is aggregated by aggregate_RKI
+        and added to the cube, so peak memory is bounded by chunk and cube size instead of file size.'''
+        RKI_cube = None
+        for RKI_chunk in pd.read_csv(rki_csv_file, usecols = list(RKI_DTYPES.keys()), dtype = RKI_DTYPES,
+                                     chunksize = self.rki_chunksize):
+            RKI_chunk['days_Meldedat'] = self.RKI_days(RKI_chunk['Meldedatum'])
+            chunk_cube = self.aggregate_RKI(RKI_chunk)
+            if RKI_cube is None:
+                RKI_cube = chunk_cube
             else:
-                land_level_alter = land_level2
-                land_level_region = land_level2
-            c_dict[('RKIMA', land_level1, land_level_alter)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-            c_dict[('RKIMR', land_level1, land_level_region)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-        
+                RKI_cube = pd.concat([RKI_cube, chunk_cube]).groupby(level = [0, 1, 2, 3], observed = True).sum()
+        # categories differ between chunks, plain sorted levels give the key order of a single read
+        RKI_cube.index = pd.MultiIndex.from_arrays(
+            [RKI_cube.index.get_level_values('days_Meldedat')] +
+            [RKI_cube.index.get_level_values(l).astype(object) for l in ['Bundesland', 'Landkreis', 'Altersgruppe']],
+            names = RKI_cube.index.names)
+        return RKI_cube.sort_index()
+
+    def RKI_days(self, dates):
+        # day offsets from start_date for a categorical Series of RKI date strings. Every distinct
+        # date is parsed once, fast path for the fixed formats 'YYYY/MM/DD ...' and 'YYYY-MM-DD...'
+        categories = dates.cat.categories.to_series().astype(str)
+        try:
+            parsed = pd.to_datetime(categories.str[:10].str.replace('/', '-', regex = False), format = '%Y-%m-%d')
+        except ValueError:
+            parsed = pd.to_datetime(categories).dt.tz_localize(None)
+        category_days = (parsed - self.start_date).dt.days.to_numpy(dtype = 'int32')
+        return category_days[dates.cat.codes.to_numpy()]
+
+    def aggregate_RKI(self, RKI_df):
+        '''aggregate_RKI filters the RKI reports once and sums cases and deaths at the finest grain
+        which is needed: day x Bundesland x Landkreis x Altersgruppe.
+        Cases count if NeuerFall is 0 or 1, deaths if NeuerTodesfall is 0 or 1.
+        Returns the cube as DataFrame with index (days_Meldedat, Bundesland, Landkreis, Altersgruppe)
+        and columns AnzahlFall and AnzahlTodesfall.'''
+        valid_cases = RKI_df['NeuerFall'].isin([0,1])
+        valid_deaths = RKI_df['NeuerTodesfall'].isin([0,1])
+        valid = valid_cases | valid_deaths
+        RKI_valid = pd.DataFrame({
+            'days_Meldedat': RKI_df['days_Meldedat'][valid],
+            'Bundesland': RKI_df['Bundesland'][valid],
+            'Landkreis': RKI_df['Landkreis'][valid],
+            'Altersgruppe': RKI_df['Altersgruppe'][valid],
+            'AnzahlFall': RKI_df['AnzahlFall'].where(valid_cases, 0)[valid],
+            'AnzahlTodesfall': RKI_df['AnzahlTodesfall'].where(valid_deaths, 0)[valid]})
+        return RKI_valid.groupby(['days_Meldedat', 'Bundesland', 'Landkreis', 'Altersgruppe'], observed = True).sum()
+
+    def build_RKI_series(self, RKI_cube, previous = None):
+        # create c_dict from the cube of aggregate_RKI, all series are rollups (sums) of the cube.
+        # previous = (c_dict of the last build, changed days) for an incremental build
+        c_dict = {}
+        n_days = max(RKI_cube.index.get_level_values('days_Meldedat')) + 1
+        time_minmax = (0, n_days - 1)
+        if previous is not None:
+            previous_dict, changed_days = previous
+            previous = (previous_dict, changed_days[(changed_days >= 0) & (changed_days < n_days)])
+
+        # Bundesland gesamt (Altersgruppen & Regionen)
+        for (land, ), entry in self.RKI_rollup(RKI_cube, ['Bundesland'], n_days, time_minmax,
+                                               previous, lambda c: ('RKIMA', c[0], '!_Alle_age')):
+            c_dict[('RKIMA', land, '!_Alle_age')] = entry
+            c_dict[('RKIMR', land, '!_Alle_reg')] = entry
+
         #*****************************************************
         # Deutschland gesamt Altersgruppen & Region Meldedatum
         #*****************************************************
-        RKI_df_cases = RKI_df[RKI_df.NeuerFall.isin([0,1])]
-        RKI_df_cases_pivot = pd.pivot_table(RKI_df_cases, values='AnzahlFall', index=['days_Meldedat'], columns=['Leerzeile', 'Altersgruppe'], 
-                aggfunc=np.sum).fillna(0)
-        RKI_df_deaths = RKI_df[RKI_df.NeuerTodesfall.isin([0,1])]
-        RKI_df_deaths_pivot = pd.pivot_table(RKI_df_deaths, values='AnzahlTodesfall', index=['days_Meldedat'], columns=['Leerzeile', 'Altersgruppe'], 
-                aggfunc=np.sum).fillna(0)
-        RKI_infs, timescale_infs = self.clean_RKI_array(RKI_df_cases_pivot)
-        RKI_deaths, timescale_deaths = self.clean_RKI_array(RKI_df_deaths_pivot, refscale = timescale_infs)
-        time_minmax = (min(timescale_infs), max(timescale_infs))
-
-        RKI_index = RKI_infs.columns
-        for land_level1, land_level2 in RKI_index[1:]:
-            infs = np.array(RKI_infs[land_level1][land_level2]).astype(int)
-            deaths = np.array(RKI_deaths[land_level1][land_level2].astype(int))
-            deaths_copy = np.copy(deaths)
-            death_rate_stats = self.analyse_correlation(infs, deaths_copy)
-            death_rate = death_rate_stats[:,0]
-            death_rate_std = death_rate_stats[:,1]
-            if np.where(death_rate > 0)[0].shape[0] > 0:
-                death_rate_len = np.max(np.where(death_rate > 0))
-            else:
-                death_rate_len = 0
-            c_dict[('RKIMA', '!_Deutschland', land_level2)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-        infs = np.sum(np.array(RKI_infs)[:,1:], axis = 1)
-        deaths = np.sum(np.array(RKI_deaths)[:,1:], axis = 1)
-        deaths_copy = np.copy(deaths)
-        death_rate_stats = self.analyse_correlation(infs, deaths_copy)
-        death_rate = death_rate_stats[:,0]
-        death_rate_std = death_rate_stats[:,1]
-        if np.where(death_rate > 0)[0].shape[0] > 0:
-            death_rate_len = np.max(np.where(death_rate > 0))
-        else:
-            death_rate_len = 0
-        c_dict[('RKIMA', '!_Deutschland', '!_Alle_age')] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-        c_dict[('RKIMR', '!_Deutschland', '!_Alle_reg')] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-  
+        for (alter, ), entry in self.RKI_rollup(RKI_cube, ['Altersgruppe'], n_days, time_minmax,
+                                                previous, lambda c: ('RKIMA', '!_Deutschland', c[0])):
+            c_dict[('RKIMA', '!_Deutschland', alter)] = entry
+        for _, entry in self.RKI_rollup(RKI_cube, [], n_days, time_minmax,
+                                        previous, lambda c: ('RKIMA', '!_Deutschland', '!_Alle_age')):
+            c_dict[('RKIMA', '!_Deutschland', '!_Alle_age')] = entry
+            c_dict[('RKIMR', '!_Deutschland', '!_Alle_reg')] = entry
+
         #*******************************
         ## Altersgruppen nach Meldedatum
         #*******************************
-        RKI_df_cases = RKI_df[RKI_df.NeuerFall.isin([0,1])]
-        RKI_df_cases_pivot = pd.pivot_table(RKI_df_cases, values='AnzahlFall', index=['days_Meldedat'], columns=['Bundesland', 'Altersgruppe'], 
-                aggfunc=np.sum).fillna(0)
-        RKI_df_deaths = RKI_df[RKI_df.NeuerTodesfall.isin([0,1])]
-        RKI_df_deaths_pivot = pd.pivot_table(RKI_df_deaths, values='AnzahlTodesfall', index=['days_Meldedat'], columns=['Bundesland', 'Altersgruppe'], 
-                aggfunc=np.sum).fillna(0)
-        RKI_infs, timescale_infs = self.clean_RKI_array(RKI_df_cases_pivot)
-        RKI_deaths, timescale_deaths = self.clean_RKI_array(RKI_df_deaths_pivot, refscale = timescale_infs)
-        time_minmax = (min(timescale_infs), max(timescale_infs))
-
-        RKI_index = RKI_infs.columns
-        for land_level1, land_level2 in RKI_index[1:]:
-            infs = np.array(RKI_infs[land_level1][land_level2].astype(int))
-            if (land_level1, land_level2) not in RKI_deaths.columns:
-                deaths = np.arange(infs.shape[0])
-            else:
-                deaths = np.array(RKI_deaths[land_level1][land_level2].astype(int))
-            deaths_copy = np.copy(deaths)
-            death_rate_stats = self.analyse_correlation(infs, deaths_copy)
-            death_rate = death_rate_stats[:,0]
-            death_rate_std = death_rate_stats[:,1]
-            if np.where(death_rate > 0)[0].shape[0] > 0:
-                death_rate_len = np.max(np.where(death_rate > 0))
-            else:
-                death_rate_len = 0
-            c_dict[('RKIMA', land_level1, land_level2)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-
-        #**********************************
-        ## Altersgruppen nach Referenzdatum
-        #**********************************
-        # not in use yet
-        # RKI_df_cases = RKI_df[RKI_df.NeuerFall.isin([0,1]) & RKI_df.IstErkrankungsbeginn == 1]
-        # RKI_df_cases_pivot = pd.pivot_table(RKI_df_cases, values='AnzahlFall', index=['days_Refdat'], columns=['Bundesland', 'Altersgruppe'], 
-        #         aggfunc=np.sum).fillna(0)
-        # RKI_df_deaths = RKI_df[RKI_df.NeuerTodesfall.isin([0,1])]
-        # RKI_df_deaths_pivot = pd.pivot_table(RKI_df_deaths, values='AnzahlTodesfall', index=['days_Refdat'], columns=['Bundesland', 'Altersgruppe'], 
-        #         aggfunc=np.sum).fillna(0)
-        # RKI_infs, timescale_infs = self.clean_RKI_array(RKI_df_cases_pivot)
-        # RKI_deaths, timescale_deaths = self.clean_RKI_array(RKI_df_deaths_pivot, refscale = timescale_infs)
-        # time_minmax = (min(timescale_infs), max(timescale_infs))
-
-        # RKI_index = RKI_infs.columns
-        # for land_level1, land_level2 in RKI_index[1:]:
-        #     infs = np.array(RKI_infs[land_level1][land_level2].astype(int))
-        #     if (land_level1, land_level2) not in RKI_deaths.columns:
-        #         deaths = np.arange(infs.shape[0])
-        #     else:
-        #         deaths = np.array(RKI_deaths[land_level1][land_level2].astype(int))
-        #     deaths_copy = np.copy(deaths)
-        #     death_rate_stats = self.analyse_correlation(infs, deaths_copy)
-        #     death_rate = death_rate_stats[:,0]
-        #     death_rate_std = death_rate_stats[:,1]
-        #     if np.where(death_rate > 0)[0].shape[0] > 0:
-        #         death_rate_len = np.max(np.where(death_rate > 0))
-        #     else:
-        #         death_rate_len = 0
-        #     c_dict[('RKI_RefDat_Alter', land_level1, land_level2)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+        for (land, alter), entry in self.RKI_rollup(RKI_cube, ['Bundesland', 'Altersgruppe'], n_days, time_minmax,
+                                                    previous, lambda c: ('RKIMA', c[0], c[1])):
+            c_dict[('RKIMA', land, alter)] = entry
 
         #****************
         # Regionen Meldedatum
         #*****************
-        RKI_df_cases = RKI_df[RKI_df.NeuerFall.isin([0,1])]
-        RKI_df_cases_pivot = pd.pivot_table(RKI_df_cases, values='AnzahlFall', index=['days_Meldedat'], columns=['Bundesland', 'Landkreis'], 
-                aggfunc=np.sum).fillna(0)
-        RKI_df_deaths = RKI_df[RKI_df.NeuerTodesfall.isin([0,1])]
-        RKI_df_deaths_pivot = pd.pivot_table(RKI_df_deaths, values='AnzahlTodesfall', index=['days_Meldedat'], columns=['Bundesland', 'Landkreis'], 
-                aggfunc=np.sum).fillna(0)
-        RKI_infs, timescale_infs = self.clean_RKI_array(RKI_df_cases_pivot)
-        RKI_deaths, timescale_deaths = self.clean_RKI_array(RKI_df_deaths_pivot, refscale = timescale_infs)
-        time_minmax = (min(timescale_infs), max(timescale_infs))
-
-        RKI_index = RKI_infs.columns
-        for land_level1, land_level2 in RKI_index[1:]:
-            infs = np.array(RKI_infs[land_level1][land_level2].astype(int))
-            if (land_level1, land_level2) not in RKI_deaths.columns:
-                deaths = np.arange(infs.shape[0])
-            else:
-                deaths = np.array(RKI_deaths[land_level1][land_level2].astype(int))
-            deaths_copy = np.copy(deaths)
-            death_rate_stats = self.analyse_correlation(infs, deaths_copy)
-            death_rate = death_rate_stats[:,0]
-            death_rate_std = death_rate_stats[:,1]
-            if np.where(death_rate > 0)[0].shape[0] > 0:
-                death_rate_len = np.max(np.where(death_rate > 0))
+        for (land, kreis), entry in self.RKI_rollup(RKI_cube, ['Bundesland', 'Landkreis'], n_days, time_minmax,
+                                                    previous, lambda c: ('RKIMR', c[0], c[1])):
+            c_dict[('RKIMR', land, kreis)] = entry
+        return c_dict
+
+    def RKI_rollup(self, RKI_cube, levels, n_days, time_minmax, previous = None, key = None):
+        '''RKI_rollup sums the cube over all levels except day and levels, returns a list of
+        (level values, c_dict entry) with series for days 0 .. n_days-1.
+        With previous = (c_dict of the last build, changed days) only the changed days are summed up,
+        the other days are taken from the previous entry previous[0][key(level values)]. Entries
+        with unchanged series are reused, analyse_correlation runs only for the changed ones.'''
+        if previous is None:
+            columns, infs, deaths = self.RKI_sums(RKI_cube, levels, range(n_days))
+            self.rki_recomputed += len(columns)
+            return list(zip(columns, self.series_entries(infs, deaths, time_minmax)))
+        previous_dict, changed_days = previous
+        if levels:
+            level_values = pd.MultiIndex.from_arrays([RKI_cube.index.get_level_values(l) for l in levels])
+            columns = list(level_values.unique().sort_values())
+        else:
+            columns = [()]
+        infs = np.zeros((len(columns), n_days), dtype = 'int64')
+        deaths = np.zeros((len(columns), n_days), dtype = 'int64')
+        previous_entries = []
+        previous_days = n_days
+        for i, column in enumerate(columns):
+            entry = previous_dict.get(key(column))
+            if entry is not None:
+                # a new report day makes the series longer than the previous ones
+                n_previous = min(len(entry[0]), n_days)
+                infs[i, :n_previous] = entry[0][:n_previous]
+                deaths[i, :n_previous] = entry[1][:n_previous]
+                previous_days = min(previous_days, n_previous)
+            previous_entries.append(entry)
+        # days beyond the previous series are summed up like changed days
+        changed_days = np.union1d(changed_days, np.arange(previous_days, n_days)).astype('int64')
+        if len(changed_days) > 0:
+            days = RKI_cube.index.get_level_values('days_Meldedat')
+            delta_columns, delta_infs, delta_deaths = self.RKI_sums(RKI_cube[np.isin(days, changed_days)], levels, changed_days)
+            position = {column: i for i, column in enumerate(columns)}
+            rows = np.array([position[column] for column in delta_columns], dtype = 'int64')
+            infs[:, changed_days] = 0
+            deaths[:, changed_days] = 0
+            if len(rows) > 0:
+                infs[np.ix_(rows, changed_days)] = delta_infs
+                deaths[np.ix_(rows, changed_days)] = delta_deaths
+        entries = []
+        changed = []
+        for i, entry in enumerate(previous_entries):
+            if entry is None or not (np.array_equal(entry[0], infs[i]) and np.array_equal(entry[1], deaths[i])):
+                changed.append(i)
+                entries.append(None)
             else:
-                death_rate_len = 0
-            c_dict[('RKIMR', land_level1, land_level2)] = [infs, deaths, death_rate,
-                                    death_rate_std, death_rate_len, time_minmax]
+                entries.append([infs[i], deaths[i], np.array(entry[2]), np.array(entry[3]), entry[4], time_minmax])
+        if changed:
+            for i, entry in zip(changed, self.series_entries(infs[changed], deaths[changed], time_minmax)):
+                entries[i] = entry
+        self.rki_recomputed += len(changed)
+        return list(zip(columns, entries))
 
-        with open(dict_file, 'wb') as handle:
-            pickle.dump(c_dict, handle)
-        print('RKI: ', len(c_dict.keys()))
+    def RKI_sums(self, RKI_cube, levels, days):
+        # sums of the cube per day and level values, returns (level values, infs, deaths) with
+        # matrices (level values x days), days without reports are zero, other days are dropped
+        days_index = RKI_cube.index.get_level_values('days_Meldedat')
+        if len(RKI_cube) == 0:
+            return [], np.zeros((0, len(days)), dtype = 'int64'), np.zeros((0, len(days)), dtype = 'int64')
+        if levels:
+            rollup = RKI_cube.groupby([days_index] + [RKI_cube.index.get_level_values(l) for l in levels], observed = True).sum()
+            infs = rollup['AnzahlFall'].unstack(levels, fill_value = 0)
+            deaths = rollup['AnzahlTodesfall'].unstack(levels, fill_value = 0)
+            columns = list(infs.columns)
+            if len(levels) == 1:
+                columns = [(column, ) for column in columns]
+        else:
+            rollup = RKI_cube.groupby(days_index).sum()
+            infs = rollup[['AnzahlFall']]
+            deaths = rollup[['AnzahlTodesfall']]
+            columns = [()]
+        infs = infs.reindex(days, fill_value = 0).to_numpy().T
+        deaths = deaths.reindex(days, fill_value = 0).to_numpy().T
+        return columns, infs, deaths
+
+    def series_entries(self, infs, deaths, time_minmax):
+        '''series_entries creates the c_dict entries [infs, deaths, death_rate, death_rate_std,
+        death_rate_len, time_minmax] for matrices (regions x days) of infections and deaths,
+        using one batched correlation analysis for all regions.'''
+        death_rate_stats = self.analyse_correlation_batch(infs, deaths)
+        death_rate = death_rate_stats[:,:,0]
+        death_rate_std = death_rate_stats[:,:,1]
+        # index of the last death_rate > 0, 0 if there is none
+        positive = death_rate > 0
+        death_rate_len = np.where(positive.any(axis = 1), positive.shape[1] - 1 - np.argmax(positive[:,::-1], axis = 1), 0)
+        return [[infs[i], deaths[i], death_rate[i], death_rate_std[i], int(death_rate_len[i]), time_minmax]
+                for i in range(infs.shape[0])]
 
     def update_Worldometer_to_file(self, forced_update = False):
         if not path.exists(self.local_files_dir):
             mkdir(self.local_files_dir)
-        dict_file = path.join(self.local_files_dir, self.files['Worldometers'])
-        if path.isfile(dict_file) and datetime.fromtimestamp(path.getmtime(dict_file)).date() == date.today() and not forced_update:
+        if self.store_up_to_date('Worldometers') and not forced_update:
             return
-        c_dict = {}
+        c_dict = self.build_Worldometer(self.fetch_Worldometer())
+        self.publish_source('Worldometers', c_dict)
+        print('Worldometers: ', len(c_dict.keys()))
+
+    def fetch_Worldometer(self):
+        # download stage: returns the series of the selected countries as {country: (cor_days, infs, deaths)}
+        session = self.http_session()
         # First: Load list of countries with links 
         # *********************************************
-        r = req_get('https://www.worldometers.info/coronavirus/#countries')   
-        bsdoc = BeautifulSoup(r.text, "html.parser")
+        bsdoc = BeautifulSoup(self.fetch_url(self.urls['Worldometers_index'], session).decode('utf-8'), "html.parser")
         #wm_table = bsdoc.find(id = "main_table_countries_today")
         wm_tables = bsdoc.find_all('table')
         target_table = wm_tables[0]
@@ -442,50 +688,40 @@ class CoronaData():
         wm_countries.sort()
         # import only selected country data:
         #***********************************
-        for country in ['Germany', 'France', 'Spain', 'USA', 'Sweden', 'Switzerland', 'Netherlands', 'Italy',
-        'Belgium', 'Austria', 'UK', 'China', 'Japan', 'Poland', 'Czechia', 'Ireland', 'Portugal', 'Denmark',
-        'South Africa']:
-            worldometer_path = path.join('https://www.worldometers.info/coronavirus/', wm_dict[country][0])
-            print(worldometer_path)
-            r = req_get(worldometer_path)
-            bsdoc = BeautifulSoup(r.text, "html.parser")
-            daily_cases_graph_1 = bsdoc.find_all('script', type="text/javascript")
-            for dcg in daily_cases_graph_1:
-                b = str(dcg.get_text)
-                #print(dcg.get_text)
-                if 'graph-deaths-daily' in b:
-                    start = b.find("name: 'Daily Deaths'")
-                    x_start = b[start:].find('[')
-                    x_end = b[start:].find(']')
-                    data_deaths = eval(b[x_start+start:x_end+start+1].replace('null', '0'))
-
-                    start = b.find('categ')
-                    x_start = b[start:].find('[')
-                    x_end = b[start:].find(']')
-                    data_x = b[x_start+start:x_end+start+1]
-                if 'graph-cases-daily' in b:
-                    start = b.find("name: 'Daily Cases'")
-                    x_start = b[start:].find('[')
-                    x_end = b[start:].find(']')
-                    data_cases = eval(b[x_start+start:x_end+start+1].replace('null', '0'))
-            timescale = data_x[2:-2].split('","') # split time string into dates, ignoring leading '["' and ending '"]"
-            cor_days = []
-            for i, cor_date in enumerate(timescale):
-                cor_date_date = datetime.strptime(cor_date, '%b %d, %Y')
-                cor_days.append((cor_date_date - self.start_date).days)
-            cor_days_max = max(cor_days)
-            for i, _ in enumerate(cor_days):
-                if i == 0:
-                    continue
-                if cor_days[i] - cor_days[i-1] < 0:
-                    cor_days[i] = cor_days[i] + 366
+        # pages are downloaded concurrently, every page is parsed as soon as it has arrived
+        series = {}
+        with ThreadPoolExecutor(max_workers = self.http_workers) as pool:
+            futures = {}
+            for country in self.wdm_countries:
+                worldometer_path = path.join(self.urls['Worldometers'], wm_dict[country][0])
+                print(worldometer_path)
+                futures[pool.submit(self.fetch_url, worldometer_path, session)] = country
+            for future in as_completed(futures):
+                series[futures[future]] = self.parse_Worldometer_page(future.result().decode('utf-8'))
+        session.close()
+        return {country: series[country] for country in self.wdm_countries}
 
-            if list(range(cor_days[0], cor_days[-1] + 1)) == cor_days:
-                deaths = np.array([0] * cor_days[0] + data_deaths)
-                infs = np.array([0] * cor_days[0] + data_cases)
-                cor_days = np.array(list(range(cor_days[0])) + cor_days)
-            else:
-                pass
+    def parse_Worldometer_page(self, page):
+        # returns (cor_days, infs, deaths) of a worldometers country page
+        timescale, data_cases, data_deaths = extract_worldometer_series(page)
+        cor_days = np.array([date_ordinal(cor_date) for cor_date in timescale]) - self.start_date.toordinal()
+        # as in the former per-date loop, a date before its predecessor shifts it and all following days
+        # by 366. The dates carry their year, so this only changes categories which are not in order
+        cor_days = cor_days + 366 * np.cumsum(np.hstack(([0], np.diff(cor_days) < 0)))
+
+        if np.array_equal(cor_days, np.arange(cor_days[0], cor_days[-1] + 1)):
+            deaths = np.hstack((np.zeros(cor_days[0], dtype = 'int32'), data_deaths))
+            infs = np.hstack((np.zeros(cor_days[0], dtype = 'int32'), data_cases))
+            cor_days = np.arange(0, cor_days[-1] + 1)
+        else:
+            deaths = data_deaths
+            infs = data_cases
+        return cor_days, infs, deaths
+
+    def build_Worldometer(self, series):
+        # parse stage: create c_dict from the series of fetch_Worldometer
+        c_dict = {}
+        for country, (cor_days, infs, deaths) in series.items():
             deaths_copy = np.copy(deaths)
             death_rate_stats = self.analyse_correlation(infs, deaths_copy)
             death_rate = death_rate_stats[:,0]
@@ -496,22 +732,26 @@ class CoronaData():
                 death_rate_len = 0
             time_minmax = (min(cor_days), max(cor_days))
             c_dict[('WDM', country, country)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
-
-        with open(dict_file, 'wb') as handle:
-            pickle.dump(c_dict, handle)
-        print('Worldometers: ', len(c_dict.keys()))
+        return c_dict
 
     def update_DIVI_to_file(self, forced_update=False):
         if not path.exists(self.local_files_dir):
             mkdir(self.local_files_dir)
-        dict_file = path.join(self.local_files_dir, self.files['DIVI'])
-        if path.isfile(dict_file) and datetime.fromtimestamp(path.getmtime(dict_file)).date() == date.today() and not forced_update:
+        if self.store_up_to_date('DIVI') and not forced_update:
             return
+        c_dict = self.build_DIVI(self.fetch_DIVI())
+        self.publish_source('DIVI', c_dict)
+        print('DIVI: ', len(c_dict.keys()))  
+
+    def fetch_DIVI(self):
+        # download stage: raw csv data
+        return self.fetch_url(self.urls['DIVI'])
+
+    def build_DIVI(self, raw):
+        # parse stage: create c_dict from the raw data of fetch_DIVI
         c_dict = {}
-        DIVI_df = pd.read_csv('https://diviexchange.blob.core.windows.net/%24web/bundesland-zeitreihe.csv')
-        DIVI_df.insert(0, 'Datum_Tag', 'x')
-        DIVI_df['Datum_Tag'] = [(datetime.strptime(x[:10],'%Y-%m-%d') - self.start_date).days \
-                                    for x in DIVI_df['Datum']]  #(date - self.start_date).days
+        DIVI_df = pd.read_csv(BytesIO(raw))
+        DIVI_df.insert(0, 'Datum_Tag', self.day_numbers(DIVI_df['Datum'].str[:10], '%Y-%m-%d'))
         DIVI_df.drop(columns='Datum', inplace=True)
         print(DIVI_df.columns)
         DIVI_pivot_df = pd.pivot_table(DIVI_df, 
@@ -532,92 +772,78 @@ class CoronaData():
                             [DIVI_pivot_df_clear.loc[:, ('Aktuelle_COVID_Faelle_Erwachsene_ITS', country)],
                             DIVI_pivot_df_clear.loc[:, ('Belegte_Intensivbetten_Erwachsene', country)], 
                             leere_liste, leere_liste, death_rate_len, time_minmax]
-        with open(dict_file, 'wb') as handle:
-            pickle.dump(c_dict, handle)
-        print('DIVI: ', len(c_dict.keys()))  
+        return c_dict
+
+    def day_numbers(self, dates, dateformat):
+        # day numbers (days since start_date) of a sequence of date strings in dateformat
+        return (pd.to_datetime(pd.Series(dates), format = dateformat) - self.start_date).dt.days.to_numpy()
+
+    def densify_days(self, data_df, cor_days, n_days = None):
+        '''densify_days returns data_df (one row per report, cor_days the day numbers of its rows)
+        with one row for every day 0 .. n_days-1 (default: up to the last report) and the day numbers
+        as index. Days without report are filled with zeros, rows before start_date are dropped.'''
+        if n_days is None:
+            n_days = max(cor_days) + 1
+        return data_df.set_axis(cor_days, axis = 0).reindex(range(n_days), fill_value = 0)
 
     def clean_RKI_array(self, import_df, refscale = [0, 0]):
-        import_df.reset_index(inplace = True)
-        cor_days = (import_df.values[:,0]).astype('int')
-        
-        # fill missing values rows
-        import_df_data = import_df.iloc[2:,:]
-        import_df['day_nr'] = cor_days
-        # fill in dates with no report
-        null_list = [0]*import_df.shape[1]
-        last_date = max(max(refscale) + 1, max(cor_days) + 1)
-        missing_dates = np.setdiff1d(list(range(last_date)), cor_days)
-        null_df = pd.DataFrame([null_list]*len(missing_dates), columns = import_df.columns, index = missing_dates)
-        null_df['day_nr'] = missing_dates
-        import_df =  import_df.append(null_df)
-        import_df.sort_values('day_nr', inplace = True)
-        # drop rows before start_date
-        import_df = import_df[import_df['day_nr'] >= 0]
-        timescale = import_df['day_nr']
-        # column 'day_nr' is not needed any more:
-        import_df.drop(['day_nr'], axis = 1, inplace = True)
-        # add header and data:
-
-        return import_df, timescale
-
-    def clean_import_array(self, import_df, dateformat):
-        timescale = import_df.values[2:,0]
-        cor_days = []
-        for i, cor_date in enumerate(timescale):
-            date = datetime.strptime(cor_date, dateformat)
-            cor_days.append((date - self.start_date).days)
-        # fill missing values rows
-        import_df_header = import_df.iloc[:2,:]
-        import_df_data = import_df.iloc[2:,:].copy(deep=True)
-        import_df_data.iloc[:, 1:] = import_df_data.iloc[:, 1:].diff()
-        import_df_data.iloc[0, 1:] = 0
-        import_df_data['day_nr'] = cor_days
-        # fill in dates with no report
-        null_list = [0]*import_df_data.shape[1]
-        missing_dates = np.setdiff1d(list(range(max(cor_days)+1)), cor_days)
-        null_df = pd.DataFrame([null_list]*len(missing_dates), columns = import_df_data.columns, index = missing_dates)
-        null_df['day_nr'] = missing_dates
-        import_df_data =  import_df_data.append(null_df)
-        import_df_data.sort_values('day_nr', inplace = True)
-        # drop rows before start_date
-        import_df_data = import_df_data[import_df_data['day_nr'] >= 0]
-        timescale = import_df_data['day_nr']
-        # column 'day_nr' is not needed any more:
-        import_df_data.drop(['day_nr'], axis = 1, inplace = True)
-        # add header and data:
-        import_df = import_df_header.append(import_df_data)
-
-        return import_df, timescale
+        # import_df: pivot table with day numbers as index. Returns the table with the day numbers as
+        # first column and a row for every day up to the last day of import_df or refscale, and the timescale
+        cor_days = import_df.index.to_numpy().astype('int')
+        n_days = max(max(refscale), max(cor_days)) + 1
+        import_df = self.densify_days(import_df.reset_index(), cor_days, n_days)
+        return import_df, import_df.index.to_series()
 
     def analyse_correlation(self, c_i, c_d):
         # c_i: 1-dim array of infected per day
         # c_d: 1-dim array of deaths per day
+        # single region call of analyse_correlation_batch
+        return self.analyse_correlation_batch(np.asarray(c_i)[np.newaxis, :], np.asarray(c_d)[np.newaxis, :])[0]
+
+    def analyse_correlation_batch(self, c_i, c_d, chunk_size = 64):
+        '''analyse_correlation_batch analyses the correlation of infections and deaths
+        for a whole matrix of regions at once.
+        c_i: 2-dim array (regions x days) of infected per day,
+        c_d: 2-dim array (regions x days) of deaths per day,
+        chunk_size: number of regions handled per vectorized pass (limits memory).
+        Returns an array (regions x days x 4), one correl_results block per region.'''
         offset = 100  # only the first offset days are considered for analysis
-        c_d[offset:]=0 # ignore the rest
-        num_entries = c_i.shape[0]
-        correl_results = np.zeros((num_entries, 4))
-        for shift in range(offset): #num_entries
-            c_d1 = c_d
-            if shift >0:
-                c_d1 = np.roll(c_d1,-shift)
-                c_d1[-shift:]=0
-            temp_i = []
-            temp_d = []
-            for i,_ in enumerate(c_i):
-                if c_i[i] > self.limit and c_d1[i] > self.limit:
-                    temp_i.append(np.log(c_i[i]))
-                    temp_d.append(np.log(c_d1[i]))
-            temp_i = np.array(temp_i)
-            temp_d = np.array(temp_d)
-            diff = temp_i-temp_d
-            c_mean = np.mean(diff)
-            c_std = np.std(diff)
-            c_var = np.var(diff)
-            if not np.isnan(c_mean) and not np.isnan(c_std) and not np.isnan(c_var) and len(temp_i) > self.limit_len:
-                correl_results[shift,0] = np.exp(-c_mean)
-                correl_results[shift,1] = c_std
-                correl_results[shift,2] = c_var
-                correl_results[shift,3] = len(temp_i)
+        c_i = np.asarray(c_i, dtype = 'float')
+        c_d = np.asarray(c_d, dtype = 'float')
+        num_regions, num_entries = c_i.shape
+        correl_results = np.zeros((num_regions, num_entries, 4))
+        # deaths are ignored from day offset on, so shifted deaths are zero for
+        # every day >= offset and only shifts < offset can give results
+        days = min(offset, num_entries)
+        if days == 0:
+            return correl_results
+        for first in range(0, num_regions, chunk_size):
+            last = min(first + chunk_size, num_regions)
+            infs = c_i[first:last, :days]
+            # deaths padded with zeros, a sliding window over the padded array gives
+            # the shifted deaths for all shifts at once: shifted[r, shift, i] = c_d[r, i + shift]
+            deaths = np.zeros((last - first, 2 * days))
+            deaths[:, :days] = c_d[first:last, :days]
+            infs_valid = infs > self.limit
+            deaths_valid = deaths > self.limit
+            infs_log = np.log(np.where(infs_valid, infs, 1.0))
+            deaths_log = np.log(np.where(deaths_valid, deaths, 1.0))
+            shifted_log = np.lib.stride_tricks.sliding_window_view(deaths_log, days, axis = 1)[:, :days, :]
+            shifted_valid = np.lib.stride_tricks.sliding_window_view(deaths_valid, days, axis = 1)[:, :days, :]
+            mask = infs_valid[:, np.newaxis, :] & shifted_valid
+            diff = np.where(mask, infs_log[:, np.newaxis, :] - shifted_log, 0.0)
+            count = mask.sum(axis = 2)
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                c_mean = diff.sum(axis = 2) / count
+                c_var = (np.where(mask, diff - c_mean[:, :, np.newaxis], 0.0) ** 2).sum(axis = 2) / count
+            valid = (count > self.limit_len) & np.isfinite(c_mean) & np.isfinite(c_var)
+            c_mean = np.where(valid, c_mean, 0.0)
+            c_var = np.where(valid, c_var, 0.0)
+            results = correl_results[first:last, :days]
+            results[..., 0] = np.where(valid, np.exp(-c_mean), 0)
+            results[..., 1] = np.sqrt(c_var)
+            results[..., 2] = c_var
+            results[..., 3] = np.where(valid, count, 0)
         return correl_results
 
     def find_mins(self, series_of_values):
@@ -672,13 +898,12 @@ class CoronaData():
             spl = UnivariateSpline(inf_time, inf_log, s=20, k=5)
         else:
             # create a reduced timescale with only one point per week
-            spl_time = []
-            spl_inf_log = []
             # spl_time is a reduced time scale with oly one point per week,
             # spl_inf_log contains the corresponding y values averaged over one week, on log scale
-            for i in range(3,len(inf_time)-3, 7):
-                spl_time.append(inf_time[i])
-                spl_inf_log.append(np.log(np.mean(np.exp(inf_log[i-3:i+4]))))
+            spl_indices = np.arange(3, len(inf_time)-3, 7)
+            spl_time = inf_time[spl_indices]
+            inf_week = np.lib.stride_tricks.sliding_window_view(np.exp(inf_log), 7)[spl_indices - 3]
+            spl_inf_log = np.log(inf_week.mean(axis = 1))
 
             try:
                 spl = UnivariateSpline(spl_time, spl_inf_log, s = spline_s, k = spline_k)
@@ -703,14 +928,12 @@ class CoronaData():
                                  for i in range(len(correct_day_indices))]
             # correction will be a numpy array containing the correction values
             # for every day in inf_time
-            correction = np.zeros(len(inf_time))
-            for i, t in enumerate(inf_time):
-                if np.isnan(inf_weekdays[i]):
-                    # in case of any problem
-                    correction[i] = 0
-                    print("isnan-Schleife!")
-                else:
-                    correction[i] = correct_residuals[int(inf_weekdays[i])]
+            weekdays_nan = np.isnan(inf_weekdays)
+            if weekdays_nan.any():
+                # in case of any problem
+                print("isnan-Schleife!")
+            correction = np.where(weekdays_nan, 0,
+                                  np.asarray(correct_residuals)[np.where(weekdays_nan, 0, inf_weekdays).astype(int)])
         else:
             # Here, correction is calculated from a limited time range around
             # the respective date. Thus, the algorithm can adopt to changes in
@@ -724,32 +947,37 @@ class CoronaData():
             res_spline_tmp = res_spline[:correct_region]
             weekdays_tmp = inf_weekdays[:correct_region]
             correct_residuals = [np.median(res_spline_tmp[np.where(weekdays_tmp == correct_day_indices[i])]) for i in range(len(correct_day_indices))]
-            for i in range(correct_region):
-                correction[i] = correct_residuals[int(inf_weekdays[i])]
+            correction[:correct_region] = np.asarray(correct_residuals)[inf_weekdays[:correct_region].astype(int)]
             # end region:
             res_spline_tmp = res_spline[-correct_region:]
             weekdays_tmp = inf_weekdays[-correct_region:]
             correct_residuals = [np.median(res_spline_tmp[np.where(weekdays_tmp == correct_day_indices[i])]) for i in range(len(correct_day_indices))]
-            for i in range(len(inf_time) - correct_region, len(inf_time)):
-                correction[i] = correct_residuals[int(inf_weekdays[i])]
+            correction[-correct_region:] = np.asarray(correct_residuals)[inf_weekdays[-correct_region:].astype(int)]
             # intermediate region:
             correct_region_half = int(correct_region / 2)
             # for every point from the middle of start region to the middle of th eend region
             # correction is calculated "manually" as median of the residuals on the respective weekday
             # in a time range of +/- half the correct_region
-            for i in range(correct_region_half, len(inf_time) - correct_region_half):
-                res_spline_tmp = res_spline[i - correct_region_half:i + correct_region_half]
-                weekdays_tmp = inf_weekdays[i - correct_region_half:i + correct_region_half]
-                correction[i] =  np.median(res_spline_tmp[np.where(weekdays_tmp == inf_weekdays[i])])
+            n_days = len(inf_time)
+            if np.array_equal(inf_weekdays, (inf_weekdays[0] + np.arange(n_days)) % 7):
+                # consecutive days: the same weekday is found at fixed offsets 7*k within
+                # [i - correct_region_half, i + correct_region_half), so all windows are
+                # covered by one stack of shifted residuals (one row per offset)
+                offsets = 7 * np.arange(-(correct_region_half // 7), -(-correct_region_half // 7))
+                res_shifted = np.array([res_spline[correct_region_half + o:n_days - correct_region_half + o] for o in offsets])
+                correction[correct_region_half:n_days - correct_region_half] = np.median(res_shifted, axis = 0)
+            else:
+                for i in range(correct_region_half, n_days - correct_region_half):
+                    res_spline_tmp = res_spline[i - correct_region_half:i + correct_region_half]
+                    weekdays_tmp = inf_weekdays[i - correct_region_half:i + correct_region_half]
+                    correction[i] =  np.median(res_spline_tmp[np.where(weekdays_tmp == inf_weekdays[i])])
         # smoothing by a running average with n=3 (+/- one neighbour)
         # add 1 point at both ends on a temporary array
         inf_corr_0 = np.zeros(len(inf_log) + 2)
         inf_corr_0[1:-1] = np.exp(inf_log - correction)
         inf_corr_0[0] = inf_corr_0[1]
         inf_corr_0[-1] = inf_corr_0[-2]
-        inf_log_corr = np.zeros(len(inf_log))
-        for i in range(1, len(inf_corr_0) - 1):
-            inf_log_corr[i-1] = np.log(np.mean(inf_corr_0[i-1:i+2]))
+        inf_log_corr = np.log((inf_corr_0[:-2] + inf_corr_0[1:-1] + inf_corr_0[2:]) / 3)
 
         # inf_time: time in days, starting with 1st non-zero value of y
         # inf_log: log(y) corresponding to inf_time
@@ -762,6 +990,74 @@ class CoronaData():
         # inf_log_spline: spline corresponding to inf_time
         return inf_time, inf_log, inf_log_corr, correction, inf_weekdays, correct_day_indices, correct_residuals, res_spline, inf_log_spline
 
+    def remove_weekly_cached(self, key, subset, correct_weeks = 6, spline_s = 1, spline_k = 5):
+        '''remove_weekly_cached returns remove_weekly results for the series subset ('inf' or 'deaths')
+        of corona_dict[key]. Results are kept in an LRU cache keyed by all parameters and
+        the data version, the returned arrays are read-only.'''
+        cache_key = (key, subset, correct_weeks, spline_s, spline_k, self.data_version)
+        return self.weekly_cache.get_or_compute(cache_key, self.compute_remove_weekly,
+                                                key, subset, correct_weeks, spline_s, spline_k)
+
+    def compute_remove_weekly(self, key, subset, correct_weeks, spline_s, spline_k):
+        subset_idx = {'inf': 0, 'deaths': 1}[subset]
+        time_minmax = self.corona_dict[key][5]
+        x = np.arange(time_minmax[0], time_minmax[1] + 1)
+        y = self.corona_dict[key][subset_idx]
+        weekdays = (self.start_date.weekday() + x) % 7
+        result = self.remove_weekly(x, y, weekdays, correct_weeks = correct_weeks,
+                                    spline_s = spline_s, spline_k = spline_k)
+        for item in result or ():
+            if isinstance(item, np.ndarray):
+                item.flags.writeable = False
+        return result
+
+    def weekly_corrected(self, key, subset, correct_weeks, spline_s = 0, spline_k = 5):
+        '''weekly_corrected returns x and y (not on log scale) of the weekly corrected series subset
+        ('inf' or 'deaths') of corona_dict[key]. Series precomputed at refresh time are read from
+        the store, other settings are computed by remove_weekly_cached.'''
+        if spline_s == 0 and spline_k == 5:
+            series = self.corona_dict.weekly_series(key, {'inf': 0, 'deaths': 1}[subset], correct_weeks)
+            if series is not None:
+                return series
+        result_remove_weekly = self.remove_weekly_cached(key, subset, correct_weeks = correct_weeks,
+                                                         spline_s = spline_s, spline_k = spline_k)
+        return result_remove_weekly[0], np.exp(result_remove_weekly[2])
+
+    def precompute_weekly(self, c_dict):
+        '''precompute_weekly returns the weekly corrected infections and deaths of all keys of c_dict
+        for the default settings of the graph (spline_s = 0, spline_k = 5) and every value of
+        precompute_weeks: {correct_weeks: {key: [(x, y) of infections, (x, y) of deaths]}}.
+        Series which cannot be corrected (e.g. too short for the spline) are None.'''
+        weekly = {}
+        with warnings.catch_warnings():
+            # medians of empty weekday selections for short series
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for correct_weeks in self.precompute_weeks:
+                weekly[correct_weeks] = {key: [self.weekly_corrected_series(series, subset_idx, correct_weeks)
+                                               for subset_idx in (0, 1)]
+                                         for key, series in c_dict.items()}
+        return weekly
+
+    def weekly_corrected_series(self, series, subset_idx, correct_weeks, spline_s = 0, spline_k = 5):
+        # weekly correction of a c_dict entry as in compute_remove_weekly, values are rounded
+        # to int32 as in the store, so the result is the same as at request time
+        time_minmax = series[5]
+        x = np.arange(time_minmax[0], time_minmax[1] + 1)
+        weekdays = (self.start_date.weekday() + x) % 7
+        try:
+            result = self.remove_weekly(x, to_int32(series[subset_idx]), weekdays, correct_weeks = correct_weeks,
+                                        spline_s = spline_s, spline_k = spline_k)
+        except Exception:
+            return None
+        if result is None:
+            return None
+        return result[0], np.exp(result[2])
+
+    def invalidate_weekly_cache(self):
+        # called whenever data has been written or loaded
+        self.data_version += 1
+        self.weekly_cache.invalidate()
+
     def export_current_curve(self, index, spline_s, spline_k, correct_weeks, R_time, R_infs):
         if not path.exists(self.local_files_dir):
             mkdir(self.local_files_dir)
@@ -785,6 +1081,87 @@ class CoronaData():
                 csv_writer.writerow([timescale[i], time_output,  infs[i], deaths[i], int(np.exp(inf_log_corr[i])), int(np.exp(death_log_corr[i])), int(R_infs[int(10*(i-1))])])
 
 
+# CoronaData instance shared by all users of a process, see get_shared_data
+shared_data = None
+shared_data_lock = Lock()
+
+
+def get_shared_data():
+    '''get_shared_data returns the CoronaData instance shared within this process, created on first use.
+    With a preloading server (gunicorn.conf.py) it is created once in the master process and
+    inherited by the forked workers: the series are read-only views of the memory-mapped stores,
+    so all workers share the same pages. Workers call reattach_if_stale to follow refreshes.'''
+    global shared_data
+    with shared_data_lock:
+        if shared_data is None:
+            shared_data = CoronaData()
+    return shared_data
+
+
+# columns of the RKI csv file which are used, with their dtypes
+RKI_DTYPES = {'Bundesland': 'category', 'Landkreis': 'category', 'Altersgruppe': 'category',
+              'Meldedatum': 'category', 'AnzahlFall': 'int32', 'AnzahlTodesfall': 'int32',
+              'NeuerFall': 'int8', 'NeuerTodesfall': 'int8'}
+
+# date columns of the JHU time series (month/day/year)
+RE_JHU_DATE = re.compile(r'\d{1,2}/\d{1,2}/\d{2}$')
+
+# Highcharts scripts of worldometers country pages, see extract_worldometer_series
+RE_SCRIPT = re.compile(r'<script[^>]*type="text/javascript"[^>]*>(.*?)</script>', re.S)
+RE_DAILY_DEATHS = re.compile(r"name: 'Daily Deaths'[^\[]*\[([^\]]*)\]")
+RE_DAILY_CASES = re.compile(r"name: 'Daily Cases'[^\[]*\[([^\]]*)\]")
+RE_CATEGORIES = re.compile(r'categ[^\[]*\[([^\]]*)\]')
+
+
+def extract_worldometer_series(page):
+    '''extract_worldometer_series reads the daily cases and deaths from the Highcharts scripts
+    of a worldometers country page in one regex pass over the script tags, without building a DOM.
+    Returns the list of date strings (categories of the deaths graph) and the daily cases and
+    deaths as np.int32 arrays (null is read as 0).'''
+    timescale = data_cases = data_deaths = None
+    for script in RE_SCRIPT.finditer(page):
+        text = script.group(1)
+        if 'graph-deaths-daily' in text:
+            data_deaths = read_int32_list(RE_DAILY_DEATHS.search(text).group(1))
+            timescale = RE_CATEGORIES.search(text).group(1).strip()[1:-1].split('","')
+        if 'graph-cases-daily' in text:
+            data_cases = read_int32_list(RE_DAILY_CASES.search(text).group(1))
+    return timescale, data_cases, data_deaths
+
+
+@lru_cache(maxsize = 4096)
+def date_ordinal(cor_date):
+    # worldometers date string to ordinal, all country pages share the same dates
+    return datetime.strptime(cor_date, '%b %d, %Y').toordinal()
+
+
+def read_int32_list(values):
+    # comma separated javascript numbers to np.int32 array
+    return np.fromstring(values.replace('null', '0'), dtype = 'int32', sep = ',')
+
+
+def is_local(url):
+    # True if url refers to a local file instead of a web resource
+    return not url.startswith(('http://', 'https://'))
+
+
+def compact_trace(x, y):
+    '''compact_trace encodes the series of a graph trace for the transport to the browser.
+    Evenly spaced x (day numbers) is sent as plotly's x0 and dx, other x as list. y is sent as
+    little-endian float32 bytes in base64 ('y_b64'), which is decoded to a Float32Array
+    by the clientside callback of the graph. Returns a dict to be merged into the trace.'''
+    x = np.asarray(x)
+    y = np.asarray(y, dtype = '<f4')
+    trace = {'y_b64': base64.b64encode(y.tobytes()).decode('ascii')}
+    steps = np.diff(x)
+    if len(x) > 0 and (len(steps) == 0 or np.all(steps == steps[0])):
+        trace['x0'] = x[0].item()
+        trace['dx'] = steps[0].item() if len(steps) else 1
+    else:
+        trace['x'] = x.tolist()
+    return trace
+
+
 if __name__ == '__main__':
     cordat = CoronaData()
 
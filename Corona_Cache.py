@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from os import environ, path
+from tempfile import gettempdir
+from threading import RLock
+
+
+class LRUCache():
+    ''' LRUCache is a bounded least-recently-used cache. Access is thread-safe,
+    hits and misses are counted for monitoring.
+    '''
+    def __init__(self, maxsize = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = RLock()
+
+    def get(self, key, default = None):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last = False)
+
+    def get_or_compute(self, key, func, *args, **kwargs):
+        # return cached value of key, call func(*args, **kwargs) and cache its result on a miss.
+        # func runs outside the lock, concurrent misses of one key may compute it twice
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        value = func(*args, **kwargs)
+        self.put(key, value)
+        return value
+
+    def invalidate(self, predicate = None):
+        # remove all entries, or only those whose key fulfils predicate(key)
+        with self.lock:
+            if predicate is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if predicate(key)]:
+                    del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self.entries), 'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def flask_cache_config():
+    ''' flask_cache_config returns the Flask-Caching configuration of the cache of the row series of
+    the app (see cached_series), read from the environment:
+    CMV_CACHE_TYPE: cache type, default SimpleCache (per process). FileSystemCache is shared by all
+    processes, e.g. the gunicorn workers (see gunicorn.conf.py),
+    CMV_CACHE_DIR: directory of a FileSystemCache, default cmv_cache in the temporary directory,
+    CMV_CACHE_TIMEOUT: seconds an entry is kept, default 3600,
+    CMV_CACHE_THRESHOLD: max. number of entries, default 500.
+    '''
+    config = {'CACHE_TYPE': environ.get('CMV_CACHE_TYPE', 'SimpleCache'),
+              'CACHE_DEFAULT_TIMEOUT': int(environ.get('CMV_CACHE_TIMEOUT', 3600)),
+              'CACHE_THRESHOLD': int(environ.get('CMV_CACHE_THRESHOLD', 500))}
+    if config['CACHE_TYPE'] == 'FileSystemCache':
+        config['CACHE_DIR'] = environ.get('CMV_CACHE_DIR', path.join(gettempdir(), 'cmv_cache'))
+    return config
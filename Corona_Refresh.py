@@ -0,0 +1,126 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import get_context, get_all_start_methods
+from os import path, mkdir
+from time import perf_counter
+
+from CoronaData_online import CoronaData
+
+
+class RefreshError(Exception):
+    ''' RefreshError is raised by CoronaRefresh.run if any source failed, after all other sources
+    have been published. failures: {source: exception}, timings: as returned by run.
+    '''
+    def __init__(self, failures, timings):
+        super().__init__('refresh failed for ' + ', '.join(f'{source} ({e!r})' for source, e in failures.items()))
+        self.failures = failures
+        self.timings = timings
+
+
+class CoronaRefresh():
+    ''' CoronaRefresh runs the updates of all data sources of a CoronaData instance concurrently.
+    Downloads (fetch_* methods) run in a thread pool, parsing, correlation analysis (build_* methods)
+    and the weekly correction (precompute_weekly) in a process pool. Every source is published to its store as soon
+    as it is finished, independent of the other sources.
+    '''
+    def __init__(self, cordat, download_workers = 5, build_workers = None):
+        self.cordat = cordat
+        self.download_workers = download_workers
+        self.build_workers = build_workers
+        # source: (fetch method, build method, keyword arguments of build method)
+        self.steps = {'JHUGL': ('fetch_jhu_global', 'build_jhu_global', {}),
+                      'JHU_US': ('fetch_jhu_US', 'build_jhu_US', {'show_counties': cordat.show_counties}),
+                      'RKI': ('fetch_RKI', 'build_RKI', {}),
+                      'Worldometers': ('fetch_Worldometer', 'build_Worldometer', {}),
+                      'DIVI': ('fetch_DIVI', 'build_DIVI', {})}
+
+    def run(self, sources = None, forced_update = False):
+        ''' run updates sources (default: all) and returns the timings in seconds per source:
+        {source: {'download': t, 'build': t, 'publish': t, 'total': t}}, or {'error': message}
+        for a source which failed. Sources updated today are skipped unless forced_update.
+        Failed sources do not stop the others, RefreshError is raised at the end.
+        Pickled dict files newer than the stores are converted first (CoronaData.convert_dict_files).'''
+        cordat = self.cordat
+        if not path.exists(cordat.local_files_dir):
+            mkdir(cordat.local_files_dir)
+        if sources is None:
+            sources = list(self.steps.keys())
+        sources = [source for source in sources if forced_update or not cordat.store_up_to_date(source)]
+        if cordat.convert_dict_files():
+            cordat.populate_dict()
+        timings = {source: {} for source in sources}
+        failures = {}
+        t_start = {}
+        pending = {}
+        with ThreadPoolExecutor(max_workers = self.download_workers) as download_pool, \
+                ProcessPoolExecutor(max_workers = self.build_workers, mp_context = build_context()) as build_pool:
+            for source in sources:
+                t_start[source] = perf_counter()
+                pending[download_pool.submit(getattr(cordat, self.steps[source][0]))] = (source, 'download')
+            while pending:
+                done, _ = wait(pending.keys(), return_when = FIRST_COMPLETED)
+                for future in done:
+                    source, stage = pending.pop(future)
+                    t_stage = perf_counter()
+                    timings[source][stage] = t_stage - t_start[source] - sum(timings[source].values())
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f'{source}: {stage} failed: {e!r}')
+                        timings[source] = {'error': repr(e)}
+                        failures[source] = e
+                        continue
+                    if stage == 'download':
+                        _, build_name, build_kwargs = self.steps[source]
+                        pending[build_pool.submit(build_source, build_config(cordat), build_name,
+                                                  result, build_kwargs)] = (source, 'build')
+                    else:
+                        c_dict, weekly, rki_recomputed = result
+                        if source == 'RKI':
+                            cordat.rki_recomputed = rki_recomputed
+                        cordat.publish_source(source, c_dict, weekly)
+                        cordat.populate_dict()
+                        timings[source]['publish'] = perf_counter() - t_stage
+                        timings[source]['total'] = perf_counter() - t_start[source]
+                        print(f'{source}: {len(c_dict)} series, ' +
+                              ', '.join(f'{stage} {t:.2f} s' for stage, t in timings[source].items()))
+        if failures:
+            raise RefreshError(failures, timings)
+        return timings
+
+
+def build_context():
+    # the build workers start while the download threads may hold locks (requests, urllib3), forked
+    # workers could inherit them held. They are started by a fork server instead (spawn on Windows)
+    return get_context('forkserver' if 'forkserver' in get_all_start_methods() else 'spawn')
+
+
+def build_config(cordat):
+    # settings of cordat needed by the build stage in a worker process
+    return {'start_date': cordat.start_date, 'local_files_dir': cordat.local_files_dir,
+            'limit': cordat.limit, 'limit_len': cordat.limit_len, 'urls': cordat.urls,
+            'precompute_weeks': cordat.precompute_weeks, 'rki_incremental': cordat.rki_incremental,
+            'rki_chunksize': cordat.rki_chunksize}
+
+
+def build_source(config, build_name, raw, build_kwargs):
+    # runs in a worker process: parse raw data with a CoronaData instance which loads no data
+    # and precompute the weekly corrected series, returns c_dict, weekly and the number of
+    # RKI series analysed (rki_recomputed, 0 for the other sources)
+    cordat = CoronaData(load = False)
+    for attribute, value in config.items():
+        setattr(cordat, attribute, value)
+    c_dict = getattr(cordat, build_name)(raw, **build_kwargs)
+    return c_dict, cordat.precompute_weekly(c_dict), cordat.rki_recomputed
+
+
+if __name__ == '__main__':
+    # usage: python Corona_Refresh.py [--force] [source ...]
+    #        python Corona_Refresh.py --convert-only   (converts the pickled dicts to stores, no downloads)
+    args = sys.argv[1:]
+    if '--convert-only' in args:
+        CoronaData(load = False).convert_dict_files()
+        sys.exit()
+    forced_update = '--force' in args
+    sources = [arg for arg in args if arg != '--force'] or None
+    CoronaRefresh(CoronaData()).run(sources, forced_update = forced_update)
@@ -1,115 +1,336 @@
 from datetime import datetime, timedelta, date
 import numpy as np
-from os import path
+from os import path, replace
+import ast
+import json
+import re
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import warnings
+from Corona_Cache import LRUCache
 
 class Rt():
     ''' class R handles the time dependent R function and the 
     calculated infections derived from this function '''
-    def __init__(self, cordat):
-        self.country = ''
+    def __init__(self, cordat, R_table_file = 'R_table.dict'):
         self.gen = 4     # Generation: 4 days
-        self.x_max = 1   
-        self.last_model_valid = False
-        self.last_R_steps = []
         self.R_dict = {}
+        self.R_table_file = R_table_file    # R_table.dict format, JSON lines if the name ends with .jsonl
+        self.model_cache = LRUCache(maxsize = 64)   # step R models, key: (country, x_max, tuple(R_steps))
         self.load_R_table()
         self.cordat = cordat
 
     def get_R_func(self, country, time_minmax):
-        R_model_valid = True
         x_max = time_minmax[1] + 5
-        if not (country == self.country and x_max == self.x_max and self.last_model_valid):         # no change, just return data      
-            if country in self.R_dict.keys():                              # country in list, create functions
-                self.create_func_data(country, x_max)
-                self.last_model_valid = True
-            else:                                                   # country not in list, create dummy
-                R_model_valid = False
-                self.last_model_valid = False
-                self.time_R = np.arange(1, x_max, 0.1)
-                self.R_func = np.ones(10 * (x_max - 1), dtype = 'float')
-        return self.time_R, self.R_func, R_model_valid 
+        if country not in self.R_dict:                              # country not in list, create dummy
+            return np.arange(1, x_max, 0.1), np.ones(10 * (x_max - 1), dtype = 'float'), False
+        time_R, R_func, _ = self.create_func_data(country, x_max)
+        return time_R, R_func, True
 
     def get_inf_R(self, country, time_minmax):
-        R_model_valid = True
         x_max = time_minmax[1] + 5
-        if not (country == self.country and x_max == self.x_max and self.last_model_valid):         # no change, just return data      
-            if country in self.R_dict:    
-                print('country in dict')                          # country in list, create functions
-                self.create_func_data(country, x_max)
-                self.last_model_valid = True
-            else:                                                   # country not in list, create dummy
-                R_model_valid = False
-                self.last_model_valid = False
-                self.time_R = np.arange(1, x_max, 0.1)
-                self.infected_R = np.ones(10 * (x_max - 1))
-        return self.time_R, self.infected_R, R_model_valid   
-
-    def create_func_data(self, country, x_max):  # get dict entries, calculate R-function, calculate infected
-        self.x_max = x_max
-        self.country = country
+        if country not in self.R_dict:                              # country not in list, create dummy
+            return np.arange(1, x_max, 0.1), np.ones(10 * (x_max - 1)), False
+        time_R, _, infected_R = self.create_func_data(country, x_max)
+        return time_R, infected_R, True
+
+    def create_func_data(self, country, x_max):
+        '''create_func_data returns time_R, R_func and infected_R of the R steps of country (see step_R_model).
+        Results are kept in an LRU cache shared by all requests, the arrays are read-only.'''
         steps = self.R_dict[country]            # tuples which define steps in R
-        int_const = 1.0                         # integration constant
-        integration_steps = 100
-        R_temp=[]
-        switch_r=[]
-        for i in range(len(steps)):
-            R_temp.append(steps[i][1])
-            switch_r.append(steps[i][0])
-        if len(switch_r) > 0:
-            del switch_r[0]
-        switch_r.append(1000)
-        R = list(reversed(R_temp))
-        switch = list(reversed(switch_r))
-        x_for_int = np.arange(1, x_max, 1/integration_steps)   # timescale for integration
-        int_func = np.zeros(len(x_for_int))     # empty array for R-function creation
-        for i, t in enumerate(x_for_int):
-            for j in range(len(switch)):
-                    if t < switch[j]:
-                        int_func[i] = R[j]
-        f_prime = np.log(int_func)/self.gen      # derivation of infected per day on log scale   
-        infected_raw = np.zeros(len(f_prime))
-        for i, t in enumerate(f_prime):
-            if i == 0:
-                continue
-            else:
-                infected_raw[i] = infected_raw[i-1] + (f_prime[i]+f_prime[i-1])/2 * (x_for_int[i]-x_for_int[i-1])
-        self.time_R = np.arange(1, x_max, 0.1)
-        self.R_func = np.ones(self.time_R.shape[0], dtype = 'float')
-        self.infected_R = np.ones(self.time_R.shape[0], dtype = 'float')
-        for i in range(len(self.time_R)):
-            self.R_func[i] = int_func[int(i*integration_steps/10)]
-            self.infected_R[i] = infected_raw[int(i*integration_steps/10)]
-        self.infected_R = int_const*np.exp(self.infected_R)         # Store calulated infected in infected_R
-        self.last_R_steps = self.R_dict[country] # remember R_steps 
+        return self.model_cache.get_or_compute((country, x_max, tuple(steps)), self.compute_func_data, steps, x_max)
+
+    def compute_func_data(self, steps, x_max):
+        result = step_R_model(steps, x_max, self.gen)
+        for item in result:
+            item.flags.writeable = False
+        return result
+
+    def get_R_batch(self, x_max, countries = None):
+        '''get_R_batch evaluates the step R models of countries (default: all entries of R_dict) in one pass
+        (see step_R_model_batch). Returns countries, time_R, the 2-D arrays R_func and infected_R with one
+        row per country and the bool array R_model_valid. Countries without R steps get the dummy model
+        (R_func and infected_R 1), as in get_R_func and get_inf_R.'''
+        if countries is None:
+            countries = list(self.R_dict.keys())
+        R_model_valid = np.array([country in self.R_dict for country in countries], dtype = 'bool')
+        time_R, valid_R_func, valid_infected_R = step_R_model_batch(
+            [self.R_dict[country] for country in countries if country in self.R_dict], x_max, self.gen)
+        R_func = np.ones((len(countries), time_R.shape[0]), dtype = 'float')
+        infected_R = np.ones((len(countries), time_R.shape[0]), dtype = 'float')
+        R_func[R_model_valid] = valid_R_func
+        infected_R[R_model_valid] = valid_infected_R
+        return countries, time_R, R_func, infected_R, R_model_valid
 
     def update_str(self, R_step_string, country):
-        R_clean = ''
-        for c in R_step_string:
-            if c in ['1', '2', '3', '4', '5', '6', '7', '8', '9', '0', '(', ')', ',', '.', 'e', 'E']: # no need to import re module for this simple task :-)
-                R_clean += c
-        if R_clean == '':
+        R_steps = parse_R_steps(R_step_string)
+        if not R_steps:
             return False
-        try:
-            self.R_dict[country] = eval('[' + R_clean + ']')   
-        except:
-            return
+        self.R_dict[country] = R_steps
+        # cached models of the former steps of country are not needed any more
+        self.model_cache.invalidate(lambda key: key[0] == country)
     
+    def fit_R_dict(self, keys = None, weekly = True, correct_weeks = 7, workers = None, save = False,
+                   overwrite = False, **fit_kwargs):
+        '''fit_R_dict fits R steps to the infections of keys (default: all keys of corona_dict) in a process pool
+        (see fit_R_steps) and enters them into R_dict, which is saved to R_table_file if save.
+        Keys already in R_dict (e.g. hand-tuned entries) are not fitted unless overwrite.
+        weekly: fit the weekly corrected infections (CoronaData.weekly_corrected) instead of the raw ones.
+        Returns {key: R steps}, keys whose series are too short for a fit are left out.'''
+        cordat = self.cordat
+        if keys is None:
+            keys = list(cordat.corona_dict.keys())
+        if not overwrite:
+            keys = [key for key in keys if key not in self.R_dict]
+        series = {}
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for key in keys:
+                if weekly:
+                    try:
+                        series[key] = cordat.weekly_corrected(key, 'inf', correct_weeks)
+                    except Exception:
+                        # series too short for the weekly correction
+                        continue
+                else:
+                    time_minmax = cordat.corona_dict[key][5]
+                    series[key] = np.arange(time_minmax[0], time_minmax[1] + 1), cordat.corona_dict[key][0]
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            fitted = list(pool.map(partial(fit_R_steps, gen = self.gen, **fit_kwargs),
+                                   [np.asarray(x) for x, _ in series.values()],
+                                   [np.asarray(y) for _, y in series.values()], chunksize = 16))
+        R_steps = {key: steps for key, steps in zip(series.keys(), fitted) if steps}
+        for key, steps in R_steps.items():
+            self.R_dict[key] = steps
+            self.model_cache.invalidate(lambda cache_key: cache_key[0] == key)
+        if save:
+            self.save_R_table()
+        return R_steps
+
     def save_R_table(self):
-        R_table = ''
-        for country in self.R_dict.keys():
-            R_table += repr(country) + '; ' + str(self.R_dict[country]) + '\n'
-        with open('R_table.dict', 'w') as f:
-            f.write(R_table)
+        # the table is written to a temporary file which replaces R_table_file, so readers
+        # never see a partly written table
+        if self.R_table_file.endswith('.jsonl'):
+            lines = [json.dumps({'key': list(country), 'steps': [list(step) for step in R_steps]}) + '\n'
+                     for country, R_steps in self.R_dict.items()]
+        else:
+            lines = [repr(country) + '; ' + str(R_steps) + '\n' for country, R_steps in self.R_dict.items()]
+        tmp_file = self.R_table_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            f.writelines(lines)
+        replace(tmp_file, self.R_table_file)
 
     def load_R_table(self):
-        if not path.exists('R_table.dict'):
-            with open('R_table.dict', 'w') as f:
-                f.write('("JHU_GL", "Germany", "Germany"); [(0, 1), (25, 2.7), (57, 1.4), (64, 1.05), (71, 0.8), (100, 0.85), (141, 1.8), (149, 0.85), (168, 1.15), (212, 0.9), (221, 1.1), (255, 1.33), (284, 0.98), (312, 1.1), (325, 1.02)]')
-        with open('R_table.dict', 'r') as f:
+        if not path.exists(self.R_table_file):
+            self.R_dict = {("JHU_GL", "Germany", "Germany"): list(DEFAULT_R_STEPS)}
+            self.save_R_table()
+        with open(self.R_table_file, 'r') as f:
             lines = f.readlines()
-        for line in lines:
-            country_str, R_steps = line.split(';')
-            country = eval(country_str)     # country is now a tuple
-            self.update_str(R_steps, country)
-        self.country = 'reset_list'
+        if self.R_table_file.endswith('.jsonl'):
+            # all lines as one JSON document
+            entries = json.loads('[' + ','.join(line for line in lines if line.strip()) + ']')
+            R_dict = {tuple(entry['key']): list(map(tuple, entry['steps'])) for entry in entries}
+        else:
+            R_dict = parse_R_table(lines, self.R_table_file)
+        self.R_dict = R_dict
+        self.model_cache.invalidate()
+
+
+
+def step_R_model(steps, x_max, gen, int_const = 1.0, integration_steps = 100):
+    '''step_R_model calculates the R-function defined by steps ([(day, R), ...], R is valid from day
+    until the next step) and the infected derived from it on the time scale np.arange(1, x_max, 0.1).
+    The R-function is evaluated on a fine time scale (integration_steps per day) by a lookup of the
+    next switch point (np.searchsorted), the log growth rate log(R)/gen is integrated by the
+    cumulative trapezoid rule. Returns time_R, R_func and infected_R.'''
+    R = np.array([step[1] for step in steps], dtype = 'float')
+    # R[i] is valid until switch[i], the last R until day 1000. The R of a time t is the one of the
+    # first switch point above t (running maximum for unordered steps), 0 after the last one
+    switch = np.maximum.accumulate(np.array([step[0] for step in steps[1:]] + [1000], dtype = 'float'))
+    x_for_int = np.arange(1, x_max, 1/integration_steps)   # timescale for integration
+    switch_index = np.searchsorted(switch, x_for_int, side = 'right')
+    int_func = np.append(R, 0.0)[switch_index]
+    f_prime = np.log(int_func)/gen          # derivation of infected per day on log scale
+    infected_raw = np.zeros(len(f_prime))
+    infected_raw[1:] = np.cumsum((f_prime[1:] + f_prime[:-1])/2 * np.diff(x_for_int))
+    time_R = np.arange(1, x_max, 0.1)
+    # resample to time_R, every (integration_steps/10)th value
+    sample_index = (np.arange(time_R.shape[0]) * integration_steps / 10).astype('int')
+    R_func = int_func[sample_index]
+    infected_R = int_const*np.exp(infected_raw[sample_index])         # calulated infected
+    return time_R, R_func, infected_R
+
+
+def step_R_model_batch(steps_list, x_max, gen, int_const = 1.0, integration_steps = 100):
+    '''step_R_model_batch calculates step_R_model for every entry of steps_list on the common time scale.
+    The time scales, their differences and the position of every time among the switch points of all
+    entries (np.searchsorted) are calculated once, the R of every entry follows from a table of switch
+    point counts, log(R)/gen is taken per R value instead of per time. Returns time_R and the 2-D
+    arrays R_func and infected_R (one row per entry), identical to the results of step_R_model.'''
+    x_for_int = np.arange(1, x_max, 1/integration_steps)   # timescale for integration
+    dx = np.diff(x_for_int)
+    time_R = np.arange(1, x_max, 0.1)
+    sample_index = (np.arange(time_R.shape[0]) * integration_steps / 10).astype('int')
+    R_func = np.ones((len(steps_list), time_R.shape[0]), dtype = 'float')
+    infected_R = np.ones((len(steps_list), time_R.shape[0]), dtype = 'float')
+    if not steps_list:
+        return time_R, R_func, infected_R
+    # switch points of every entry as in step_R_model, padded with inf, R padded with 0
+    n_switch = max(max(len(steps), 1) for steps in steps_list)
+    switch = np.full((len(steps_list), n_switch), np.inf)
+    R = np.zeros((len(steps_list), n_switch + 1))
+    for k, steps in enumerate(steps_list):
+        R[k, :len(steps)] = [step[1] for step in steps]
+        switch[k, :max(len(steps), 1)] = np.maximum.accumulate(
+            np.array([step[0] for step in steps[1:]] + [1000], dtype = 'float'))
+    # position of every time among all switch points, switch_count[k, p]: number of switch
+    # points of entry k up to the p-th of all switch points
+    switch_values = np.unique(switch[np.isfinite(switch)])
+    position = np.searchsorted(switch_values, x_for_int, side = 'right')
+    switch_count = np.zeros((len(steps_list), switch_values.shape[0] + 1), dtype = 'int')
+    switch_count[:, 1:] = (switch[:, :, None] <= switch_values[None, None, :]).sum(axis = 1)
+    with np.errstate(divide = 'ignore'):
+        R_prime = np.log(R)/gen             # derivation of infected per day on log scale per R value
+    # row by row: 1-D operations on the time scale are faster than on 2-D blocks of several rows
+    infected_raw = np.zeros(x_for_int.shape[0])
+    for k in range(len(steps_list)):
+        R_index = switch_count[k][position]
+        f_prime = R_prime[k][R_index]
+        np.cumsum((f_prime[1:] + f_prime[:-1])/2 * dx, out = infected_raw[1:])
+        R_func[k] = R[k][R_index[sample_index]]
+        infected_R[k] = int_const*np.exp(infected_raw[sample_index])
+    return time_R, R_func, infected_R
+
+
+def fit_R_steps(x, y, gen, penalty = None, min_len = 7, min_infections = 10, R_decimals = 3, noise_floor = 0.25):
+    '''fit_R_steps fits R steps in the format of R_table.dict ([(0, R), (day, R), ...]) to the daily
+    infections y of the days x, minimizing the squared log error of the integrated infected_R of
+    step_R_model. The fit starts at the first day with min_infections, the first step brings
+    infected_R from 1 at day 1 to the level of this day.
+    Change points: optimal partitioning (dynamic programming) of log(y) into straight segments of at
+    least min_len days, every segment costs penalty in units of the summed squared log error.
+    The default penalty is BIC-like, 3 parameters (level, slope, change point) per segment:
+    3 * log(n) * sigma**2 with the log noise sigma of the n days (segment_penalty), at least noise_floor.
+    R levels: linear least squares of the continuous log(infected_R) for these change points.
+    Returns [] if there are less than 2 * min_len days to fit.'''
+    x = np.asarray(x, dtype = 'float')
+    y = np.asarray(y, dtype = 'float')
+    valid = np.isfinite(y) & (y > 0) & (x >= 1) & (x < 1000)
+    x, y = x[valid], y[valid]
+    start = np.argmax(y >= min_infections)
+    if y.shape[0] - start < 2 * min_len or y[start] < min_infections:
+        return []
+    x, log_y = x[start:], np.log(y[start:])
+    if penalty is None:
+        penalty = segment_penalty(log_y, noise_floor)
+    segment_starts = linear_segments(x, log_y, penalty, min_len)
+    # R of a step is valid from its day until the next day in edges, the first step from day 1
+    edges = np.concatenate(([1.0], x[segment_starts], [1000.0]))
+    if edges[1] <= edges[0]:
+        edges = edges[1:]
+    # log(infected_R) at x is the sum of log(R)/gen times the overlap of [1, x] with every step
+    overlap = np.clip(x[:, None] - edges[None, :-1], 0, np.diff(edges)[None, :])
+    slopes = np.linalg.lstsq(overlap, log_y, rcond = None)[0]
+    R = np.round(np.exp(gen * slopes), R_decimals)
+    return [(0, float(R[0]))] + [(int(day), float(R_step)) for day, R_step in zip(edges[1:-1], R[1:])]
+
+
+def segment_penalty(log_y, noise_floor = 0.25):
+    '''segment_penalty returns the BIC-like penalty per segment 3 * log(n) * sigma**2 of linear_segments.
+    sigma is the rms of the second differences of log_y / sqrt(6) (the noise of a straight line) and
+    at least noise_floor. noise_floor = 0.25 has been calibrated on the 350 weekly corrected series of
+    local_files (about 500 days each): 15 steps in the median (about one per month), 33 for the
+    95th percentile and 14 steps for JHU_GL Germany, which has 15 hand-set steps in R_table.dict.
+    With a fixed penalty of 1.0 the fit gave 23 steps on average.'''
+    sigma = np.sqrt(np.mean(np.diff(log_y, 2)**2) / 6) if log_y.shape[0] > 2 else 0.0
+    return 3 * np.log(log_y.shape[0]) * max(sigma, noise_floor)**2
+
+
+def linear_segments(x, y, penalty, min_len):
+    '''linear_segments returns the start indices of the segments of the optimal partitioning of y(x)
+    into straight lines of at least min_len points: minimum of the summed squared residuals of the
+    least squares lines plus penalty per segment. The residuals of all segments ending at a point
+    follow from cumulative sums, so every point takes one vectorized step.'''
+    n = x.shape[0]
+    sums = [np.concatenate(([0.0], np.cumsum(values))) for values in (x, y, x*x, x*y, y*y)]
+    best = np.full(n + 1, np.inf)               # best[t]: min. cost of the first t points
+    best[0] = -penalty
+    last_start = np.zeros(n + 1, dtype = 'int')
+    for t in range(min_len, n + 1):
+        s = np.arange(0, t - min_len + 1)       # start of the last segment
+        m = t - s
+        S_x, S_y, S_xx, S_xy, S_yy = [S[t] - S[s] for S in sums]
+        var_xx = S_xx - S_x*S_x/m
+        var_xy = S_xy - S_x*S_y/m
+        var_yy = S_yy - S_y*S_y/m
+        cost = best[s] + var_yy - var_xy**2/np.where(var_xx > 0, var_xx, np.inf) + penalty
+        i = np.argmin(cost)
+        best[t] = cost[i]
+        last_start[t] = s[i]
+    starts = []
+    t = n
+    while t > 0:
+        t = last_start[t]
+        starts.append(t)
+    return starts[::-1]
+
+
+# R steps of the R_table.dict created if there is none
+DEFAULT_R_STEPS = [(0, 1), (25, 2.7), (57, 1.4), (64, 1.05), (71, 0.8), (100, 0.85), (141, 1.8), (149, 0.85),
+                   (168, 1.15), (212, 0.9), (221, 1.1), (255, 1.33), (284, 0.98), (312, 1.1), (325, 1.02)]
+
+# literals of R_table.dict lines: quoted strings of the key tuple, (day, R) tuples of the R steps
+RE_QUOTED = re.compile(r"'((?:[^'\\]|\\.)*)'" + r'|"((?:[^"\\]|\\.)*)"')
+TUPLES_TO_LISTS = str.maketrans('()', '[]')
+RE_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+RE_STEP = re.compile(r'\(\s*(' + RE_NUMBER + r')\s*,\s*(' + RE_NUMBER + r')\s*\)')
+
+
+def parse_R_table(lines, R_table_file = 'R_table.dict', json_path = True):
+    '''parse_R_table reads the lines of an R table in the R_table.dict format (key; R steps) to R_dict.
+    The R steps of all lines are read as one JSON document (json_path), a hand-edited table which is
+    no valid JSON line by line (parse_R_steps). Lines without steps are skipped, lines whose key or
+    steps cannot be read completely raise ValueError with their line numbers.'''
+    numbered = [(line_no, line.rpartition(';')) for line_no, line in enumerate(lines, 1) if line.strip()]
+    steps_list = None
+    if json_path:
+        try:
+            # R steps of all lines as one JSON document (tuples as lists), literals only
+            steps_list = json.loads('[' + ','.join(R_step_string for _, (_, _, R_step_string) in numbered)
+                                    .translate(TUPLES_TO_LISTS) + ']')
+            steps_list = [list(map(tuple, R_steps)) for R_steps in steps_list]
+        except (ValueError, TypeError):
+            steps_list = None
+    if steps_list is None:
+        # hand-edited table, read line by line
+        steps_list = [parse_R_steps(R_step_string) for _, (_, _, R_step_string) in numbered]
+    R_dict = {}
+    unreadable = []
+    for (line_no, (country_str, _, R_step_string)), R_steps in zip(numbered, steps_list):
+        if not R_steps and '(' not in R_step_string and country_str:
+            continue
+        # every (day, R) tuple of the line must have been read
+        if not country_str or len(R_steps) != R_step_string.count('('):
+            unreadable.append(line_no)
+            continue
+        R_dict[parse_R_key(country_str)] = R_steps                # country is now a tuple
+    if unreadable:
+        raise ValueError(f'{R_table_file}: line(s) {", ".join(map(str, unreadable))} cannot be read')
+    return R_dict
+
+
+def parse_R_steps(text):
+    # (day, R) tuples in text as list, numbers without decimal point or exponent are int.
+    # Only number literals are read, nothing is evaluated
+    return [(parse_number(day), parse_number(R)) for day, R in RE_STEP.findall(text)]
+
+
+def parse_R_key(text):
+    # key tuple of strings, keys with escape sequences are read by ast.literal_eval (literals only)
+    if '\\' in text:
+        return tuple(ast.literal_eval(text.strip()))
+    return tuple(single or double for single, double in RE_QUOTED.findall(text))
+
 
+def parse_number(text):
+    return int(text) if text.lstrip('+-').isdigit() else float(text)
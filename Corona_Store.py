@@ -0,0 +1,222 @@
+import json
+from collections.abc import Mapping
+from contextlib import contextmanager
+from os import path, remove, replace, stat, fstat
+import numpy as np
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+class SourceStore():
+    ''' SourceStore keeps all series of one data source in contiguous arrays on disk:
+    <name>.index.json: keys, per-series offsets, death_rate_len and time_minmax of every key,
+    <name>.<generation>.counts.npy: int32 array with infections and deaths of all keys,
+    <name>.<generation>.rates.npy: float64 array with death_rate and death_rate_std of all keys,
+    <name>.<generation>.weekly.npy (optional): float64 array with the weekly corrected infections
+    and deaths of all keys for every value of weekly_weeks, precomputed at refresh time.
+    The arrays are memory-mapped read-only, so all processes reading the same store share
+    the same pages. Series 2*i and 2*i+1 of both arrays belong to key i.
+    '''
+    def __init__(self, local_files_dir, name):
+        self.local_files_dir = local_files_dir
+        self.name = name
+        with open(index_file(local_files_dir, name), 'r') as f:
+            self.index_mtime = fstat(f.fileno()).st_mtime_ns
+            index = json.load(f)
+        self.generation = index['generation']
+        self.keys = [tuple(key) for key in index['keys']]
+        self.count_offsets = np.array(index['count_offsets'], dtype = 'int64')
+        self.rate_offsets = np.array(index['rate_offsets'], dtype = 'int64')
+        self.death_rate_len = index['death_rate_len']
+        self.time_minmax = [tuple(t) for t in index['time_minmax']]
+        self.counts = np.load(path.join(local_files_dir, index['counts']), mmap_mode = 'r')
+        self.rates = np.load(path.join(local_files_dir, index['rates']), mmap_mode = 'r')
+        # weekly corrected series j = 2*(n_keys*w + i) + subset_idx of key i and weekly_weeks[w]
+        # start at day weekly_starts[j], empty series could not be corrected
+        self.weekly_weeks = index.get('weekly_weeks', [])
+        if self.weekly_weeks:
+            self.weekly_offsets = np.array(index['weekly_offsets'], dtype = 'int64')
+            self.weekly_starts = index['weekly_starts']
+            self.weekly = np.load(path.join(local_files_dir, index['weekly']), mmap_mode = 'r')
+
+    def is_stale(self):
+        # True if a newer generation of the store has been published since it was loaded.
+        # The index file is only read if its modification time has changed
+        try:
+            if stat(index_file(self.local_files_dir, self.name)).st_mtime_ns == self.index_mtime:
+                return False
+            with open(index_file(self.local_files_dir, self.name), 'r') as f:
+                return json.load(f)['generation'] != self.generation
+        except (OSError, ValueError, KeyError):
+            return True
+
+    def series(self, i):
+        # returns the list [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+        # in the format of the former pickled dicts, arrays are read-only views
+        c_off = self.count_offsets
+        r_off = self.rate_offsets
+        return [self.counts[c_off[2*i]:c_off[2*i+1]], self.counts[c_off[2*i+1]:c_off[2*i+2]],
+                self.rates[r_off[2*i]:r_off[2*i+1]], self.rates[r_off[2*i+1]:r_off[2*i+2]],
+                self.death_rate_len[i], self.time_minmax[i]]
+
+    def weekly_series(self, i, subset_idx, correct_weeks):
+        # returns x and y of the precomputed weekly corrected series subset_idx (0: infections,
+        # 1: deaths) of key i, None if it has not been precomputed for correct_weeks
+        if correct_weeks not in self.weekly_weeks:
+            return None
+        j = 2 * (len(self.keys) * self.weekly_weeks.index(correct_weeks) + i) + subset_idx
+        y = self.weekly[self.weekly_offsets[j]:self.weekly_offsets[j+1]]
+        if len(y) == 0:
+            return None
+        return np.arange(self.weekly_starts[j], self.weekly_starts[j] + len(y)), y
+
+
+class CoronaStore(Mapping):
+    ''' CoronaStore is the read-only view on a list of SourceStores which replaces the merged
+    corona_dict. Keys appearing in several sources are taken from the last source, as the
+    former {**a, **b} merge did.
+    '''
+    def __init__(self, source_stores):
+        self.source_stores = source_stores
+        self.lookup = {}
+        for source_store in source_stores:
+            for i, key in enumerate(source_store.keys):
+                self.lookup[key] = (source_store, i)
+
+    def is_stale(self):
+        return any(source_store.is_stale() for source_store in self.source_stores)
+
+    def __getitem__(self, key):
+        source_store, i = self.lookup[key]
+        return source_store.series(i)
+
+    def weekly_series(self, key, subset_idx, correct_weeks):
+        source_store, i = self.lookup[key]
+        return source_store.weekly_series(i, subset_idx, correct_weeks)
+
+    def __contains__(self, key):
+        return key in self.lookup
+
+    def __iter__(self):
+        return iter(self.lookup)
+
+    def __len__(self):
+        return len(self.lookup)
+
+    def keys(self):
+        return self.lookup.keys()
+
+
+def index_file(local_files_dir, name):
+    return path.join(local_files_dir, name + '.index.json')
+
+
+def store_exists(local_files_dir, name):
+    return path.isfile(index_file(local_files_dir, name))
+
+
+@contextmanager
+def store_file_lock(local_files_dir):
+    # exclusive lock on the stores of local_files_dir across processes, held while stores are
+    # converted from the pickled dicts, so only one process writes them
+    with open(path.join(local_files_dir, 'stores.lock'), 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_source_store(local_files_dir, name, c_dict, weekly = None):
+    ''' write_source_store writes c_dict ({key: [infs, deaths, death_rate, death_rate_std,
+    death_rate_len, time_minmax]}) as columnar store <name>, with the weekly corrected series
+    weekly ({correct_weeks: {key: [(x, y) of infections or None, (x, y) of deaths or None]}},
+    see CoronaData.precompute_weekly) if given. The arrays are written under a new
+    generation and the index file is replaced atomically, so readers either see the old or the
+    new data. The files of the previous generation are kept for readers which have not reattached
+    yet, they are removed when the next generation is published. Returns the new generation.
+    '''
+    generation = 0
+    old_index = None
+    if store_exists(local_files_dir, name):
+        with open(index_file(local_files_dir, name), 'r') as f:
+            old_index = json.load(f)
+        generation = old_index['generation'] + 1
+
+    keys = list(c_dict.keys())
+    counts = []
+    rates = []
+    for key in keys:
+        infs, deaths, death_rate, death_rate_std, _, _ = c_dict[key]
+        counts += [to_int32(infs), to_int32(deaths)]
+        rates += [np.asarray(death_rate, dtype = 'float64'), np.asarray(death_rate_std, dtype = 'float64')]
+    count_offsets = np.cumsum([0] + [len(a) for a in counts])
+    rate_offsets = np.cumsum([0] + [len(a) for a in rates])
+
+    index = {'generation': generation,
+             'keys': [list(key) for key in keys],
+             'count_offsets': [int(o) for o in count_offsets],
+             'rate_offsets': [int(o) for o in rate_offsets],
+             'death_rate_len': [int(c_dict[key][4]) for key in keys],
+             'time_minmax': [[int(t) for t in c_dict[key][5]] for key in keys],
+             'counts': f'{name}.{generation}.counts.npy',
+             'rates': f'{name}.{generation}.rates.npy',
+             'previous': []}
+    if weekly and keys:
+        # missing series are stored empty
+        weekly_series = [weekly[correct_weeks][key][subset_idx] or (np.zeros(1, dtype = 'int64'), np.zeros(0))
+                         for correct_weeks in weekly for key in keys for subset_idx in (0, 1)]
+        index['weekly_weeks'] = [int(correct_weeks) for correct_weeks in weekly]
+        index['weekly_offsets'] = [int(o) for o in np.cumsum([0] + [len(y) for _, y in weekly_series])]
+        index['weekly_starts'] = [int(x[0]) for x, _ in weekly_series]
+        index['weekly'] = f'{name}.{generation}.weekly.npy'
+        save_array(path.join(local_files_dir, index['weekly']),
+                   np.concatenate([np.asarray(y, dtype = 'float64') for _, y in weekly_series]))
+    save_array(path.join(local_files_dir, index['counts']),
+               np.concatenate(counts) if counts else np.zeros(0, dtype = 'int32'))
+    save_array(path.join(local_files_dir, index['rates']),
+               np.concatenate(rates) if rates else np.zeros(0, dtype = 'float64'))
+    if old_index is not None:
+        index['previous'] = [old_file for old_file in (old_index['counts'], old_index['rates'], old_index.get('weekly'))
+                             if old_file is not None]
+    tmp_file = index_file(local_files_dir, name) + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(index, f)
+    replace(tmp_file, index_file(local_files_dir, name))
+
+    # the generation before the previous one is not referenced any more, readers have had a whole
+    # publish interval to reattach. Processes which still map it keep their pages, removal may fail
+    # on systems which lock mapped files.
+    if old_index is not None:
+        for old_file in old_index.get('previous', []):
+            try:
+                remove(path.join(local_files_dir, old_file))
+            except OSError:
+                pass
+    return generation
+
+
+def save_array(file, array):
+    # the array is written to a temporary file which replaces file, so no reader maps a partly written array
+    tmp_file = file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        np.save(f, array)
+    replace(tmp_file, file)
+
+
+def to_int32(values):
+    # series may come as int, float or object arrays (or pandas Series), store them as int32
+    values = np.nan_to_num(np.asarray(values, dtype = 'float64'))
+    return np.rint(values).astype('int32')
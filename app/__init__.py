@@ -1,7 +1,12 @@
 import dash
 from flask import Flask
 from flask.helpers import get_root_path
-from dash_extensions.enrich import Output, DashProxy, Input, MultiplexerTransform
+from flask_compress import Compress
+from flask_caching import Cache
+from Corona_Cache import flask_cache_config
+from dash_extensions.enrich import Output, DashProxy, Input, State, MultiplexerTransform
+from dash import callback_context
+from dash.dependencies import MATCH, ALL
 
 from CoronaData_online import *
 from Corona_Rt import *
@@ -9,7 +14,6 @@ from Corona_Rt import *
 import plotly.graph_objs as go
 import plotly.colors
 
-from random import randint
 import dash_core_components as dcc
 import dash_html_components as html
 
@@ -18,6 +22,8 @@ import dash_html_components as html
 
 def create_app():
     server = Flask(__name__)
+    # compress the json responses of the callbacks
+    Compress(server)
 
     register_dashapps(server)
     register_blueprints(server)
@@ -31,8 +37,12 @@ def register_dashapps(app):
         "name": "viewport",
         "content": "width=device-width, initial-scale=1, shrink-to-fit=no"}
 
+    # server-side cache of the row series (Flask-Caching), see cached_series. Configured by
+    # the environment, see flask_cache_config
+    cache_config = flask_cache_config()
     external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
     dashapp1 = DashProxy(__name__, server = app, external_stylesheets=external_stylesheets, prevent_initial_callbacks=True, transforms=[MultiplexerTransform()])
+    cache = Cache(dashapp1.server, config = cache_config)
     
     #dashapp1 = dash.Dash(__name__,
     #                     server=app,
@@ -45,7 +55,7 @@ def register_dashapps(app):
     # define max no. of datasets to display
     max_rows = 10
 
-    cordat = CoronaData()
+    cordat = get_shared_data()
     # Rt1 = Rt(cordat)
 
     # Define main graph
@@ -61,60 +71,51 @@ def register_dashapps(app):
 
     #****************************************************************************
     # define the control block for data selection
-    # select_data_shadow is a dict containing a copy of the values
-    select_data_shadow = {'show':[], 'source':[], 'level1':[], 'level2':[], 'subset':[],
-                          't_shift':[], 'scale_y':[], 'rm_weekly':[], 'rm_weeks':[]}
-    source_list = np.unique(cordat.sources)
-    level1_list = np.unique(cordat.countries_level1[np.where(cordat.sources==source_list[0])])
-    level2_list = np.unique(cordat.countries_level2[
-                                np.where(cordat.sources==source_list[0]) and
-                                np.where(cordat.countries_level1==level1_list[0])])
+    source_list = cordat.source_list
+    level1_list = cordat.get_level1_list(source_list[0])
+    level2_list = cordat.get_level2_list(source_list[0], level1_list[0])
     row_height = 26
     select_data_block = []
-    rows = np.arange(0, max_rows)
-    for row in rows:
+    # plain ints as row of the pattern-matching ids (numpy ints are rejected by dash)
+    for row in range(max_rows):
         select_data_line = []
         # create checkbutton for 'show'
         select_data_line.append(
-            dcc.Checklist(id=f'radio_show_{row}',
+            dcc.Checklist(id={'type': 'radio_show', 'row': row},
                           options=[{'label': ' ', 'value': 0},
                                    ],
                           value=[],
                           style = {'width': row_height*0.8, 'height':row_height, 'display':'inline-block',
                                    'margin': 0, 'color': 'green', 'background-color': cor_color[row]}))
-        select_data_shadow['show'].append([])
 
         # create dropdown for data source
         select_data_line.append(
-            dcc.Dropdown(id=f'drop_source_{row}',
+            dcc.Dropdown(id={'type': 'drop_source', 'row': row},
                      options =[{'label': source_list[i], 'value': source_list[i]} for i in range(len(source_list))],
                      value = source_list[0],
                      style = {
                          'width' : 80, 'height' : row_height, 'display' : 'inline-block',
                          'margin': 0, 'padding':0}))
-        select_data_shadow['source'].append(source_list[0])
 
         # create dropdown for level1 selection
         select_data_line.append(
-            dcc.Dropdown(id=f'drop_level1_{row}',
+            dcc.Dropdown(id={'type': 'drop_level1', 'row': row},
                          options =[{'label': level1_list[i], 'value': level1_list[i]} for i in range(len(level1_list))],
                          value = level1_list[0],
                          style = {
                              'width': 150, 'height':row_height, 'display':'inline-block', 'margin': 0}))
-        select_data_shadow['level1'].append(level1_list[0])
 
         # create dropdown for level2 selection
         select_data_line.append(
-            dcc.Dropdown(id=f'drop_level2_{row}',
+            dcc.Dropdown(id={'type': 'drop_level2', 'row': row},
                          options =[{'label': level2_list[i], 'value': level2_list[i]} for i in range(len(level2_list))],
                          value = level2_list[0],
                          style = {
                              'width': 150, 'height':row_height, 'display':'inline-block', 'margin': 0}))
-        select_data_shadow['level2'].append(level2_list[0])
 
         # create dropdown for subset selection
         select_data_line.append(
-            dcc.Dropdown(id=f'drop_subset_{row}',
+            dcc.Dropdown(id={'type': 'drop_subset', 'row': row},
                          options =[{'label': 'inf', 'value': 'inf'},
                                    {'label': 'deaths', 'value': 'deaths'}],
                                    # {'label': 'incid', 'value': 'incid'},
@@ -122,49 +123,44 @@ def register_dashapps(app):
                          value = 'inf',
                          style = {
                              'width': 70, 'height':row_height, 'display':'inline-block', 'margin': 0}))
-        select_data_shadow['subset'].append('inf')
 
         # create numeric input for time shift
         select_data_line.append(
-            dcc.Input(id=f'in_t_shift_{row}',
+            dcc.Input(id={'type': 'in_t_shift', 'row': row},
                          type = 'number',
                          value = 0,
                          style = {
                              'width': 60, 'height':row_height, 'display':'inline-block', 'margin-bottom': 0}))
-        select_data_shadow['t_shift'].append(0)
 
         # create numeric input for y scaling (i.e. shift in y-direction on log scale)
         select_data_line.append(
-            dcc.Input(id=f'in_scale_y_{row}',
+            dcc.Input(id={'type': 'in_scale_y', 'row': row},
                       type = 'number',
                       value = 1,
                       step = 0.1,
                       min = 0,
                       style = {
                           'width': 70, 'height':row_height, 'display':'inline-block', 'margin': 0}))
-        select_data_shadow['scale_y'].append(1)
 
 
         # create checkbox to indicate removal of weekly artefacts
         select_data_line.append(
-            dcc.Checklist(id=f'radio_rm_weekly_{row}',
+            dcc.Checklist(id={'type': 'radio_rm_weekly', 'row': row},
                           options=[{'label': ' ', 'value': 1},
                                    ],
                           value=[1],
                           style = {'width': row_height*0.6, 'height':row_height, 'display':'inline-block',
                                    'margin': 0, 'color': 'green'}))
-        select_data_shadow['rm_weekly'].append([1])
 
         # create numeric input for week range to remove weekly artefacts
         select_data_line.append(
-            dcc.Input(id=f'in_rm_weeks_{row}',
+            dcc.Input(id={'type': 'in_rm_weeks', 'row': row},
                       type = 'number',
                       value = 7,
                       min = 1,
                       max = 100,
                       style = {
                           'width': 60, 'height':row_height, 'display':'inline-block', 'margin-bottom': 0}))
-        select_data_shadow['rm_weeks'].append(7)
 
         # combine line to a Div
         select_data_line_div = html.Div(select_data_line, style={
@@ -173,226 +169,154 @@ def register_dashapps(app):
 
 
     # ***********************************************************************
-    # This function handles actions when a "show" checkbox has been changed
-    # Main tasks: save status to shadow dict
-    #
-    # A. Nittke 07/2021
-    # ***********************************************************************
-    @dashapp1.callback(Output(component_id='trigger_graph_redraw', component_property='children'),
-                  [Input(component_id=f'radio_show_{row}', component_property='value') for row in range(max_rows)])
-    def in_show_changed(*values):
-        values_bin = checklist2shadow(values)
-        shadow_bin = checklist2shadow(select_data_shadow['show'])
-        print(np.where(shadow_bin != values_bin))
-        select_data_shadow['show'] = list(values)
-        return randint(0, 1e12)
-
-    # ***********************************************************************
-    # This function handles actions when a "data source" field has been changed
-    # Main tasks: update level1 dropdowns accordingly and update shadow dict
-    # A. Nittke 07/2021
-    # ***********************************************************************
-    @dashapp1.callback([Output(component_id=f'drop_level1_{row}', component_property='options') for row in range(max_rows)] +
-                  [Output(component_id=f'drop_level1_{row}', component_property='value') for row in range(max_rows)] +
-                  [Output(component_id='trigger_graph_redraw', component_property='children')],
-                  [Input(component_id=f'drop_source_{row}', component_property='value') for row in range(max_rows)])
-    def source_changed(*values):
-        # detect row which has been changed
-        changed_row, = np.where(np.array(values) != np.array(select_data_shadow['source']))
-        if changed_row.shape == (0,):
-            changed_row = 0
-        else:
-            changed_row = changed_row[0]
-
-        # save new (theoretical) tuple. If this is not available, lower levels will be set to index 0
-        # new_data_tuple = (values[changed_row], select_data_shadow['level1'][row], select_data_shadow['level2'][row])
-        # create output list
-        level1_out = []
-        for i, value in enumerate(list(values)):
-            level1_list = np.unique(cordat.countries_level1[np.where(cordat.sources==value)])
-            level1_out.append([{'label': level1_list[i], 'value':level1_list[i]} for i in range(len(level1_list))])
-        for i, value in enumerate(list(values)):
-            if i == changed_row: # and (new_data_tuple not in cordat.corona_dict.keys()):
-                level1_out.append(level1_out[i][0]['value'])
-            else:
-                level1_out.append(select_data_shadow['level1'][i])
-        # update shadow dict
-        select_data_shadow['source'] = list(values)
-        level1_out.append(randint(0, 1e12))
-        return level1_out
-
-    # ***********************************************************************
-    # This function handles actions when a "level1" field has been changed
-    # Main tasks: update level2 dropdowns accordingly and update shadow dict
-    # A. Nittke 07/2021
-    # ***********************************************************************
-    @dashapp1.callback([Output(component_id='drop_level2_' + str(row), component_property='options') for row in range(max_rows)] +
-                  [Output(component_id='drop_level2_' + str(row), component_property='value') for row in range(max_rows)] +
-                  [Output(component_id='trigger_graph_redraw', component_property='children')],
-                  [Input(component_id='drop_level1_'+str(row), component_property='value') for row in range(max_rows)])
-    def level1_changed(*values):
-        # detect row which has been changed
-        changed_row, = np.where(np.array(values) != np.array(select_data_shadow['level1']))
-        if changed_row.shape == (0,):
-            changed_row = 0
-        else:
-            changed_row = changed_row[0]
-
-        # save new (theoretical) tuple. If this is not available, lower levels will be set to index 0
-        # new_data_tuple = (select_data_shadow['source'][row], values[changed_row], select_data_shadow['level2'][row])
-
-        # create output list
-        level2_out = []
-        for i, value in enumerate(list(values)):
-            level2_list = []
-            for j in range(len(cordat.sources)):
-                if (cordat.sources[j] == select_data_shadow['source'][i]) and (cordat.countries_level1[j] == value):
-                    level2_list.append(cordat.countries_level2[j])
-            level2_list = np.unique(level2_list)
-            level2_out.append([{'label': level2_list[i], 'value':level2_list[i]} for i in range(len(level2_list))])
-        for i, value in enumerate(list(values)):
-            if i == changed_row: # and (new_data_tuple not in cordat.corona_dict.keys()):
-                level2_out.append(level2_out[i][0]['value'])
-            else:
-                level2_out.append(select_data_shadow['level2'][i])
-        # update shadow dict
-        select_data_shadow['level1'] = list(values)
-        select_data_shadow['level2'] = level2_out[int(len(level2_out)/2):]
-        # add a random number for graph trigger
-        level2_out.append(randint(0, 1e12))
-        return level2_out
-
-    # ***********************************************************************
-    # This function handles actions when a "level2" field has been changed
-    # Main tasks: update shadow dict
-    # A. Nittke 07/2021
+    # Every row has its own callbacks (pattern-matching ids {'type': ..., 'row': row}).
+    # A change in a row recomputes only the base trace of this row, which is kept in the
+    # browser (dcc.Store {'type': 'row_trace', 'row': row}). The figure is assembled
+    # from the base traces in the browser (clientside callback), which also applies
+    # time shift and y scaling, so these need no server round trip at all.
+    # row_fields: field -> component type of the row inputs handled by the server
     # ***********************************************************************
-    @dashapp1.callback([Output(component_id='trigger_graph_redraw', component_property='children')],
-                  [Input(component_id=f'drop_level2_{row}', component_property='value') for row in range(max_rows)])
-    def level2_changed(*values):
-        # update shadow dict
-        select_data_shadow['level2'] = list(values)
-        return randint(0, 1e12)
+    row_fields = {'show': 'radio_show', 'source': 'drop_source', 'level1': 'drop_level1',
+                  'level2': 'drop_level2', 'subset': 'drop_subset',
+                  'rm_weekly': 'radio_rm_weekly', 'rm_weeks': 'in_rm_weeks'}
 
     # ***********************************************************************
-    # This function handles actions when a "subset" field has been changed
-    # Main tasks: update shadow dict
-    # A. Nittke 07/2021
+    # This function handles actions when any field of a row has been changed
+    # Main tasks: recompute the base trace of the row
     # ***********************************************************************
-    @dashapp1.callback([Output(component_id='trigger_graph_redraw', component_property='children')],
-                  [Input(component_id=f'drop_subset_{row}', component_property='value') for row in range(max_rows)])
-    def subset_changed(*values):
-        # update shadow dict
-        select_data_shadow['subset'] = list(values)
-        return randint(0, 1e12)
+    @dashapp1.callback(Output(component_id={'type': 'row_trace', 'row': MATCH}, component_property='data'),
+                  [Input(component_id={'type': component_type, 'row': MATCH}, component_property='value')
+                   for component_type in row_fields.values()])
+    def row_changed(*values):
+        # data may have been refreshed by another process
+        cordat.reattach_if_stale()
+        row = callback_context.outputs_list['id']['row']
+        return update_trace(row, dict(zip(row_fields.keys(), values)))
 
     # ***********************************************************************
-    # This function handles actions when a "t_shift" field has been changed
-    # Main tasks: update shadow dict
+    # This function handles actions when a "data source" field has been changed
+    # Main tasks: update the level1 dropdown of the row accordingly
     # A. Nittke 07/2021
     # ***********************************************************************
-    @dashapp1.callback([Output(component_id='trigger_graph_redraw', component_property='children')],
-                  [Input(component_id=f'in_t_shift_{row}', component_property='value') for row in range(max_rows)])
-    def t_shift_changed(*values):
-        # update shadow dict
-        print(values)
-        select_data_shadow['t_shift'] = list(values)
-        return randint(0, 1e12)
+    @dashapp1.callback([Output(component_id={'type': 'drop_level1', 'row': MATCH}, component_property='options'),
+                   Output(component_id={'type': 'drop_level1', 'row': MATCH}, component_property='value')],
+                  [Input(component_id={'type': 'drop_source', 'row': MATCH}, component_property='value')])
+    def source_changed(source):
+        cordat.reattach_if_stale()
+        # the level1 of the row is set to the first entry of the new source
+        level1_list = cordat.get_level1_list(source)
+        level1_options = [{'label': level1_list[i], 'value':level1_list[i]} for i in range(len(level1_list))]
+        return level1_options, level1_list[0] if level1_list else None
 
     # ***********************************************************************
-    # This function handles actions when a "scale_y" field has been changed
-    # Main tasks: update shadow dict
+    # This function handles actions when a "level1" field has been changed
+    # Main tasks: update the level2 dropdown of the row accordingly
     # A. Nittke 07/2021
     # ***********************************************************************
-    @dashapp1.callback([Output(component_id='trigger_graph_redraw', component_property='children')],
-                  [Input(component_id=f'in_scale_y_{row}', component_property='value') for row in range(max_rows)])
-    def scale_y_changed(*values):
-        # update shadow dict
-        select_data_shadow['scale_y'] = list(values)
-        return randint(0, 1e12)
+    @dashapp1.callback([Output(component_id={'type': 'drop_level2', 'row': MATCH}, component_property='options'),
+                   Output(component_id={'type': 'drop_level2', 'row': MATCH}, component_property='value')],
+                  [Input(component_id={'type': 'drop_level1', 'row': MATCH}, component_property='value')],
+                  [State(component_id={'type': 'drop_source', 'row': MATCH}, component_property='value')])
+    def level1_changed(level1, source):
+        # the level2 of the row is set to the first entry of the new level1
+        level2_list = cordat.get_level2_list(source, level1)
+        level2_options = [{'label': level2_list[i], 'value':level2_list[i]} for i in range(len(level2_list))]
+        return level2_options, level2_list[0] if level2_list else None
 
     # ***********************************************************************
-    # This function handles actions when a "remove weekly" checkbox has been changed
-    # Main tasks: save status to shadow dict,
+    #
+    # This function updates the graph from the base traces of all rows with
+    # time shift and y scaling of the rows (in the browser)
     #
     # A. Nittke 07/2021
     # ***********************************************************************
-    @dashapp1.callback(Output(component_id='trigger_graph_redraw', component_property='children'),
-                  [Input(component_id=f'radio_rm_weekly_{row}', component_property='value') for row in range(max_rows)])
-    def rm_weekly_changed(*values):
-        values_bin = checklist2shadow(values)
-        shadow_bin = checklist2shadow(select_data_shadow['rm_weekly'])
-        select_data_shadow['rm_weekly'] = list(values)
-        return randint(0, 1e12)
-
-    # ***********************************************************************
-    # This function handles actions when a "remove_weeks" field has been changed
-    # Main tasks: update shadow dict
-    # A. Nittke 07/2021
-    # ***********************************************************************
-    @dashapp1.callback([Output(component_id='trigger_graph_redraw', component_property='children')],
-                  [Input(component_id=f'in_rm_weeks_{row}', component_property='value') for row in range(max_rows)])
-    def level2_changed(*values):
-        # update shadow dict
-        print(values)
-        select_data_shadow['rm_weeks'] = list(values)
-        return randint(0, 1e12)
+    dashapp1.clientside_callback(
+        """
+        function(row_traces, t_shifts, scales_y, layout) {
+            var data = [];
+            for (var row = 0; row < row_traces.length; row++) {
+                var trace = row_traces[row];
+                if (trace === null || trace === undefined) {
+                    continue;   // row is not shown
+                }
+                var t_shift = Number(t_shifts[row]) || 0;
+                var scale_y = (scales_y[row] === null || scales_y[row] === '') ? 1 : Number(scales_y[row]);
+                // y comes as base64 encoded little-endian float32 values, see compact_trace
+                var bytes = atob(trace.y_b64);
+                var y = new Float32Array(bytes.length / 4);
+                var y_bytes = new Uint8Array(y.buffer);
+                for (var i = 0; i < bytes.length; i++) {
+                    y_bytes[i] = bytes.charCodeAt(i);
+                }
+                var shown = Object.assign({}, trace, {'y': y.map(function(y) {return y * scale_y;})});
+                delete shown.y_b64;
+                if (trace.x) {
+                    shown.x = trace.x.map(function(x) {return x + t_shift;});
+                } else {
+                    shown.x0 = trace.x0 + t_shift;
+                }
+                data.push(shown);
+            }
+            return {'data': data, 'layout': layout};
+        }
+        """,
+        Output(component_id='main_graph', component_property='figure'),
+        [Input(component_id={'type': 'row_trace', 'row': ALL}, component_property='data'),
+         Input(component_id={'type': 'in_t_shift', 'row': ALL}, component_property='value'),
+         Input(component_id={'type': 'in_scale_y', 'row': ALL}, component_property='value')],
+        [State(component_id='graph_layout', component_property='data')])
 
     # ***********************************************************************
     #
-    # This function triggers a graph update
+    # This function creates the base trace of a row (without time shift and
+    # y scaling) from the values of its fields, None if the row is not shown.
+    # x and y are sent in the compact format of compact_trace.
     #
     # A. Nittke 07/2021
     # ***********************************************************************
-
-    @dashapp1.callback(Output(component_id='main_graph', component_property='figure'),
-                  [Input(component_id='trigger_graph_redraw', component_property='children')])
-    def graph_redraw_data(value):
-        print(value)
-        traces = update_traces()
-        layout = update_layout()
-        figure =  {'data': traces, 'layout': layout}
-        return figure
+    def update_trace(row, row_data):
+        if len(row_data['show']) == 0:
+            return None
+        # rows with the same configuration share the cached series, only the color is per row
+        rm_weeks = row_data['rm_weeks'] if len(row_data['rm_weekly']) > 0 else None
+        series = cached_series(row_data['source'], row_data['level1'], row_data['level2'], row_data['subset'],
+                               rm_weeks, cordat.data_generation())
+        if series is None:
+            return None
+        trace = go.Scatter(mode='lines', line = {'color': cor_color[row]}).to_plotly_json()
+        trace.update(series)
+        return trace
 
     # ***********************************************************************
     #
-    # This function creates traces from shadow dict data.
+    # This function computes the series of a row configuration in the format
+    # of compact_trace, memoized in the server-side cache. generation (store
+    # generations of the data) is part of the cache key, so a refresh of the
+    # data is never served from old entries. rm_weeks None: no weekly correction.
     #
-    # A. Nittke 07/2021
     # ***********************************************************************
-    def update_traces():
-        traces = []
-        for row in range(max_rows):
-            # print(f'row {row} {select_data_shadow["show"][row]} {len(select_data_shadow["show"][row])}')
-            if len(select_data_shadow['show'][row]) > 0:
-                key_tuple = (select_data_shadow['source'][row],
-                             select_data_shadow['level1'][row],
-                             select_data_shadow['level2'][row])
-                scale_y = select_data_shadow['scale_y'][row]
-                time_shift = select_data_shadow['t_shift'][row]
-                x = np.arange(cordat.corona_dict[key_tuple][5][0], cordat.corona_dict[key_tuple][5][1]+1)
-
-                if select_data_shadow['subset'][row] == 'inf':
-                    subset_idx = 0
-                elif select_data_shadow['subset'][row] == 'deaths':
-                    subset_idx = 1
-                y = cordat.corona_dict[key_tuple][subset_idx]
-                if len(select_data_shadow['rm_weekly'][row]) > 0:
-                    # remove artefacts on weekly basis
-                    weekdays = np.array([(cordat.start_date + timedelta(days = int(i))).weekday() for i in x])
-                    rm_weeks = select_data_shadow['rm_weeks'][row]
-                    result_remove_weekly = cordat.remove_weekly(x, y, weekdays, correct_weeks = rm_weeks,
-                                                               spline_s = 0, spline_k = 5)
-                    x = result_remove_weekly[0]
-                    y = np.exp(result_remove_weekly[2])
-                x = x + time_shift
-                y = y * scale_y
-                traces.append(go.Scatter(x=x, y=y, mode='lines', line = {'color': cor_color[row]}))
-        return traces
+    @cache.memoize()
+    def cached_series(source, level1, level2, subset, rm_weeks, generation):
+        key_tuple = (source, level1, level2)
+        corona_dict = cordat.corona_dict    # one state, even if the stores are reattached meanwhile
+        if key_tuple not in corona_dict:
+            # lower levels of the row are not updated yet (None is not cached)
+            return None
+        x = np.arange(corona_dict[key_tuple][5][0], corona_dict[key_tuple][5][1]+1)
+
+        if subset == 'inf':
+            subset_idx = 0
+        elif subset == 'deaths':
+            subset_idx = 1
+        y = corona_dict[key_tuple][subset_idx]
+        if rm_weeks is not None:
+            # remove artefacts on weekly basis (precomputed at refresh time for CoronaData.precompute_weeks)
+            x, y = cordat.weekly_corrected(key_tuple, subset, rm_weeks, spline_s = 0, spline_k = 5)
+        return compact_trace(x, y)
 
     # ***********************************************************************
     #
-    # This function creates traces from shadow dict data.
+    # This function creates the layout of the graph.
     #
     # A. Nittke 07/2021
     # ***********************************************************************
@@ -406,29 +330,6 @@ def register_dashapps(app):
         return layout
 
 
-    # ***********************************************************************
-    #
-    # This function transforms a values list from checklist input to a numpy array
-    # with 0 (not checked) and 1 (checked)
-    #
-    # A. Nittke 07/2021
-    # ***********************************************************************
-    def checklist2shadow(values):
-        values_bin = []
-        for value in values:
-            if len(value) == 0:
-                values_bin.append(0)
-            else:
-                values_bin.append(1)
-        return np.array(values_bin)
-
-
-
-
-
-
-
-
     
     with app.app_context():
         dashapp1.title = 'Dashapp 1 in __init__'
@@ -438,7 +339,8 @@ def register_dashapps(app):
                 select_data_block,
             style = {
             'width': '45%', 'border': '2px red solid', 'borderRadius': 5, 'display':'inline-block'}),
-            html.Div(id='trigger_graph_redraw', children='no update', style= {'display': 'none'})]
+            dcc.Store(id='graph_layout', data=update_layout())] +
+            [dcc.Store(id={'type': 'row_trace', 'row': row}) for row in range(max_rows)]
             )
 
 
@@ -45,7 +45,7 @@ def register_callbacks(app, max_rows):
         # create output list
         level1_out = []
         for i, value in enumerate(list(values)):
-            level1_list = np.unique(cordat.countries_level1[np.where(cordat.sources==value)])
+            level1_list = cordat.get_level1_list(value)
             level1_out.append([{'label': level1_list[i], 'value':level1_list[i]} for i in range(len(level1_list))])
         for i, value in enumerate(list(values)):
             if i == changed_row: # and (new_data_tuple not in cordat.corona_dict.keys()):
@@ -80,11 +80,7 @@ def register_callbacks(app, max_rows):
         # create output list
         level2_out = []
         for i, value in enumerate(list(values)):
-            level2_list = []
-            for j in range(len(cordat.sources)):
-                if (cordat.sources[j] == select_data_shadow['source'][i]) and (cordat.countries_level1[j] == value):
-                    level2_list.append(cordat.countries_level2[j])
-            level2_list = np.unique(level2_list)
+            level2_list = cordat.get_level2_list(select_data_shadow['source'][i], value)
             level2_out.append([{'label': level2_list[i], 'value':level2_list[i]} for i in range(len(level2_list))])
         for i, value in enumerate(list(values)):
             if i == changed_row: # and (new_data_tuple not in cordat.corona_dict.keys()):
@@ -17,7 +17,7 @@ cor_color = plotly.colors.qualitative.Light24
 # define max no. of datasets to display
 max_rows = 10
 
-cordat = CoronaData()
+cordat = get_shared_data()
 Rt = Rt(cordat)
 
 # Define main graph
@@ -35,11 +35,9 @@ main_graph = dcc.Graph(id='main_graph',
 # define the control block for data selection
 # select_data_shadow is a dict containing a copy of the values
 
-source_list = np.unique(cordat.sources)
-level1_list = np.unique(cordat.countries_level1[np.where(cordat.sources==source_list[0])])
-level2_list = np.unique(cordat.countries_level2[
-                            np.where(cordat.sources==source_list[0]) and
-                            np.where(cordat.countries_level1==level1_list[0])])
+source_list = cordat.source_list
+level1_list = cordat.get_level1_list(source_list[0])
+level2_list = cordat.get_level2_list(source_list[0], level1_list[0])
 row_height = 26
 select_data_block = []
 rows = np.arange(0, max_rows)
@@ -0,0 +1,1381 @@
+import sys
+import tracemalloc
+import warnings
+from time import perf_counter
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO, BytesIO
+from os import path, makedirs, stat
+from glob import glob
+from multiprocessing import get_context
+from shutil import copy
+import json
+import gzip
+import base64
+from tempfile import TemporaryDirectory
+from threading import Thread, Lock
+from time import sleep
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+from scipy.interpolate import UnivariateSpline
+
+from CoronaData_online import CoronaData, compact_trace
+from Corona_Store import SourceStore, CoronaStore, write_source_store
+from Corona_Refresh import CoronaRefresh
+from Corona_Rt import Rt, step_R_model, step_R_model_batch, fit_R_steps, parse_R_table
+
+
+# ***********************************************************************
+# Reference implementations, i.e. the code paths as they were before
+# the respective optimization. They are used to check results and to
+# measure the speedup.
+# ***********************************************************************
+def analyse_correlation_loop(cordat, c_i, c_d):
+    # per-day loop of the original CoronaData.analyse_correlation
+    c_d = np.copy(c_d)
+    offset = 100
+    c_d[offset:]=0
+    num_entries = c_i.shape[0]
+    correl_results = np.zeros((num_entries, 4))
+    for shift in range(offset):
+        c_d1 = c_d
+        if shift >0:
+            c_d1 = np.roll(c_d1,-shift)
+            c_d1[-shift:]=0
+        temp_i = []
+        temp_d = []
+        for i,_ in enumerate(c_i):
+            if c_i[i] > cordat.limit and c_d1[i] > cordat.limit:
+                temp_i.append(np.log(c_i[i]))
+                temp_d.append(np.log(c_d1[i]))
+        temp_i = np.array(temp_i)
+        temp_d = np.array(temp_d)
+        diff = temp_i-temp_d
+        c_mean = np.mean(diff)
+        c_std = np.std(diff)
+        c_var = np.var(diff)
+        if not np.isnan(c_mean) and not np.isnan(c_std) and not np.isnan(c_var) and len(temp_i) > cordat.limit_len:
+            correl_results[shift,0] = np.exp(-c_mean)
+            correl_results[shift,1] = c_std
+            correl_results[shift,2] = c_var
+            correl_results[shift,3] = len(temp_i)
+    return correl_results
+
+
+def remove_weekly_loop(cordat, x, y, weekdays, correct_weeks = 6, spline_s = 1, spline_k = 5):
+    # original remove_weekly with per-day loops for the correction
+
+    if len(list(x)) != len(list(y)) or len(list(y)) != len(list(weekdays)):
+        print('x, y and weekdays have to have the same dimension!')
+        return
+    # y as np-array
+    y = np.array(y, dtype = 'float')
+    # correct_region in days
+    correct_region = 7 * correct_weeks
+    # start where y>0
+    start_index = next((i for i, x in enumerate(y) if x), None)
+    inf_time = x[start_index:]
+    inf_weekdays = weekdays[start_index:]
+    # replace values <=0 by 0.1 to avoid problems on log scale and transform to log scale
+    inf_log = np.log(np.where(y > 0.0, y, 0.1)[start_index:])
+
+    # Define spline spl
+    if len(inf_time) < 40:
+        # only a few data points, use data for spline without further treatment
+        spl = UnivariateSpline(inf_time, inf_log, s=20, k=5)
+    else:
+        # create a reduced timescale with only one point per week
+        spl_time = []
+        spl_inf_log = []
+        # spl_time is a reduced time scale with oly one point per week,
+        # spl_inf_log contains the corresponding y values averaged over one week, on log scale
+        for i in range(3,len(inf_time)-3, 7):
+            spl_time.append(inf_time[i])
+            spl_inf_log.append(np.log(np.mean(np.exp(inf_log[i-3:i+4]))))
+
+        try:
+            spl = UnivariateSpline(spl_time, spl_inf_log, s = spline_s, k = spline_k)
+        except:
+            # Something went wrong, most probably due to inappropriate parameters  spline_s and spline_k
+            # use safe standard parameters without averaging
+            spl = UnivariateSpline(inf_time, inf_log, s=20, k=5)
+
+    # calculate spline values for original time scale:
+    inf_log_spline = spl(inf_time)
+    # res_spline: residuals (deviations of data from spline) on log scale
+    res_spline = inf_log - inf_log_spline
+    # create correct_day_indices as array of "weekdays"
+    correct_day_indices = np.arange(0,7)
+    if len(inf_time) < 3 * correct_region:
+        # length of inf_time is less than 3 * correct_region, so
+        # calculate weekday-dependent correction globally:
+        print("standard correction\n")
+        # correct_residuals is a list of the median values of the residuals
+        # for every weekday
+        correct_residuals = [np.median(res_spline[np.where(weekdays[start_index:] == correct_day_indices[i])]) \
+                             for i in range(len(correct_day_indices))]
+        # correction will be a numpy array containing the correction values
+        # for every day in inf_time
+        correction = np.zeros(len(inf_time))
+        for i, t in enumerate(inf_time):
+            if np.isnan(inf_weekdays[i]):
+                # in case of any problem
+                correction[i] = 0
+                print("isnan-Schleife!")
+            else:
+                correction[i] = correct_residuals[int(inf_weekdays[i])]
+    else:
+        # Here, correction is calculated from a limited time range around
+        # the respective date. Thus, the algorithm can adopt to changes in
+        # weekly reporting strategies.
+
+        # initialize correction array with 3's
+        # will be overwritten, but will be visible if not
+        correction = np.ones(len(inf_time)) * 3
+        # use standard correction (see above) for start and end regions:
+        # start region:         
+        res_spline_tmp = res_spline[:correct_region]
+        weekdays_tmp = inf_weekdays[:correct_region]
+        correct_residuals = [np.median(res_spline_tmp[np.where(weekdays_tmp == correct_day_indices[i])]) for i in range(len(correct_day_indices))]
+        for i in range(correct_region):
+            correction[i] = correct_residuals[int(inf_weekdays[i])]
+        # end region:
+        res_spline_tmp = res_spline[-correct_region:]
+        weekdays_tmp = inf_weekdays[-correct_region:]
+        correct_residuals = [np.median(res_spline_tmp[np.where(weekdays_tmp == correct_day_indices[i])]) for i in range(len(correct_day_indices))]
+        for i in range(len(inf_time) - correct_region, len(inf_time)):
+            correction[i] = correct_residuals[int(inf_weekdays[i])]
+        # intermediate region:
+        correct_region_half = int(correct_region / 2)
+        # for every point from the middle of start region to the middle of th eend region
+        # correction is calculated "manually" as median of the residuals on the respective weekday
+        # in a time range of +/- half the correct_region
+        for i in range(correct_region_half, len(inf_time) - correct_region_half):
+            res_spline_tmp = res_spline[i - correct_region_half:i + correct_region_half]
+            weekdays_tmp = inf_weekdays[i - correct_region_half:i + correct_region_half]
+            correction[i] =  np.median(res_spline_tmp[np.where(weekdays_tmp == inf_weekdays[i])])
+    # smoothing by a running average with n=3 (+/- one neighbour)
+    # add 1 point at both ends on a temporary array
+    inf_corr_0 = np.zeros(len(inf_log) + 2)
+    inf_corr_0[1:-1] = np.exp(inf_log - correction)
+    inf_corr_0[0] = inf_corr_0[1]
+    inf_corr_0[-1] = inf_corr_0[-2]
+    inf_log_corr = np.zeros(len(inf_log))
+    for i in range(1, len(inf_corr_0) - 1):
+        inf_log_corr[i-1] = np.log(np.mean(inf_corr_0[i-1:i+2]))
+
+    # inf_time: time in days, starting with 1st non-zero value of y
+    # inf_log: log(y) corresponding to inf_time
+    # inf_log_corr: inf_log corrected 
+    # correction: correction on log scale, corresponding to inf_time
+    # inf_weekdays: corresponding weekdays to inf_time
+    # correct_day_indices: [0,1,2,3,4,5,6]
+    # correct_residuals: correction per weekday, len = 7
+    # res_spline: Deviation from spline on log scale, corresponding to inf_time
+    # inf_log_spline: spline corresponding to inf_time
+    return inf_time, inf_log, inf_log_corr, correction, inf_weekdays, correct_day_indices, correct_residuals, res_spline, inf_log_spline
+
+
+def parse_worldometer_page_bs(cordat, page):
+    # original parse_Worldometer_page: BeautifulSoup tree and eval of the array literals
+    bsdoc = BeautifulSoup(page, "html.parser")
+    daily_cases_graph_1 = bsdoc.find_all('script', type="text/javascript")
+    for dcg in daily_cases_graph_1:
+        b = str(dcg.get_text)
+        #print(dcg.get_text)
+        if 'graph-deaths-daily' in b:
+            start = b.find("name: 'Daily Deaths'")
+            x_start = b[start:].find('[')
+            x_end = b[start:].find(']')
+            data_deaths = eval(b[x_start+start:x_end+start+1].replace('null', '0'))
+
+            start = b.find('categ')
+            x_start = b[start:].find('[')
+            x_end = b[start:].find(']')
+            data_x = b[x_start+start:x_end+start+1]
+        if 'graph-cases-daily' in b:
+            start = b.find("name: 'Daily Cases'")
+            x_start = b[start:].find('[')
+            x_end = b[start:].find(']')
+            data_cases = eval(b[x_start+start:x_end+start+1].replace('null', '0'))
+    timescale = data_x[2:-2].split('","') # split time string into dates, ignoring leading '["' and ending '"]"
+    cor_days = []
+    for i, cor_date in enumerate(timescale):
+        cor_date_date = datetime.strptime(cor_date, '%b %d, %Y')
+        cor_days.append((cor_date_date - cordat.start_date).days)
+    for i, _ in enumerate(cor_days):
+        if i == 0:
+            continue
+        if cor_days[i] - cor_days[i-1] < 0:
+            cor_days[i] = cor_days[i] + 366
+
+    if list(range(cor_days[0], cor_days[-1] + 1)) == cor_days:
+        deaths = np.array([0] * cor_days[0] + data_deaths)
+        infs = np.array([0] * cor_days[0] + data_cases)
+        cor_days = np.array(list(range(cor_days[0])) + cor_days)
+    else:
+        deaths = np.array(data_deaths)
+        infs = np.array(data_cases)
+        cor_days = np.array(cor_days)
+    return cor_days, infs, deaths
+
+
+def build_RKI_untyped(cordat, rki_csv_file):
+    # build_RKI before typed ingestion: one read of all columns, every date string parsed
+    RKI_df = pd.read_csv(rki_csv_file)
+    RKI_df['days_Meldedat']= (((pd.to_datetime(RKI_df['Meldedatum']).dt.tz_localize(None))-np.datetime64(cordat.start_date))/ np.timedelta64(1, 'D')).astype(int)
+    RKI_cube = cordat.aggregate_RKI(RKI_df)
+    del RKI_df
+    return cordat.build_RKI_series(RKI_cube)
+
+
+def build_RKI_pivot(cordat, rki_csv_file):
+    # original build_RKI: four filter and pivot_table passes over the full data
+    c_dict = {}
+    RKI_df = pd.read_csv(rki_csv_file)
+    RKI_df['days_Meldedat']= (((pd.to_datetime(RKI_df['Meldedatum']).dt.tz_localize(None))-np.datetime64(cordat.start_date))/ np.timedelta64(1, 'D')).astype(int)
+    RKI_df['days_Refdat']= (((pd.to_datetime(RKI_df['Refdatum']).dt.tz_localize(None))-np.datetime64(cordat.start_date))/ np.timedelta64(1, 'D')).astype(int)
+    RKI_df['Leerzeile'] = '!_Alle'
+    # Altersgruppen in Bundesland
+    RKI_df_cases = RKI_df[RKI_df.NeuerFall.isin([0,1])]
+    RKI_df_cases_pivot = pd.pivot_table(RKI_df_cases, values='AnzahlFall', index=['days_Meldedat'], columns=['Bundesland', 'Leerzeile'], 
+            aggfunc=np.sum).fillna(0)
+    RKI_df_deaths = RKI_df[RKI_df.NeuerTodesfall.isin([0,1])]
+    RKI_df_deaths_pivot = pd.pivot_table(RKI_df_deaths, values='AnzahlTodesfall', index=['days_Meldedat'], columns=['Bundesland', 'Leerzeile'], 
+            aggfunc=np.sum).fillna(0)
+    RKI_infs, timescale_infs = clean_RKI_array_append(cordat, RKI_df_cases_pivot)
+    RKI_deaths, timescale_deaths = clean_RKI_array_append(cordat, RKI_df_deaths_pivot, refscale = timescale_infs)
+    time_minmax = (min(timescale_infs), max(timescale_infs))
+
+    RKI_index = RKI_infs.columns
+    for land_level1, land_level2 in RKI_index[1:]:
+        infs = np.array(RKI_infs[land_level1][land_level2]).astype(int)
+        deaths = np.array(RKI_deaths[land_level1][land_level2].astype(int))
+        deaths_copy = np.copy(deaths)
+        death_rate_stats = cordat.analyse_correlation(infs, deaths_copy)
+        death_rate = death_rate_stats[:,0]
+        death_rate_std = death_rate_stats[:,1]
+        if np.where(death_rate > 0)[0].shape[0] > 0:
+            death_rate_len = np.max(np.where(death_rate > 0))
+        else:
+            death_rate_len = 0
+        if land_level2 == '!_Alle':
+            land_level_alter = '!_Alle_age'
+            land_level_region = '!_Alle_reg'
+        else:
+            land_level_alter = land_level2
+            land_level_region = land_level2
+        c_dict[('RKIMA', land_level1, land_level_alter)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+        c_dict[('RKIMR', land_level1, land_level_region)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+
+    #*****************************************************
+    # Deutschland gesamt Altersgruppen & Region Meldedatum
+    #*****************************************************
+    RKI_df_cases = RKI_df[RKI_df.NeuerFall.isin([0,1])]
+    RKI_df_cases_pivot = pd.pivot_table(RKI_df_cases, values='AnzahlFall', index=['days_Meldedat'], columns=['Leerzeile', 'Altersgruppe'], 
+            aggfunc=np.sum).fillna(0)
+    RKI_df_deaths = RKI_df[RKI_df.NeuerTodesfall.isin([0,1])]
+    RKI_df_deaths_pivot = pd.pivot_table(RKI_df_deaths, values='AnzahlTodesfall', index=['days_Meldedat'], columns=['Leerzeile', 'Altersgruppe'], 
+            aggfunc=np.sum).fillna(0)
+    RKI_infs, timescale_infs = clean_RKI_array_append(cordat, RKI_df_cases_pivot)
+    RKI_deaths, timescale_deaths = clean_RKI_array_append(cordat, RKI_df_deaths_pivot, refscale = timescale_infs)
+    time_minmax = (min(timescale_infs), max(timescale_infs))
+
+    RKI_index = RKI_infs.columns
+    for land_level1, land_level2 in RKI_index[1:]:
+        infs = np.array(RKI_infs[land_level1][land_level2]).astype(int)
+        deaths = np.array(RKI_deaths[land_level1][land_level2].astype(int))
+        deaths_copy = np.copy(deaths)
+        death_rate_stats = cordat.analyse_correlation(infs, deaths_copy)
+        death_rate = death_rate_stats[:,0]
+        death_rate_std = death_rate_stats[:,1]
+        if np.where(death_rate > 0)[0].shape[0] > 0:
+            death_rate_len = np.max(np.where(death_rate > 0))
+        else:
+            death_rate_len = 0
+        c_dict[('RKIMA', '!_Deutschland', land_level2)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+    infs = np.sum(np.array(RKI_infs)[:,1:], axis = 1)
+    deaths = np.sum(np.array(RKI_deaths)[:,1:], axis = 1)
+    deaths_copy = np.copy(deaths)
+    death_rate_stats = cordat.analyse_correlation(infs, deaths_copy)
+    death_rate = death_rate_stats[:,0]
+    death_rate_std = death_rate_stats[:,1]
+    if np.where(death_rate > 0)[0].shape[0] > 0:
+        death_rate_len = np.max(np.where(death_rate > 0))
+    else:
+        death_rate_len = 0
+    c_dict[('RKIMA', '!_Deutschland', '!_Alle_age')] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+    c_dict[('RKIMR', '!_Deutschland', '!_Alle_reg')] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+
+    #*******************************
+    ## Altersgruppen nach Meldedatum
+    #*******************************
+    RKI_df_cases = RKI_df[RKI_df.NeuerFall.isin([0,1])]
+    RKI_df_cases_pivot = pd.pivot_table(RKI_df_cases, values='AnzahlFall', index=['days_Meldedat'], columns=['Bundesland', 'Altersgruppe'], 
+            aggfunc=np.sum).fillna(0)
+    RKI_df_deaths = RKI_df[RKI_df.NeuerTodesfall.isin([0,1])]
+    RKI_df_deaths_pivot = pd.pivot_table(RKI_df_deaths, values='AnzahlTodesfall', index=['days_Meldedat'], columns=['Bundesland', 'Altersgruppe'], 
+            aggfunc=np.sum).fillna(0)
+    RKI_infs, timescale_infs = clean_RKI_array_append(cordat, RKI_df_cases_pivot)
+    RKI_deaths, timescale_deaths = clean_RKI_array_append(cordat, RKI_df_deaths_pivot, refscale = timescale_infs)
+    time_minmax = (min(timescale_infs), max(timescale_infs))
+
+    RKI_index = RKI_infs.columns
+    for land_level1, land_level2 in RKI_index[1:]:
+        infs = np.array(RKI_infs[land_level1][land_level2].astype(int))
+        if (land_level1, land_level2) not in RKI_deaths.columns:
+            deaths = np.arange(infs.shape[0])
+        else:
+            deaths = np.array(RKI_deaths[land_level1][land_level2].astype(int))
+        deaths_copy = np.copy(deaths)
+        death_rate_stats = cordat.analyse_correlation(infs, deaths_copy)
+        death_rate = death_rate_stats[:,0]
+        death_rate_std = death_rate_stats[:,1]
+        if np.where(death_rate > 0)[0].shape[0] > 0:
+            death_rate_len = np.max(np.where(death_rate > 0))
+        else:
+            death_rate_len = 0
+        c_dict[('RKIMA', land_level1, land_level2)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+
+    #****************
+    # Regionen Meldedatum
+    #*****************
+    RKI_df_cases = RKI_df[RKI_df.NeuerFall.isin([0,1])]
+    RKI_df_cases_pivot = pd.pivot_table(RKI_df_cases, values='AnzahlFall', index=['days_Meldedat'], columns=['Bundesland', 'Landkreis'], 
+            aggfunc=np.sum).fillna(0)
+    RKI_df_deaths = RKI_df[RKI_df.NeuerTodesfall.isin([0,1])]
+    RKI_df_deaths_pivot = pd.pivot_table(RKI_df_deaths, values='AnzahlTodesfall', index=['days_Meldedat'], columns=['Bundesland', 'Landkreis'], 
+            aggfunc=np.sum).fillna(0)
+    RKI_infs, timescale_infs = clean_RKI_array_append(cordat, RKI_df_cases_pivot)
+    RKI_deaths, timescale_deaths = clean_RKI_array_append(cordat, RKI_df_deaths_pivot, refscale = timescale_infs)
+    time_minmax = (min(timescale_infs), max(timescale_infs))
+
+    RKI_index = RKI_infs.columns
+    for land_level1, land_level2 in RKI_index[1:]:
+        infs = np.array(RKI_infs[land_level1][land_level2].astype(int))
+        if (land_level1, land_level2) not in RKI_deaths.columns:
+            deaths = np.arange(infs.shape[0])
+        else:
+            deaths = np.array(RKI_deaths[land_level1][land_level2].astype(int))
+        deaths_copy = np.copy(deaths)
+        death_rate_stats = cordat.analyse_correlation(infs, deaths_copy)
+        death_rate = death_rate_stats[:,0]
+        death_rate_std = death_rate_stats[:,1]
+        if np.where(death_rate > 0)[0].shape[0] > 0:
+            death_rate_len = np.max(np.where(death_rate > 0))
+        else:
+            death_rate_len = 0
+        c_dict[('RKIMR', land_level1, land_level2)] = [infs, deaths, death_rate,
+                                death_rate_std, death_rate_len, time_minmax]
+
+    return c_dict
+
+
+def create_func_data_loop(steps, x_max, gen):
+    # Rt.create_func_data with the loops over every integration step
+    int_const = 1.0
+    integration_steps = 100
+    R_temp=[]
+    switch_r=[]
+    for i in range(len(steps)):
+        R_temp.append(steps[i][1])
+        switch_r.append(steps[i][0])
+    if len(switch_r) > 0:
+        del switch_r[0]
+    switch_r.append(1000)
+    R = list(reversed(R_temp))
+    switch = list(reversed(switch_r))
+    x_for_int = np.arange(1, x_max, 1/integration_steps)
+    int_func = np.zeros(len(x_for_int))
+    for i, t in enumerate(x_for_int):
+        for j in range(len(switch)):
+                if t < switch[j]:
+                    int_func[i] = R[j]
+    f_prime = np.log(int_func)/gen
+    infected_raw = np.zeros(len(f_prime))
+    for i, t in enumerate(f_prime):
+        if i == 0:
+            continue
+        else:
+            infected_raw[i] = infected_raw[i-1] + (f_prime[i]+f_prime[i-1])/2 * (x_for_int[i]-x_for_int[i-1])
+    time_R = np.arange(1, x_max, 0.1)
+    R_func = np.ones(time_R.shape[0], dtype = 'float')
+    infected_R = np.ones(time_R.shape[0], dtype = 'float')
+    for i in range(len(time_R)):
+        R_func[i] = int_func[int(i*integration_steps/10)]
+        infected_R[i] = infected_raw[int(i*integration_steps/10)]
+    infected_R = int_const*np.exp(infected_R)
+    return time_R, R_func, infected_R
+
+
+def load_R_table_eval(R_table_file):
+    # Rt.load_R_table with eval of the key and the filtered R steps (Rt.update_str)
+    R_dict = {}
+    with open(R_table_file, 'r') as f:
+        lines = f.readlines()
+    for line in lines:
+        country_str, R_steps = line.split(';')
+        country = eval(country_str)
+        R_clean = ''
+        for c in R_steps:
+            if c in ['1', '2', '3', '4', '5', '6', '7', '8', '9', '0', '(', ')', ',', '.', 'e', 'E']:
+                R_clean += c
+        if R_clean == '':
+            continue
+        R_dict[country] = eval('[' + R_clean + ']')
+    return R_dict
+
+
+# ***********************************************************************
+# Fixtures: local files in the format of the data sources, generated from
+# the data in local_files. CoronaData.urls can point to them instead of
+# the web resources.
+# ***********************************************************************
+def clean_RKI_array_append(cordat, import_df, refscale = [0, 0]):
+    # clean_RKI_array before densify_days: missing days appended with DataFrame.append
+    import_df.reset_index(inplace = True)
+    cor_days = (import_df.values[:,0]).astype('int')
+
+    # fill missing values rows
+    import_df_data = import_df.iloc[2:,:]
+    import_df['day_nr'] = cor_days
+    # fill in dates with no report
+    null_list = [0]*import_df.shape[1]
+    last_date = max(max(refscale) + 1, max(cor_days) + 1)
+    missing_dates = np.setdiff1d(list(range(last_date)), cor_days)
+    null_df = pd.DataFrame([null_list]*len(missing_dates), columns = import_df.columns, index = missing_dates)
+    null_df['day_nr'] = missing_dates
+    import_df =  import_df.append(null_df)
+    import_df.sort_values('day_nr', inplace = True)
+    # drop rows before start_date
+    import_df = import_df[import_df['day_nr'] >= 0]
+    timescale = import_df['day_nr']
+    # column 'day_nr' is not needed any more:
+    import_df.drop(['day_nr'], axis = 1, inplace = True)
+    # add header and data:
+
+    return import_df, timescale
+
+def clean_import_array_append(cordat, import_df, dateformat):
+    # clean_import_array before densify_days: strptime loop and DataFrame.append
+    timescale = import_df.values[2:,0]
+    cor_days = []
+    for i, cor_date in enumerate(timescale):
+        date = datetime.strptime(cor_date, dateformat)
+        cor_days.append((date - cordat.start_date).days)
+    # fill missing values rows
+    import_df_header = import_df.iloc[:2,:]
+    import_df_data = import_df.iloc[2:,:].copy(deep=True)
+    import_df_data.iloc[:, 1:] = import_df_data.iloc[:, 1:].diff()
+    import_df_data.iloc[0, 1:] = 0
+    import_df_data['day_nr'] = cor_days
+    # fill in dates with no report
+    null_list = [0]*import_df_data.shape[1]
+    missing_dates = np.setdiff1d(list(range(max(cor_days)+1)), cor_days)
+    null_df = pd.DataFrame([null_list]*len(missing_dates), columns = import_df_data.columns, index = missing_dates)
+    null_df['day_nr'] = missing_dates
+    import_df_data =  import_df_data.append(null_df)
+    import_df_data.sort_values('day_nr', inplace = True)
+    # drop rows before start_date
+    import_df_data = import_df_data[import_df_data['day_nr'] >= 0]
+    timescale = import_df_data['day_nr']
+    # column 'day_nr' is not needed any more:
+    import_df_data.drop(['day_nr'], axis = 1, inplace = True)
+    # add header and data:
+    import_df = import_df_header.append(import_df_data)
+
+    return import_df, timescale
+
+
+def clean_import_array_densify(cordat, import_df, dateformat):
+    # clean_import_array with densify_days, before the JHU builds read the csv files by jhu_matrix.
+    # import_df: transposed JHU table, rows 0 and 1 are the header, the other rows hold the date and
+    # the cumulated numbers. Returns header and daily numbers for every day, and the timescale
+    cor_days = cordat.day_numbers(import_df.iloc[2:, 0], dateformat)
+    import_df_data = import_df.iloc[2:, :].copy(deep = True)
+    import_df_data.iloc[:, 1:] = import_df_data.iloc[:, 1:].diff()
+    import_df_data.iloc[0, 1:] = 0
+    import_df_data = cordat.densify_days(import_df_data, cor_days)
+    return pd.concat([import_df.iloc[:2, :], import_df_data]), import_df_data.index.to_series()
+
+
+def build_jhu_global_iloc(cordat, raw):
+    # build_jhu_global before the matrix processing: per-column iloc and np.where scans
+    import_df = pd.read_csv(BytesIO(raw['inf']), error_bad_lines=False).transpose()
+    import_df.reset_index(inplace = True)
+    import_df.drop([2,3], inplace = True)
+    import_df, timescale = clean_import_array_append(cordat, import_df, '%m/%d/%y')
+
+    # import data on deaths:
+    import_df_deaths = pd.read_csv(BytesIO(raw['deaths']), error_bad_lines=False).transpose()
+    import_df_deaths.reset_index(inplace = True)
+    import_df_deaths.drop([2,3], inplace = True)
+    import_df_deaths, timescale_deaths = clean_import_array_append(cordat, import_df_deaths, '%m/%d/%y')
+
+    if len(timescale) != len(timescale_deaths):
+        print('Numbers of entries (infections / deaths) don´t match. Dumping timescales: \n')
+        for i in range(max(len(timescale_deaths), len(timescale))):
+            print(i, timescale[i], timescale_deaths[i])
+    time_minmax = (min(timescale), max(timescale))
+    # origin = ['jhu']*(import_df.shape[1]-1)
+    countries = import_df.iloc[1,1:]
+    regions = import_df.iloc[0,1:]
+    countries_with_regions = np.unique(countries[np.where(pd.notnull(regions))[0]])
+    for i, region in enumerate(regions):
+        if pd.isnull(region):
+            regions[i] = countries[i]
+    c_dict = {}
+    # first for countries with several regions:
+    for country in countries_with_regions:
+        region = '!_' + country + '_total'
+        infs = np.array(import_df.iloc[2:,(np.where(countries == country)[0] + 1)].sum(axis = 1).astype('int32'))
+        deaths = np.array(import_df_deaths.iloc[2:,(np.where(countries == country)[0] + 1)].sum(axis = 1).astype('int32'))
+        deaths_copy = np.copy(deaths)
+        death_rate_stats = cordat.analyse_correlation(infs, deaths_copy)
+        death_rate = death_rate_stats[:,0]
+        death_rate_std = death_rate_stats[:,1]
+        if np.where(death_rate > 0)[0].shape[0] > 0:
+            death_rate_len = np.max(np.where(death_rate > 0))
+        else:
+            death_rate_len = 0
+        c_dict[('JHU_GL', country, region)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+
+    # Now for all regions:
+    for i, region in enumerate(regions):
+        country = countries[i]
+        # print(country, region)
+        infs = np.array(import_df.iloc[2:,i + 1])
+        deaths = np.array(import_df_deaths.iloc[2:,i + 1])
+        deaths_copy = np.copy(deaths)
+        death_rate_stats = cordat.analyse_correlation(infs, deaths_copy)
+        death_rate = death_rate_stats[:,0]
+        death_rate_std = death_rate_stats[:,1]
+        if np.where(death_rate > 0)[0].shape[0] > 0:
+            death_rate_len = np.max(np.where(death_rate > 0))
+        else:
+            death_rate_len = 0
+        c_dict[('JHU_GL', country, region)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+
+    return c_dict
+
+def build_jhu_US_iloc(cordat, raw, show_counties = False):
+    # build_jhu_US before the matrix processing: per-column iloc and np.where scans
+    import_df = pd.read_csv(BytesIO(raw['inf']), error_bad_lines=False).transpose()
+    import_df.reset_index(inplace = True)
+    import_df.drop([0, 1, 2, 3, 4, 7, 8, 9, 10], inplace = True)
+    import_df, timescale = clean_import_array_append(cordat, import_df, '%m/%d/%y')
+
+    # import data on deaths:
+    import_df_deaths = pd.read_csv(BytesIO(raw['deaths']), error_bad_lines=False).transpose()
+    import_df_deaths.reset_index(inplace = True)
+    import_df_deaths.drop([0, 1, 2, 3, 4, 7, 8, 9, 10, 11], inplace = True)
+    import_df_deaths, timescale_deaths = clean_import_array_append(cordat, import_df_deaths, '%m/%d/%y')
+
+    if len(timescale) != len(timescale_deaths):
+        print('Numbers of entries (infections / deaths) don´t match. Dumping timescales: \n')
+        for i in range(max(len(timescale_deaths), len(timescale))):
+            print(i, timescale[i], timescale_deaths[i])
+    time_minmax = (min(timescale), max(timescale))
+    # origin = ['jhu']*(import_df.shape[1]-1)
+    countries = import_df.iloc[1,1:]
+    regions = import_df.iloc[0,1:]
+    countries_with_regions = np.unique(countries[np.where(pd.notnull(regions))[0]])
+    for i, region in enumerate(regions):
+        if pd.isnull(region):
+            regions[i] = countries[i]
+    c_dict = {}
+    # first for countries with several regions:
+    for country in countries_with_regions:
+        region = '!_' + country + '_total'
+        infs = np.array(import_df.iloc[2:,(np.where(countries == country)[0] + 1)].sum(axis = 1).astype('int32'))
+        deaths = np.array(import_df_deaths.iloc[2:,(np.where(countries == country)[0] + 1)].sum(axis = 1).astype('int32'))
+        deaths_copy = np.copy(deaths)
+        death_rate_stats = cordat.analyse_correlation(infs, deaths_copy)
+        death_rate = death_rate_stats[:,0]
+        death_rate_std = death_rate_stats[:,1]
+        if np.where(death_rate > 0)[0].shape[0] > 0:
+            death_rate_len = np.max(np.where(death_rate > 0))
+        else:
+            death_rate_len = 0
+        if show_counties:
+            c_dict[('JHU_US', country, region)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+        c_dict[('JHU_GL', 'US', country)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+
+    # Now for all regions if show_counties = True:
+    if show_counties:
+        for i, region in enumerate(regions):
+            country = countries[i]
+            # print(country, region)
+            infs = np.array(import_df.iloc[2:,i + 1])
+            deaths = np.array(import_df_deaths.iloc[2:,i + 1])
+            deaths_copy = np.copy(deaths)
+            death_rate_stats = cordat.analyse_correlation(infs, deaths_copy)
+            death_rate = death_rate_stats[:,0]
+            death_rate_std = death_rate_stats[:,1]
+            if np.where(death_rate > 0)[0].shape[0] > 0:
+                death_rate_len = np.max(np.where(death_rate > 0))
+            else:
+                death_rate_len = 0
+            c_dict[('JHU_US', country, region)] = [infs, deaths, death_rate, death_rate_std, death_rate_len, time_minmax]
+
+    return c_dict
+
+
+def make_fixtures(cordat, directory, n_days = None, rki_rows = 200000, seed = 0):
+    # writes fixture files to directory and returns the matching urls dict
+    rng = np.random.default_rng(seed)
+    if not path.exists(directory):
+        makedirs(directory)
+    jhu_keys = [key for key in cordat.corona_dict.keys() if key[0] == 'JHU_GL' and key[1] != 'US'
+                and not key[2].startswith('!_')]
+    us_keys = [key for key in cordat.corona_dict.keys() if key[0] == 'JHU_GL' and key[1] == 'US']
+    if n_days is None:
+        n_days = len(cordat.corona_dict[jhu_keys[0]][0])
+    dates = [cordat.start_date + timedelta(days = d) for d in range(n_days)]
+    date_cols = [f'{d.month}/{d.day}/{d.strftime("%y")}' for d in dates]
+
+    def cumulated(series):
+        return np.cumsum(np.asarray(series[:n_days], dtype = 'int64'))
+
+    # JHU global
+    for subset, name in ((0, 'confirmed'), (1, 'deaths')):
+        rows = []
+        for _, country, region in jhu_keys:
+            province = '' if region == country else region
+            rows.append([province, country, 0.0, 0.0] + list(cumulated(cordat.corona_dict[('JHU_GL', country, region)][subset])))
+        pd.DataFrame(rows, columns = ['Province/State', 'Country/Region', 'Lat', 'Long'] + date_cols).to_csv(
+            path.join(directory, f'time_series_covid19_{name}_global.csv'), index = False)
+
+    # JHU US: every state is split into three counties
+    for subset, name in ((0, 'confirmed'), (1, 'deaths')):
+        rows = []
+        for _, _, state in us_keys:
+            values = cumulated(cordat.corona_dict[('JHU_GL', 'US', state)][subset])
+            parts = [values // 3, values // 3, values - 2 * (values // 3)]
+            for i, part in enumerate(parts):
+                head = [0, 'US', 'USA', 840, 0.0, f'County {i}', state, 'US', 0.0, 0.0, f'County {i}, {state}, US']
+                if subset == 1:
+                    head.append(1000)
+                rows.append(head + list(part))
+        columns = ['UID', 'iso2', 'iso3', 'code3', 'FIPS', 'Admin2', 'Province_State', 'Country_Region',
+                   'Lat', 'Long_', 'Combined_Key'] + (['Population'] if subset == 1 else []) + date_cols
+        pd.DataFrame(rows, columns = columns).to_csv(path.join(directory, f'time_series_covid19_{name}_US.csv'), index = False)
+
+    # RKI: random case reports
+    laender = ['Bayern', 'Berlin', 'Hamburg', 'Sachsen']
+    kreise = {land: [f'LK {land} {i}' for i in range(5)] for land in laender}
+    alter = ['A00-A04', 'A05-A14', 'A15-A34', 'A35-A59', 'A60-A79', 'A80+', 'unbekannt']
+    land_idx = rng.integers(0, len(laender), rki_rows)
+    day_idx = np.sort(rng.integers(30, n_days, rki_rows))
+    rki_df = pd.DataFrame({
+        'ObjectId': np.arange(rki_rows),
+        'IdBundesland': land_idx + 1,
+        'Bundesland': np.array(laender)[land_idx],
+        'Landkreis': [kreise[laender[l]][k] for l, k in zip(land_idx, rng.integers(0, 5, rki_rows))],
+        'Altersgruppe': np.array(alter)[rng.integers(0, len(alter), rki_rows)],
+        'Geschlecht': np.array(['M', 'W'])[rng.integers(0, 2, rki_rows)],
+        'AnzahlFall': rng.integers(1, 5, rki_rows),
+        'AnzahlTodesfall': (rng.random(rki_rows) < 0.03).astype(int),
+        'Meldedatum': [dates[d].strftime('%Y/%m/%d 00:00:00+00') for d in day_idx],
+        'IdLandkreis': 0,
+        'Datenstand': dates[-1].strftime('%d.%m.%Y, 00:00 Uhr'),
+        'NeuerFall': rng.choice([-1, 0, 1], rki_rows, p = [0.01, 0.98, 0.01]),
+        'NeuerTodesfall': rng.choice([-9, 0, 1], rki_rows, p = [0.96, 0.03, 0.01]),
+        'Refdatum': [dates[max(d - 3, 0)].strftime('%Y/%m/%d 00:00:00+00') for d in day_idx],
+        'NeuGenesen': 0, 'AnzahlGenesen': 0, 'IstErkrankungsbeginn': 0, 'Altersgruppe2': 'Nicht übermittelt'})
+    rki_df.to_csv(path.join(directory, 'RKI_Daten.csv'), index = False)
+
+    # DIVI
+    rows = []
+    for d in range(60, n_days):
+        for land in ['DEUTSCHLAND', 'BAYERN', 'BERLIN']:
+            rows.append([dates[d].strftime('%Y-%m-%dT12:15:00+01:00'), land, int(rng.integers(0, 500)), int(rng.integers(500, 3000))])
+    pd.DataFrame(rows, columns = ['Datum', 'Bundesland', 'Aktuelle_COVID_Faelle_Erwachsene_ITS',
+                                  'Belegte_Intensivbetten_Erwachsene']).to_csv(path.join(directory, 'DIVI.csv'), index = False)
+
+    # Worldometers: country index and one page per country
+    wdm_dir = path.join(directory, 'worldometers')
+    rows = ''.join(f'<tr><td>{i}</td><td><a href="country/{c.lower()}/">{c}</a></td><td>{i * 1000}</td></tr>'
+                   for i, c in enumerate(cordat.wdm_countries))
+    filler = '<tr><td></td></tr>'
+    makedirs(wdm_dir, exist_ok = True)
+    with open(path.join(wdm_dir, 'index.html'), 'w') as f:
+        f.write(f'<html><body><table>{filler * 9}{rows}{filler * 8}</table></body></html>')
+    for country in cordat.wdm_countries:
+        series = cordat.corona_dict.get(('WDM', country, country))
+        if series is None:
+            series = [rng.integers(0, 1000, n_days), rng.integers(0, 10, n_days)]
+        with open(worldometer_page(wdm_dir, country), 'w') as f:
+            f.write(make_worldometer_page(dates[24:n_days], series[0][24:n_days], series[1][24:n_days]))
+
+    return {'JHU_GL_inf': path.join(directory, 'time_series_covid19_confirmed_global.csv'),
+            'JHU_GL_deaths': path.join(directory, 'time_series_covid19_deaths_global.csv'),
+            'JHU_US_inf': path.join(directory, 'time_series_covid19_confirmed_US.csv'),
+            'JHU_US_deaths': path.join(directory, 'time_series_covid19_deaths_US.csv'),
+            'RKI': path.join(directory, 'RKI_Daten.csv'),
+            'Worldometers_index': path.join(wdm_dir, 'index.html'),
+            'Worldometers': wdm_dir,
+            'DIVI': path.join(directory, 'DIVI.csv')}
+
+
+def worldometer_page(wdm_dir, country):
+    page_dir = path.join(wdm_dir, 'country', country.lower())
+    makedirs(page_dir, exist_ok = True)
+    return path.join(page_dir, 'index.html')
+
+
+def make_worldometer_page(dates, cases, deaths):
+    # html page with the Highcharts scripts of a worldometers country page
+    categories = '","'.join(d.strftime('%b %d, %Y') for d in dates)
+    def values(series):
+        return ','.join('null' if v == 0 else str(int(v)) for v in series)
+    def chart(graph, name, series):
+        return (f'<script type="text/javascript">Highcharts.chart(\'{graph}\', {{ chart: {{ type: \'column\' }}, '
+                f'xAxis: {{ categories: ["{categories}"] }}, yAxis: {{ title: {{ text: \'{name}\' }} }}, '
+                f'series: [{{ name: \'{name}\', color: \'#999\', data: [{values(series)}] }}] }});</script>')
+    return ('<html><head><script type="text/javascript">var x = 1;</script></head><body><div>' + 'text ' * 2000 +
+            chart('graph-cases-daily', 'Daily Cases', cases) + chart('graph-deaths-daily', 'Daily Deaths', deaths) +
+            '</div></body></html>')
+
+
+# ***********************************************************************
+# Local HTTP stand-in for the web sources: serves a directory with an
+# artificial latency per request, can answer the first request of every
+# path with 503 to exercise retries. Connections are counted.
+# ***********************************************************************
+class StandInHandler(SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'       # keep-alive
+    latency = 0.0
+    fail_first = False
+    connections = 0
+    not_modified = 0
+    requested = set()
+    lock = Lock()
+    etag = None
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            type(self).connections += 1
+
+    def do_GET(self):
+        sleep(self.latency)
+        with self.lock:
+            first = self.path not in self.requested
+            self.requested.add(self.path)
+        if self.fail_first and first:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        super().do_GET()
+
+    def send_head(self):
+        # files get an ETag from size and mtime, a matching If-None-Match is answered with 304
+        file_path = self.translate_path(self.path)
+        if path.isfile(file_path):
+            file_stat = stat(file_path)
+            self.etag = f'"{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}"'
+            if self.headers.get('If-None-Match') == self.etag:
+                with self.lock:
+                    type(self).not_modified += 1
+                self.send_response(304)
+                self.end_headers()
+                return None
+        return super().send_head()
+
+    def end_headers(self):
+        if self.etag is not None:
+            self.send_header('ETag', self.etag)
+            self.etag = None
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in(directory, latency = 0.0, fail_first = False):
+    # returns (server, base url); stop with server.shutdown()
+    handler = type('Handler', (StandInHandler,), {'latency': latency, 'fail_first': fail_first,
+                                                  'connections': 0, 'not_modified': 0, 'requested': set()})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory = directory))
+    Thread(target = server.serve_forever, daemon = True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+def temporary_data(local_files_dir):
+    # CoronaData on a copy of the pickled dicts of local_files in local_files_dir: their stores are
+    # written there on first load, ./local_files stays unchanged
+    for dict_file in glob(path.join(CoronaData(load = False).local_files_dir, '*.dict')):
+        copy(dict_file, local_files_dir)
+    with redirect_stdout(StringIO()):
+        data = CoronaData(load = False)
+        data.local_files_dir = local_files_dir
+        data.populate_dict()
+    return data
+
+
+def run_refresh(cordat, directory, **settings):
+    # CoronaRefresh of all sources from the fixtures of cordat in directory/fixtures to
+    # directory/local_files, settings are set on its CoronaData. Returns the CoronaData,
+    # the timings of run and the total time
+    refresh_data = CoronaData(load = False)
+    refresh_data.urls = make_fixtures(cordat, path.join(directory, 'fixtures'))
+    refresh_data.local_files_dir = path.join(directory, 'local_files')
+    for attribute, value in settings.items():
+        setattr(refresh_data, attribute, value)
+    with redirect_stdout(StringIO()):
+        timings, t_total = timed(CoronaRefresh(refresh_data).run)
+    return refresh_data, timings, t_total
+
+
+def serial_build(urls, local_files_dir):
+    # the update_*_to_file methods one after another, from urls to local_files_dir
+    serial_data = CoronaData(load = False)
+    serial_data.urls = urls
+    serial_data.local_files_dir = local_files_dir
+    with redirect_stdout(StringIO()):
+        serial_data.update_jhu_global_to_file(forced_update = True)
+        serial_data.update_jhu_US_to_file(forced_update = True, show_counties = serial_data.show_counties)
+        serial_data.update_RKI_to_file(forced_update = True)
+        serial_data.update_Worldometer_to_file(forced_update = True)
+        serial_data.update_DIVI_to_file(forced_update = True)
+    return serial_data
+
+
+def rki_update_steps(cordat, directory, rki_rows = 400000):
+    '''rki_update_steps runs RKI updates (update_RKI_to_file) from a local stand-in serving fixtures in
+    directory: full build without the last report day, unchanged file (304 Not Modified), the last
+    report day appended and corrected reports of a few days. Yields (step, CoronaData, time of the update,
+    fixture csv file, stand-in server) after every update.'''
+    urls = make_fixtures(cordat, path.join(directory, 'fixtures'), rki_rows = rki_rows)
+    rki_df = pd.read_csv(urls['RKI'])
+    report_days = sorted(rki_df['Meldedatum'].unique())
+    rki_df[rki_df['Meldedatum'] != report_days[-1]].to_csv(urls['RKI'], index = False)
+    server, base_url = start_stand_in(path.dirname(urls['RKI']))
+    update_data = CoronaData(load = False)
+    update_data.urls['RKI'] = base_url + path.basename(urls['RKI'])
+    update_data.local_files_dir = path.join(directory, 'local_files')
+    meta_file = path.join(update_data.local_files_dir, 'RKI_Daten.meta.json')
+
+    def next_day():
+        # the daily check of the RKI csv file is due again
+        with open(meta_file, 'r') as f:
+            meta = json.load(f)
+        meta['checked'] = None
+        with open(meta_file, 'w') as f:
+            json.dump(meta, f)
+
+    def update(step):
+        with redirect_stdout(StringIO()):
+            _, t_step = timed(update_data.update_RKI_to_file, forced_update = True)
+        return step, update_data, t_step, urls['RKI'], server
+
+    try:
+        yield update('full build')
+        next_day()
+        yield update('not modified')
+        # the daily update: reports of a new day
+        rki_df.to_csv(urls['RKI'], index = False)
+        next_day()
+        yield update('new day')
+        # corrections: one more case in every report of one Landkreis on three days
+        corrected = (rki_df['Meldedatum'].isin(report_days[len(report_days) // 2:len(report_days) // 2 + 3]) &
+                     (rki_df['Landkreis'] == rki_df['Landkreis'].iloc[0]))
+        rki_df.loc[corrected, 'AnzahlFall'] += 1
+        rki_df.to_csv(urls['RKI'], index = False)
+        next_day()
+        yield update('3 days changed')
+    finally:
+        server.shutdown()
+
+
+def densify_inputs(cordat):
+    # inputs of clean_import_array and clean_RKI_array from the JHU and DIVI fixtures with every
+    # 7th day missing: transposed JHU table, DIVI pivot table and its refscale
+    with TemporaryDirectory() as tmp_dir:
+        urls = make_fixtures(cordat, tmp_dir, rki_rows = 10)
+        jhu_df = pd.read_csv(urls['JHU_GL_inf']).transpose()
+        divi_df = pd.read_csv(urls['DIVI'])
+    jhu_df.reset_index(inplace = True)
+    jhu_df.drop([2, 3], inplace = True)
+    jhu_df = jhu_df.drop(jhu_df.index[2::7])
+    divi_df['Datum_Tag'] = cordat.day_numbers(divi_df['Datum'].str[:10], '%Y-%m-%d')
+    divi_df = divi_df[divi_df['Datum_Tag'] % 7 != 3]
+    divi_pivot = pd.pivot_table(divi_df, values = ['Aktuelle_COVID_Faelle_Erwachsene_ITS', 'Belegte_Intensivbetten_Erwachsene'],
+                                index = ['Datum_Tag'], columns = ['Bundesland'], aggfunc = np.sum).fillna(0)
+    return jhu_df, divi_pivot, [0, divi_pivot.index.max() + 20]
+
+
+def private_memory():
+    # private memory (clean + dirty pages) of this process in bytes, None if not available (Linux only)
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+    return 1024 * sum(int(fields[name].split()[0]) for name in ('Private_Clean', 'Private_Dirty'))
+
+
+def preload_worker(data, local_files_dir, queue):
+    # forked worker: preloaded data or a CoronaData of its own, reads every series once and
+    # reports (startup time, private memory, sum of all infections)
+    t_start = perf_counter()
+    memory_start = private_memory()
+    if data is None:
+        with redirect_stdout(StringIO()):
+            data = CoronaData(load = False)
+            data.local_files_dir = local_files_dir
+            data.populate_dict()
+    total = sum(float(np.sum(data.corona_dict[key][0])) for key in data.corona_dict.keys())
+    t_startup = perf_counter() - t_start
+    memory = private_memory()
+    queue.put((t_startup, None if memory is None else memory - memory_start, total))
+
+
+def reattach_worker(data, queue):
+    # forked worker: reattaches to a new store generation published after the fork
+    with redirect_stdout(StringIO()):
+        reattached = data.reattach_if_stale(forced_check = True)
+    queue.put((reattached, data.corona_dict.lookup[next(iter(data.corona_dict.keys()))][0].generation))
+
+
+def timed(func, *args, repeat = 1, **kwargs):
+    # returns result of func and the best wall time of repeat runs in seconds
+    best = None
+    for _ in range(repeat):
+        t_start = perf_counter()
+        result = func(*args, **kwargs)
+        t_run = perf_counter() - t_start
+        best = t_run if best is None else min(best, t_run)
+    return result, best
+
+
+def traced(func, *args, **kwargs):
+    # returns result of func, wall time in seconds and peak of traced memory in bytes
+    tracemalloc.start()
+    t_start = perf_counter()
+    result = func(*args, **kwargs)
+    t_run = perf_counter() - t_start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, t_run, peak
+
+
+# ***********************************************************************
+# Benchmarks
+# ***********************************************************************
+def bench_refresh(cordat):
+    # refresh of all sources from fixture files, into a temporary local_files directory
+    # (checked against a serial build by test_corona.test_refresh_equals_serial_build)
+    with TemporaryDirectory() as tmp_dir:
+        refresh_data, timings, t_total = run_refresh(cordat, tmp_dir)
+        print(f'refresh of {len(timings)} sources: {t_total:.2f} s, {len(refresh_data.corona_dict)} series')
+        for source, source_timings in timings.items():
+            print(f'  {source:13s}' + ', '.join(f'{stage} {t:7.3f} s' for stage, t in source_timings.items()))
+
+
+def bench_worldometers_fetch(cordat):
+    # Worldometers download from a local stand-in with 50 ms latency per request
+    with TemporaryDirectory() as tmp_dir:
+        urls = make_fixtures(cordat, tmp_dir, rki_rows = 10)
+        for workers, fail_first in ((1, False), (8, False), (8, True)):
+            server, base_url = start_stand_in(urls['Worldometers'], latency = 0.05, fail_first = fail_first)
+            fetch_data = CoronaData(load = False)
+            fetch_data.urls['Worldometers_index'] = base_url + '#countries'
+            fetch_data.urls['Worldometers'] = base_url
+            fetch_data.http_workers = workers
+            fetch_data.http_backoff = 0.01
+            with redirect_stdout(StringIO()):
+                series, t_fetch = timed(fetch_data.fetch_Worldometer)
+            server.shutdown()
+            assert list(series.keys()) == cordat.wdm_countries
+            print(f'Worldometers fetch, {workers} worker(s){", first request fails" if fail_first else ""}: '
+                  f'{t_fetch:.3f} s, {server.RequestHandlerClass.func.connections} connections')
+
+
+def bench_worldometers_parse(cordat):
+    # parsing of saved country pages: BeautifulSoup + eval vs. regex extractor
+    with TemporaryDirectory() as tmp_dir:
+        urls = make_fixtures(cordat, tmp_dir, rki_rows = 10)
+        pages = []
+        for country in cordat.wdm_countries:
+            with open(worldometer_page(urls['Worldometers'], country), 'r') as f:
+                pages.append(f.read())
+    bs_results, t_bs = timed(lambda: [parse_worldometer_page_bs(cordat, page) for page in pages])
+    re_results, t_re = timed(lambda: [cordat.parse_Worldometer_page(page) for page in pages], repeat = 3)
+    for bs_result, re_result in zip(bs_results, re_results):
+        assert all(np.array_equal(a, b) for a, b in zip(bs_result, re_result))
+    size = sum(len(page) for page in pages) / len(pages) / 1024
+    print(f'Worldometers page parsing ({len(pages)} pages, {size:.0f} kB each, results identical)')
+    print(f'  BeautifulSoup + eval: {1e3 * t_bs / len(pages):9.3f} ms per page')
+    print(f'  regex extractor:      {1e3 * t_re / len(pages):9.3f} ms per page')
+
+
+def bench_rki_aggregation(cordat):
+    # RKI build from a fixture csv: wall time and peak memory (tracemalloc) of the former
+    # pivot_table passes, the aggregation cube of an untyped full read and the typed, chunked read
+    rki_chunksize = cordat.rki_chunksize
+    rki_incremental = cordat.rki_incremental
+    cordat.rki_incremental = False
+    with TemporaryDirectory() as tmp_dir:
+        urls = make_fixtures(cordat, tmp_dir, rki_rows = 1000000)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            pivot_dict, t_pivot, mem_pivot = traced(build_RKI_pivot, cordat, urls['RKI'])
+            cube_dict, t_cube, mem_cube = traced(build_RKI_untyped, cordat, urls['RKI'])
+            chunked = {}
+            for chunksize in (100000, 500000):
+                cordat.rki_chunksize = chunksize
+                chunked[chunksize] = traced(cordat.build_RKI, urls['RKI'])
+            cordat.rki_chunksize = rki_chunksize
+            cordat.rki_incremental = rki_incremental
+    for c_dict in [cube_dict] + [result[0] for result in chunked.values()]:
+        assert list(pivot_dict.keys()) == list(c_dict.keys())
+        for key in pivot_dict.keys():
+            assert all(np.allclose(np.asarray(a, dtype = 'float'), np.asarray(b, dtype = 'float'))
+                       for a, b in zip(pivot_dict[key][:4], c_dict[key][:4]))
+    print(f'RKI build (1000000 rows, {len(cube_dict)} series, results identical)')
+    print(f'  pivot_table passes:      {t_pivot:7.2f} s, peak memory {mem_pivot / 2**20:7.1f} MB')
+    print(f'  untyped cube:            {t_cube:7.2f} s, peak memory {mem_cube / 2**20:7.1f} MB')
+    for chunksize, (_, t_chunked, mem_chunked) in chunked.items():
+        print(f'  typed, chunks of {chunksize:6d}: {t_chunked:7.2f} s, peak memory {mem_chunked / 2**20:7.1f} MB')
+
+
+def bench_rki_incremental(cordat):
+    # RKI updates from a local stand-in, see rki_update_steps (test_corona.test_rki_incremental_equals_full_build
+    # checks that every update equals a full build)
+    timings = {}
+    recomputed = {}
+    with TemporaryDirectory() as tmp_dir:
+        for step, update_data, t_step, _, _ in rki_update_steps(cordat, tmp_dir):
+            timings[step] = t_step
+            recomputed[step] = update_data.rki_recomputed
+        n_series = len(SourceStore(update_data.local_files_dir, update_data.store_name('RKI')).keys)
+    print(f'RKI update (400000 rows, {n_series} series)')
+    for step, t_step in timings.items():
+        print(f'  {step:15s} {t_step:7.2f} s, {recomputed[step]:4d} series analysed')
+
+
+def bench_densify(cordat):
+    # densify_days based clean_import_array / clean_RKI_array against the DataFrame.append versions
+    # (test_corona.test_densify_equals_append checks the results)
+    jhu_df, divi_pivot, refscale = densify_inputs(cordat)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        _, t_jhu_append = timed(lambda: clean_import_array_append(cordat, jhu_df.copy(), '%m/%d/%y'), repeat = 3)
+        _, t_divi_append = timed(lambda: clean_RKI_array_append(cordat, divi_pivot.copy(), refscale), repeat = 3)
+    (jhu_dense, _), t_jhu_dense = timed(lambda: clean_import_array_densify(cordat, jhu_df.copy(), '%m/%d/%y'), repeat = 3)
+    (divi_dense, _), t_divi_dense = timed(lambda: cordat.clean_RKI_array(divi_pivot.copy(), refscale), repeat = 3)
+    print(f'clean arrays (JHU {jhu_dense.shape[0] - 2} days x {jhu_dense.shape[1] - 1} regions, DIVI {divi_dense.shape[0]} days)')
+    print(f'  clean_import_array: append {1e3 * t_jhu_append:8.2f} ms, densify_days {1e3 * t_jhu_dense:8.2f} ms')
+    print(f'  clean_RKI_array:    append {1e3 * t_divi_append:8.2f} ms, densify_days {1e3 * t_divi_dense:8.2f} ms')
+
+
+def bench_jhu(cordat):
+    # JHU builds from fixtures (US with show_counties): per-column iloc against the int32 matrix
+    with TemporaryDirectory() as tmp_dir:
+        fixture_data = CoronaData(load = False)
+        fixture_data.urls = make_fixtures(cordat, tmp_dir, rki_rows = 10)
+        raw_global = fixture_data.fetch_jhu_global()
+        raw_US = fixture_data.fetch_jhu_US()
+    results = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results['global', 'iloc'] = timed(build_jhu_global_iloc, cordat, raw_global)
+        results['US', 'iloc'] = timed(build_jhu_US_iloc, cordat, raw_US, show_counties = True)
+    results['global', 'matrix'] = timed(cordat.build_jhu_global, raw_global, repeat = 3)
+    results['US', 'matrix'] = timed(cordat.build_jhu_US, raw_US, show_counties = True, repeat = 3)
+    for source in ('global', 'US'):
+        iloc_dict, matrix_dict = results[source, 'iloc'][0], results[source, 'matrix'][0]
+        assert list(iloc_dict.keys()) == list(matrix_dict.keys())
+        for key in iloc_dict.keys():
+            assert all(np.allclose(np.asarray(a, dtype = 'float'), np.asarray(b, dtype = 'float'), rtol = 1e-12, atol = 1e-12)
+                       for a, b in zip(iloc_dict[key][:4], matrix_dict[key][:4]))
+            assert iloc_dict[key][4:] == matrix_dict[key][4:]
+        print(f'JHU {source} build ({len(matrix_dict)} series, results identical): '
+              f'iloc {results[source, "iloc"][1]:6.2f} s, matrix {results[source, "matrix"][1]:6.2f} s')
+
+
+def bench_preload(cordat, n_workers = 4):
+    # forked workers with preloaded (shared) data against workers loading their own CoronaData,
+    # and reattaching of a preloaded worker to a store generation published after the fork
+    context = get_context('fork')
+    with TemporaryDirectory() as tmp_dir:
+        for dict_file in glob(path.join(cordat.local_files_dir, '*.dict')):
+            copy(dict_file, tmp_dir)
+        with redirect_stdout(StringIO()):
+            data = CoronaData(load = False)
+            data.local_files_dir = tmp_dir
+            data.convert_dict_files()
+            data.populate_dict()
+        results = {}
+        for mode, worker_data in (('own CoronaData', None), ('preloaded', data)):
+            queue = context.Queue()
+            workers = [context.Process(target = preload_worker, args = (worker_data, tmp_dir, queue))
+                       for _ in range(n_workers)]
+            for worker in workers:
+                worker.start()
+            results[mode] = [queue.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+        assert len(set(result[2] for mode_results in results.values() for result in mode_results)) == 1
+
+        # refresh in the parent: new generation of the first store
+        first_store = data.corona_dict.source_stores[0]
+        with redirect_stdout(StringIO()):
+            write_source_store(tmp_dir, first_store.name, {key: first_store.series(i) for i, key in enumerate(first_store.keys)})
+        queue = context.Queue()
+        worker = context.Process(target = reattach_worker, args = (data, queue))
+        worker.start()
+        reattached, generation = queue.get()
+        worker.join()
+        assert reattached and generation == first_store.generation + 1
+
+        # the previous generation is kept for readers which have not reattached, until the next publish
+        def counts_file(generation):
+            return path.join(tmp_dir, f'{first_store.name}.{generation}.counts.npy')
+        assert path.exists(counts_file(first_store.generation))
+        with redirect_stdout(StringIO()):
+            write_source_store(tmp_dir, first_store.name, {key: first_store.series(i) for i, key in enumerate(first_store.keys)})
+        assert not path.exists(counts_file(first_store.generation)) and path.exists(counts_file(generation))
+
+    print(f'{n_workers} forked workers, {len(data.corona_dict)} series')
+    for mode, mode_results in results.items():
+        t_startup = max(result[0] for result in mode_results)
+        memory = [result[1] for result in mode_results]
+        memory_text = ', '.join(f'{m / 2**20:.1f}' for m in memory) + ' MB' if None not in memory else 'n/a'
+        print(f'  {mode:15s} startup {t_startup:6.3f} s, private memory per worker {memory_text}')
+    print(f'  reattach after refresh: generation {generation} mapped by the preloaded worker')
+
+
+def bench_correlation(cordat):
+    keys = [key for key in cordat.corona_dict.keys() if key[0] == 'JHU_GL']
+    c_i = np.array([np.asarray(cordat.corona_dict[key][0], dtype = 'float') for key in keys])
+    c_d = np.array([np.asarray(cordat.corona_dict[key][1], dtype = 'float') for key in keys])
+    n_loop = min(20, len(keys))
+
+    with warnings.catch_warnings():
+        # the loop calls np.mean on empty lists for shifts without data
+        warnings.simplefilter('ignore', RuntimeWarning)
+        loop_results, t_loop = timed(lambda: [analyse_correlation_loop(cordat, c_i[r], c_d[r]) for r in range(n_loop)])
+    single_results, t_single = timed(lambda: [cordat.analyse_correlation(c_i[r], c_d[r]) for r in range(n_loop)], repeat = 3)
+    batch_results, t_batch = timed(cordat.analyse_correlation_batch, c_i, c_d, repeat = 3)
+
+    max_dev = max(np.max(np.abs(loop_results[r] - batch_results[r])) for r in range(n_loop))
+    assert all(np.allclose(loop_results[r], single_results[r], rtol = 1e-12, atol = 1e-12) for r in range(n_loop))
+    assert all(np.allclose(loop_results[r], batch_results[r], rtol = 1e-12, atol = 1e-12) for r in range(n_loop))
+    print(f'analyse_correlation ({len(keys)} regions, {c_i.shape[1]} days, max. deviation {max_dev:.2e})')
+    print(f'  loop:       {1e3 * t_loop / n_loop:9.3f} ms per region')
+    print(f'  vectorized: {1e3 * t_single / n_loop:9.3f} ms per region')
+    print(f'  batch:      {1e3 * t_batch / len(keys):9.3f} ms per region')
+
+
+def bench_remove_weekly(cordat):
+    keys = [key for key in cordat.corona_dict.keys() if key[0] == 'JHU_GL'][:20]
+    series = []
+    for key in keys:
+        time_minmax = cordat.corona_dict[key][5]
+        x = np.arange(time_minmax[0], time_minmax[1] + 1)
+        series.append((x, cordat.corona_dict[key][0], (cordat.start_date.weekday() + x) % 7))
+
+    with warnings.catch_warnings():
+        # medians of empty weekday selections for short series
+        warnings.simplefilter('ignore', RuntimeWarning)
+        loop_results, t_loop = timed(lambda: [remove_weekly_loop(cordat, x, y, w, 7, spline_s = 0, spline_k = 5)
+                                              for x, y, w in series])
+        vector_results, t_vector = timed(lambda: [cordat.remove_weekly(x, y, w, 7, spline_s = 0, spline_k = 5)
+                                                  for x, y, w in series], repeat = 3)
+    for loop_result, vector_result in zip(loop_results, vector_results):
+        assert all(np.array_equal(np.asarray(a), np.asarray(b), equal_nan = True) for a, b in zip(loop_result, vector_result))
+    print(f'remove_weekly ({len(keys)} series, correct_weeks = 7, results identical)')
+    print(f'  loop:       {1e3 * t_loop / len(keys):9.3f} ms per series')
+    print(f'  vectorized: {1e3 * t_vector / len(keys):9.3f} ms per series')
+
+
+def bench_weekly_precompute(cordat, n_keys = 200):
+    # weekly correction at request time (remove_weekly) against the series precomputed at refresh
+    # time (precompute_weekly) and read from the store, results have to be identical
+    keys = [key for key in cordat.corona_dict.keys() if len(cordat.corona_dict[key][0]) >= 40][:n_keys]
+    c_dict = {key: cordat.corona_dict[key] for key in keys}
+    weekly, t_precompute = timed(cordat.precompute_weekly, c_dict)
+    correct_weeks = cordat.precompute_weeks[0]
+    with TemporaryDirectory() as directory:
+        write_source_store(directory, 'weekly', c_dict, weekly)
+        store = CoronaStore([SourceStore(directory, 'weekly')])
+
+        def request_time():
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                return [cordat.weekly_corrected_series(c_dict[key], 0, correct_weeks) for key in keys]
+
+        computed, t_compute = timed(request_time)
+        stored, t_stored = timed(lambda: [store.weekly_series(key, 0, correct_weeks) for key in keys], repeat = 3)
+        for computed_series, stored_series in zip(computed, stored):
+            assert (computed_series is None) == (stored_series is None)
+            if computed_series is not None:
+                assert np.array_equal(computed_series[0], stored_series[0])
+                assert np.array_equal(computed_series[1], stored_series[1], equal_nan = True)
+    print(f'weekly correction ({len(keys)} keys, correct_weeks = {correct_weeks}, results identical)')
+    print(f'  precompute (refresh): {1e3 * t_precompute / len(keys):9.3f} ms per key (infections and deaths)')
+    print(f'  request time:         {1e3 * t_compute / len(keys):9.3f} ms per series')
+    print(f'  from store:           {1e3 * t_stored / len(keys):9.3f} ms per series')
+
+
+def bench_rt_model(cordat):
+    # step R model of every R_table.dict entry, on a 600 day horizon and the horizon of the data,
+    # plus unordered steps and steps beyond day 1000
+    Rt_data = Rt(cordat)
+    cases = [(steps, x_max) for steps in Rt_data.R_dict.values() for x_max in (600, 1100)]
+    cases += [([(0, 1.2), (80, 0.9), (40, 1.5), (300, 1.1)], 600), ([(0, 1.0), (50, 1.3)], 1100)]
+    with warnings.catch_warnings():
+        # log(0) after day 1000
+        warnings.simplefilter('ignore', RuntimeWarning)
+        loop_results, t_loop = timed(lambda: [create_func_data_loop(steps, x_max, Rt_data.gen) for steps, x_max in cases])
+        vector_results, t_vector = timed(lambda: [step_R_model(steps, x_max, Rt_data.gen) for steps, x_max in cases], repeat = 5)
+    for loop_result, vector_result in zip(loop_results, vector_results):
+        assert all(np.array_equal(a, b, equal_nan = True) for a, b in zip(loop_result, vector_result))
+    print(f'step R model ({len(cases)} cases, results identical)')
+    print(f'  loop:       {1e3 * t_loop / len(cases):9.3f} ms per call')
+    print(f'  vectorized: {1e3 * t_vector / len(cases):9.3f} ms per call')
+
+
+def bench_rt_batch(cordat, n_keys = 300, x_max = 600):
+    # step R models of n_keys entries: one step_R_model call per entry against step_R_model_batch
+    rng = np.random.default_rng(0)
+    Rt_data = Rt(cordat)
+    steps_list = list(Rt_data.R_dict.values()) + [[(0, 1.2), (80, 0.9), (40, 1.5), (300, 1.1)]]
+    while len(steps_list) < n_keys:
+        days = np.sort(rng.choice(np.arange(1, 500), size = rng.integers(1, 20), replace = False))
+        steps_list.append([(0, 1.0)] + [(int(day), float(np.round(rng.uniform(0.6, 2.0), 2))) for day in days])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        single_results, t_single = timed(lambda: [step_R_model(steps, x_max, Rt_data.gen) for steps in steps_list])
+        (time_R, R_func, infected_R), t_batch = timed(step_R_model_batch, steps_list, x_max, Rt_data.gen, repeat = 3)
+    for k, (single_time_R, single_R_func, single_infected_R) in enumerate(single_results):
+        assert np.array_equal(single_time_R, time_R)
+        assert np.array_equal(single_R_func, R_func[k]) and np.array_equal(single_infected_R, infected_R[k])
+    print(f'step R model batch ({len(steps_list)} entries, x_max = {x_max}, results identical)')
+    print(f'  single calls: {1e3 * t_single / len(steps_list):9.3f} ms per entry')
+    print(f'  batch:        {1e3 * t_batch / len(steps_list):9.3f} ms per entry')
+
+
+def bench_rt_fit(cordat, noise = 0.05):
+    # R step fit of a synthetic series with known steps, then of all series of cordat in the process pool
+    Rt_data = Rt(cordat)
+    true_steps = [(0, 1.0), (30, 2.5), (60, 0.8), (110, 1.3), (160, 0.9), (230, 1.1)]
+    days = np.arange(0, 310)
+    day_index = (np.maximum(days, 1) - 1) * 10                  # position of the days in time_R
+    _, _, infected_R = step_R_model(true_steps, 320, Rt_data.gen)
+    y = infected_R[day_index] * np.exp(np.random.default_rng(0).normal(0, noise, days.shape[0]))
+    steps, t_fit = timed(fit_R_steps, days, y, Rt_data.gen, repeat = 3)
+    _, _, fitted_R = step_R_model(steps, 320, Rt_data.gen)
+    fitted = y >= 10
+    rms = np.sqrt(np.mean((np.log(fitted_R[day_index][fitted]) - np.log(y[fitted]))**2))
+    assert rms < 1.5 * noise
+    assert all(min(abs(day - fitted_day) for fitted_day, _ in steps[2:]) <= 3 for day, _ in true_steps[2:])
+    print(f'R step fit, synthetic series ({len(true_steps)} steps, log noise {noise}): {len(steps)} steps, '
+          f'log rms {rms:.3f}, {1e3 * t_fit:.1f} ms')
+
+    # a hand-tuned entry is kept, all other keys are fitted
+    keys = list(cordat.corona_dict.keys())
+    hand_tuned = [(0, 1.0), (50, 1.5)]
+    Rt_data.R_dict = {keys[0]: hand_tuned}
+    with redirect_stdout(StringIO()):
+        R_steps, t_all = timed(Rt_data.fit_R_dict, keys)
+    assert keys[0] not in R_steps and Rt_data.R_dict[keys[0]] == hand_tuned
+    assert all(Rt_data.R_dict[key] == steps for key, steps in R_steps.items())
+    n_steps = [len(steps) for steps in R_steps.values()]
+    # segment_penalty keeps the step counts in the range of the hand-set R_table.dict (one step per month)
+    assert 5 <= np.median(n_steps) <= 25 and np.percentile(n_steps, 95) <= 45
+    print(f'R step fit of {len(R_steps)} of {len(keys)} series (weekly corrected, process pool): '
+          f'{t_all:.2f} s, {np.mean(n_steps):.1f} steps on average')
+
+
+def bench_R_table(cordat, n_entries = 5000):
+    # loading an R table of n_entries: eval based parser against the literal parser and JSON lines
+    rng = np.random.default_rng(0)
+    Rt_data = Rt(cordat)
+    R_dict = {}
+    for i in range(n_entries):
+        days = np.sort(rng.choice(np.arange(1, 500), size = rng.integers(1, 20), replace = False))
+        R_dict[('RKI', f'Land {i % 16}', f"Kreis {i}'s")] = [(0, 1)] + [(int(day), float(np.round(rng.uniform(0.6, 2.0), 2)))
+                                                                   for day in days]
+    with TemporaryDirectory() as directory:
+        timings = {}
+        for name in ('R_table.dict', 'R_table.jsonl'):
+            Rt_data.R_table_file = path.join(directory, name)
+            Rt_data.R_dict = R_dict
+            _, timings[name, 'save'] = timed(Rt_data.save_R_table)
+            _, timings[name, 'load'] = timed(Rt_data.load_R_table, repeat = 3)
+            assert Rt_data.R_dict == R_dict
+        eval_dict, t_eval = timed(load_R_table_eval, path.join(directory, 'R_table.dict'))
+        assert eval_dict == R_dict
+
+    # the shipped table: the JSON path and the line by line fallback read the same entries,
+    # an unreadable line is reported instead of dropped
+    with open('R_table.dict', 'r') as f:
+        lines = f.readlines()
+    assert parse_R_table(lines, json_path = False) == parse_R_table(lines) == load_R_table_eval('R_table.dict')
+    try:
+        parse_R_table(lines + ['\n', "('RKI', 'Bayern'); [(0, 1), (25, 2.7x)]\n"])
+        assert False
+    except ValueError as e:
+        assert f'line(s) {len(lines) + 2} ' in str(e)
+    print(f'R table ({n_entries} entries, all formats read identical R_dict)')
+    print(f'  load, eval:                 {1e3 * t_eval:9.1f} ms')
+    for name in ('R_table.dict', 'R_table.jsonl'):
+        print(f'  load, {name + ",":22s}{1e3 * timings[name, "load"]:9.1f} ms, save {1e3 * timings[name, "save"]:7.1f} ms')
+
+
+def bench_trace_payload(cordat, n_rows = 10):
+    # payload of a redraw with n_rows weekly corrected traces: float64 lists (former go.Scatter json)
+    # against compact_trace, raw and gzip compressed as sent by Flask-Compress
+    keys = sorted(cordat.corona_dict.keys(), key = lambda key: -len(cordat.corona_dict[key][0]))[:n_rows]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        series = [cordat.remove_weekly_cached(key, 'inf', 6, spline_s = 0, spline_k = 5) for key in keys]
+    series = [(result[0], np.exp(result[2])) for result in series]
+
+    def encode_lists():
+        return json.dumps([{'type': 'scatter', 'mode': 'lines', 'x': x.tolist(), 'y': y.tolist()}
+                           for x, y in series]).encode()
+
+    def encode_compact():
+        return json.dumps([{'type': 'scatter', 'mode': 'lines', **compact_trace(x, y)}
+                           for x, y in series]).encode()
+
+    for x, y in series:
+        decoded = np.frombuffer(base64.b64decode(compact_trace(x, y)['y_b64']), dtype = '<f4')
+        assert np.allclose(decoded, y, rtol = 1e-6)
+    print(f'trace payload ({len(keys)} rows, {sum(len(x) for x, _ in series)} points)')
+    for name, encode in (('float64 lists', encode_lists), ('compact', encode_compact)):
+        payload, t_encode = timed(encode, repeat = 5)
+        t_gzip = perf_counter()
+        compressed = gzip.compress(payload, 6)
+        t_gzip = perf_counter() - t_gzip
+        print(f'  {name:14s} {len(payload)/1e3:9.1f} kB, gzip {len(compressed)/1e3:8.1f} kB, '
+              f'encode {1e3 * t_encode:7.2f} ms, gzip {1e3 * t_gzip:7.2f} ms')
+
+
+BENCHMARKS = {'correlation': bench_correlation, 'remove_weekly': bench_remove_weekly, 'refresh': bench_refresh,
+              'worldometers_fetch': bench_worldometers_fetch,
+              'worldometers_parse': bench_worldometers_parse,
+              'rki_aggregation': bench_rki_aggregation,
+              'rki_incremental': bench_rki_incremental,
+              'densify': bench_densify, 'jhu': bench_jhu,
+              'preload': bench_preload, 'trace_payload': bench_trace_payload,
+              'weekly_precompute': bench_weekly_precompute, 'rt_model': bench_rt_model,
+              'rt_batch': bench_rt_batch, 'rt_fit': bench_rt_fit,
+              'R_table': bench_R_table}
+
+if __name__ == '__main__':
+    # usage: python benchmarks.py [name ...]
+    names = sys.argv[1:] or list(BENCHMARKS.keys())
+    with TemporaryDirectory() as tmp_dir:
+        cordat = temporary_data(tmp_dir)
+        for name in names:
+            BENCHMARKS[name](cordat)
@@ -0,0 +1,23 @@
+# gunicorn configuration for the preload mode:  gunicorn -c gunicorn.conf.py application:server
+# The app and with it the shared CoronaData (CoronaData_online.get_shared_data) are loaded once
+# in the master process. The series are read-only views of the memory-mapped stores in
+# local_files, so the forked workers share these pages instead of loading a copy each.
+# A refresh (Corona_Refresh.py) publishes new store generations, the workers reattach to them
+# on the next request (CoronaData.reattach_if_stale).
+# Pickled .dict files without a store are converted on first load, under a file lock so only one process
+# writes them (the Dockerfile converts them at build time: python Corona_Refresh.py --convert-only).
+from os import environ
+import CoronaData_online
+
+# the workers share one cache of the row series instead of a SimpleCache each (see flask_cache_config)
+environ.setdefault('CMV_CACHE_TYPE', 'FileSystemCache')
+
+bind = '0.0.0.0:8050'
+workers = 4
+preload_app = True
+
+
+def post_fork(server, worker):
+    # the stores may have been refreshed between loading the app and forking this worker
+    if CoronaData_online.shared_data is not None:
+        CoronaData_online.shared_data.reattach_if_stale(forced_check = True)
@@ -0,0 +1,142 @@
+''' Tests of the data pipeline against local fixture files (see benchmarks.make_fixtures), run with
+python -m pytest test_corona.py. All data is written to temporary directories: the stores of the
+pickled dicts of local_files, the fixture files and the refreshed stores.
+'''
+import warnings
+from glob import glob
+from os import path, remove
+
+import numpy as np
+import pytest
+from pandas.testing import assert_frame_equal
+from requests.exceptions import RequestException
+
+from Corona_Refresh import CoronaRefresh, RefreshError
+from Corona_Store import SourceStore, CoronaStore, store_exists
+from CoronaData_online import CoronaData
+from benchmarks import temporary_data, make_fixtures, start_stand_in, run_refresh, serial_build, rki_update_steps, \
+    densify_inputs, clean_import_array_append, clean_import_array_densify, clean_RKI_array_append
+
+
+@pytest.fixture(scope = 'module')
+def cordat(tmp_path_factory):
+    # data of the pickled dicts in local_files, the fixtures are generated from it
+    return temporary_data(str(tmp_path_factory.mktemp('local_files')))
+
+
+def assert_stores_equal(local_files_dir, other_dir, name):
+    store = SourceStore(local_files_dir, name)
+    other = SourceStore(other_dir, name)
+    assert store.keys == other.keys and len(store.keys) > 0, name
+    for i in range(len(store.keys)):
+        assert all(np.array_equal(a, b, equal_nan = True) for a, b in zip(store.series(i)[:4], other.series(i)[:4]))
+        assert store.series(i)[4:] == other.series(i)[4:]
+        assert store.weekly_weeks == other.weekly_weeks
+        for subset_idx in (0, 1):
+            for correct_weeks in store.weekly_weeks:
+                a, b = store.weekly_series(i, subset_idx, correct_weeks), other.weekly_series(i, subset_idx, correct_weeks)
+                assert (a is None) == (b is None)
+                assert a is None or all(np.array_equal(u, v, equal_nan = True) for u, v in zip(a, b))
+
+
+def test_refresh_equals_serial_build(cordat, tmp_path):
+    # the concurrent refresh publishes the same stores as the update_*_to_file methods one after another
+    refresh_data, timings, _ = run_refresh(cordat, str(tmp_path))
+    assert list(timings.keys()) == ['JHUGL', 'JHU_US', 'RKI', 'Worldometers', 'DIVI']
+    assert not any('error' in source_timings for source_timings in timings.values())
+    assert len(refresh_data.corona_dict) > 0
+    serial_data = serial_build(refresh_data.urls, str(tmp_path / 'serial_files'))
+    for source in timings:
+        assert_stores_equal(refresh_data.local_files_dir, serial_data.local_files_dir, refresh_data.store_name(source))
+
+
+def test_refresh_raises_on_failed_source(cordat, tmp_path):
+    # a failed source does not stop the others, run raises RefreshError at the end
+    refresh_data = CoronaData(load = False)
+    refresh_data.urls = make_fixtures(cordat, str(tmp_path / 'fixtures'), rki_rows = 1000)
+    refresh_data.local_files_dir = str(tmp_path / 'local_files')
+    remove(refresh_data.urls['DIVI'])
+    with pytest.raises(RefreshError) as error:
+        CoronaRefresh(refresh_data).run()
+    assert list(error.value.failures.keys()) == ['DIVI']
+    assert error.value.timings['DIVI'].keys() == {'error'}
+    for source in ('JHUGL', 'JHU_US', 'RKI', 'Worldometers'):
+        assert store_exists(refresh_data.local_files_dir, refresh_data.store_name(source))
+    assert not store_exists(refresh_data.local_files_dir, refresh_data.store_name('DIVI'))
+
+
+def test_downloads_retry_and_time_out(cordat, tmp_path):
+    # every download runs through http_session: failed requests are retried, stalled ones time out
+    fixtures_dir = str(tmp_path)
+    urls = make_fixtures(cordat, fixtures_dir, rki_rows = 10)
+    fetch_data = CoronaData(load = False)
+    fetch_data.http_backoff = 0.01
+    server, base_url = start_stand_in(fixtures_dir, fail_first = True)
+    try:
+        for name in ('JHU_GL_inf', 'JHU_GL_deaths', 'JHU_US_inf', 'JHU_US_deaths', 'DIVI'):
+            fetch_data.urls[name] = base_url + path.relpath(urls[name], fixtures_dir).replace(path.sep, '/')
+        raw = fetch_data.fetch_jhu_global()
+        with open(urls['JHU_GL_inf'], 'rb') as f:
+            assert raw['inf'] == f.read()
+        with open(urls['DIVI'], 'rb') as f:
+            assert fetch_data.fetch_DIVI() == f.read()
+    finally:
+        server.shutdown()
+
+    server, base_url = start_stand_in(fixtures_dir, latency = 1.0)
+    try:
+        fetch_data.urls['DIVI'] = base_url + path.relpath(urls['DIVI'], fixtures_dir).replace(path.sep, '/')
+        fetch_data.http_timeout = 0.2
+        fetch_data.http_retries = 0
+        with pytest.raises(RequestException):
+            fetch_data.fetch_DIVI()
+    finally:
+        server.shutdown()
+
+
+def test_rki_incremental_equals_full_build(cordat, tmp_path):
+    # after every RKI update (304 Not Modified, new report day, corrected reports) the incremental
+    # store equals a full build of the same csv file
+    recomputed = {}
+    for step, update_data, _, rki_csv_file, server in rki_update_steps(cordat, str(tmp_path), rki_rows = 100000):
+        recomputed[step] = update_data.rki_recomputed
+        if step == 'not modified':
+            assert server.RequestHandlerClass.func.not_modified == 1
+        full_data = CoronaData(load = False)
+        full_data.rki_incremental = False
+        full_dict = full_data.build_RKI(rki_csv_file)
+        store = CoronaStore([SourceStore(update_data.local_files_dir, 'RKI')])
+        assert list(store.keys()) == list(full_dict.keys())
+        for key, entry in full_dict.items():
+            assert all(np.allclose(np.asarray(a, dtype = 'float'), np.asarray(b, dtype = 'float'))
+                       for a, b in zip(entry[:4], store[key][:4]))
+            assert entry[4:] == list(store[key][4:])
+    assert recomputed['not modified'] == 0
+    assert 0 < recomputed['3 days changed'] < recomputed['full build']
+
+
+def test_refresh_rki_settings(cordat, tmp_path):
+    # rki_incremental of the refresh applies in the worker process: a full build keeps no cube
+    # snapshot, the count of analysed series comes back from the worker
+    refresh_data, _, _ = run_refresh(cordat, str(tmp_path / 'full'), rki_incremental = False)
+    assert not glob(path.join(refresh_data.local_files_dir, 'RKI_cube.*.pickle'))
+    assert refresh_data.rki_recomputed > 0
+    refresh_data, _, _ = run_refresh(cordat, str(tmp_path / 'incremental'), rki_chunksize = 10000)
+    assert glob(path.join(refresh_data.local_files_dir, 'RKI_cube.*.pickle')) == \
+        [path.join(refresh_data.local_files_dir, 'RKI_cube.0.pickle')]
+
+
+def test_densify_equals_append(cordat):
+    # densify_days fills the missing days like the former DataFrame.append versions of
+    # clean_import_array (JHU) and clean_RKI_array (DIVI)
+    jhu_df, divi_pivot, refscale = densify_inputs(cordat)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        jhu_append, jhu_scale_append = clean_import_array_append(cordat, jhu_df.copy(), '%m/%d/%y')
+        divi_append, divi_scale_append = clean_RKI_array_append(cordat, divi_pivot.copy(), refscale)
+    jhu_dense, jhu_scale_dense = clean_import_array_densify(cordat, jhu_df.copy(), '%m/%d/%y')
+    divi_dense, divi_scale_dense = cordat.clean_RKI_array(divi_pivot.copy(), refscale)
+    for appended, dense in ((jhu_append, jhu_dense), (divi_append, divi_dense)):
+        assert_frame_equal(appended.reset_index(drop = True), dense.reset_index(drop = True), check_dtype = False)
+    assert list(jhu_scale_append) == list(jhu_scale_dense)
+    assert list(divi_scale_append) == list(divi_scale_dense)